@@ -7,3 +7,8 @@ class AtivosConfig(AppConfig):
 
     def ready(self):
         import apps.ativos.signals
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from apps.ativos.search import ativo_alterado, ensure_search_indexes
+        post_migrate.connect(ensure_search_indexes, sender=self)
+        post_save.connect(ativo_alterado, sender='ativos.Ativo')
+        post_delete.connect(ativo_alterado, sender='ativos.Ativo')
@@ -0,0 +1,167 @@
+"""
+Autocomplete de ativos (seletor de ativos do ticket).
+
+buscar_ativos_json filtrava Ativo com três ``icontains`` a cada tecla —
+scan sequencial do cadastro de ativos. Aqui:
+
+- ``ensure_search_indexes`` (post_migrate, só PostgreSQL) cria índices
+  trigram GIN sobre as expressões que o Django gera para ``icontains``
+  (``UPPER(col::text)``) em etiqueta, nome e número de série, e índices
+  (cliente, ``UPPER(col::text) text_pattern_ops``) para prefixos;
+- termos com menos de ``AUTOCOMPLETE_TRIGRAM_MIN`` caracteres — curtos
+  demais para o trigram — viram busca por prefixo (``istartswith``);
+- ``buscar_ativos`` devolve no máximo ``AUTOCOMPLETE_LIMIT`` ativos já
+  serializados e guarda o resultado por cliente e termo durante
+  ``AUTOCOMPLETE_CACHE_TIMEOUT`` segundos. Salvar ou excluir um ativo
+  avança a geração do cliente (``invalidar_cliente``), descartando o
+  cache dele.
+
+Com LocMemCache cada processo tem sua cópia; o TTL curto limita quanto
+tempo um worker pode mostrar resultados antigos.
+"""
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+from .models import Ativo
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_LIMIT = 20
+AUTOCOMPLETE_TRIGRAM_MIN = 3
+AUTOCOMPLETE_MAX_QUERY = 100
+AUTOCOMPLETE_CACHE_TIMEOUT = 30
+
+_CAMPOS_BUSCA = ("etiqueta", "nome", "numero_serie")
+
+
+# ============================================================================
+# ÍNDICES (PostgreSQL)
+# ============================================================================
+
+def _search_index_sql(connection) -> list[str]:
+    qn = connection.ops.quote_name
+    table = qn(Ativo._meta.db_table)
+    cliente = qn(Ativo._meta.get_field("cliente").column)
+    sql = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for campo in _CAMPOS_BUSCA:
+        coluna = qn(Ativo._meta.get_field(campo).column)
+        sql += [
+            f"CREATE INDEX IF NOT EXISTS ativos_ativo_{campo}_trgm "
+            f"ON {table} USING gin (UPPER({coluna}::text) gin_trgm_ops)",
+            f"CREATE INDEX IF NOT EXISTS ativos_ativo_{campo}_prefixo "
+            f"ON {table} ({cliente}, UPPER({coluna}::text) text_pattern_ops)",
+        ]
+    return sql
+
+
+def ensure_search_indexes(sender, using="default", **kwargs):
+    """
+    Handler de post_migrate: cria os índices do autocomplete de ativos.
+
+    Idempotente (IF NOT EXISTS). Em bancos que não são PostgreSQL não faz
+    nada — a busca continua funcionando, apenas sem índice.
+    """
+    if getattr(sender, "name", "") != "apps.ativos":
+        return
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with connection.cursor() as cursor:
+            for sql in _search_index_sql(connection):
+                cursor.execute(sql)
+    except Exception as e:
+        logger.warning(f"AtivoSearch | não foi possível criar índices de busca: {e}")
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+def _generation_key(cliente_id) -> str:
+    return f"ativos:autocomplete:{cliente_id}:generation"
+
+
+def _generation(cliente_id) -> int:
+    key = _generation_key(cliente_id)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key, 1)
+
+
+def _cache_key(cliente_id, termo: str) -> str:
+    digest = hashlib.md5(termo.encode()).hexdigest()
+    return f"ativos:autocomplete:{cliente_id}:{_generation(cliente_id)}:{digest}"
+
+
+def invalidar_cliente(cliente_id) -> None:
+    """Descarta os resultados em cache do cliente."""
+    try:
+        cache.incr(_generation_key(cliente_id))
+    except ValueError:
+        cache.set(_generation_key(cliente_id), 2, timeout=None)
+
+
+def ativo_alterado(sender, instance, **kwargs):
+    """post_save/post_delete de Ativo (conectado em AtivosConfig.ready)."""
+    invalidar_cliente(instance.cliente_id)
+
+
+# ============================================================================
+# BUSCA
+# ============================================================================
+
+def normalizar_termo(q: str) -> str:
+    return " ".join((q or "").split())[:AUTOCOMPLETE_MAX_QUERY]
+
+
+def _filtro(termo: str) -> Q:
+    lookup = "icontains" if len(termo) >= AUTOCOMPLETE_TRIGRAM_MIN else "istartswith"
+    filtro = Q()
+    for campo in _CAMPOS_BUSCA:
+        filtro |= Q(**{f"{campo}__{lookup}": termo})
+    return filtro
+
+
+def _serializar(ativo) -> dict:
+    return {
+        "id": ativo.pk,
+        "etiqueta": ativo.etiqueta,
+        "nome": ativo.nome,
+        "categoria": ativo.categoria.nome if ativo.categoria else "",
+        "status": ativo.status.nome if ativo.status else "",
+        "status_cor": ativo.status.cor if ativo.status else "#888",
+    }
+
+
+def buscar_ativos(cliente_id, q: str, excluir=(), limit: int = AUTOCOMPLETE_LIMIT) -> list[dict]:
+    """
+    Ativos do cliente que casam com ``q`` (etiqueta, nome ou número de
+    série), em ordem de etiqueta, sem os ids de ``excluir``.
+    """
+    termo = normalizar_termo(q)
+    if not cliente_id or not termo:
+        return []
+    excluir = set(excluir)
+
+    # O cache é por cliente; a exclusão (ativos já vinculados ao ticket) é
+    # aplicada depois, então guarda folga suficiente para ela
+    key = _cache_key(cliente_id, termo.upper())
+    resultados = cache.get(key)
+    if resultados is None or len(excluir) > limit:
+        ativos = (
+            Ativo.objects.filter(cliente_id=cliente_id)
+            .filter(_filtro(termo))
+            .select_related("categoria", "status")
+            .order_by("etiqueta")
+        )
+        if len(excluir) > limit:
+            ativos = ativos.exclude(pk__in=excluir)
+        resultados = [_serializar(ativo) for ativo in ativos[:limit * 2]]
+        if len(excluir) <= limit:
+            cache.set(key, resultados, timeout=AUTOCOMPLETE_CACHE_TIMEOUT)
+
+    return [item for item in resultados if item["id"] not in excluir][:limit]
@@ -0,0 +1,150 @@
+"""
+Resumos pré-agregados de LogAtividade (ResumoAtividadeDiaria).
+
+Os contadores são incrementados na ingestão (AgentActivityAPIView) e podem
+ser reconstruídos a partir dos logs brutos pelo comando
+``manage.py recalcular_resumo_atividade``.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LogAtividade, ResumoAtividadeDiaria
+
+logger = logging.getLogger(__name__)
+
+
+def chave_resumo(tipo: str, ocorrido_em, app_nome: str = "") -> tuple:
+    """Chave (dia, tipo, app_nome) usada para agrupar eventos no resumo."""
+    dia = timezone.localtime(ocorrido_em).date() if timezone.is_aware(ocorrido_em) else ocorrido_em.date()
+    return (dia, tipo, app_nome if tipo == "app_iniciado" else "")
+
+
+def incrementar_resumos(machine, contagens: Counter) -> None:
+    """
+    Soma ``contagens`` ({(dia, tipo, app_nome): n}) aos resumos da máquina.
+
+    Usa UPDATE com F() para ser seguro entre workers; cria a linha apenas
+    quando ela ainda não existe (com retry se outro worker criou antes).
+    """
+    for (dia, tipo, app_nome), quantidade in contagens.items():
+        if quantidade <= 0:
+            continue
+        filtro = dict(machine=machine, dia=dia, tipo=tipo, app_nome=app_nome[:255])
+        atualizados = ResumoAtividadeDiaria.objects.filter(**filtro).update(
+            total=F("total") + quantidade,
+            atualizado_em=timezone.now(),
+        )
+        if atualizados:
+            continue
+        try:
+            with transaction.atomic():
+                ResumoAtividadeDiaria.objects.create(total=quantidade, **filtro)
+        except IntegrityError:
+            ResumoAtividadeDiaria.objects.filter(**filtro).update(
+                total=F("total") + quantidade,
+                atualizado_em=timezone.now(),
+            )
+
+
+def recalcular_resumos(machine=None, desde=None) -> int:
+    """
+    Reconstrói os resumos a partir dos logs brutos.
+
+    Args:
+        machine: Limita a uma máquina (None = todas).
+        desde:   Data inicial (date) — None reconstrói todo o histórico.
+
+    Returns:
+        Quantidade de linhas de resumo gravadas.
+    """
+    logs = LogAtividade.objects.all()
+    resumos = ResumoAtividadeDiaria.objects.all()
+    if machine is not None:
+        logs = logs.filter(machine=machine)
+        resumos = resumos.filter(machine=machine)
+    if desde is not None:
+        logs = logs.filter(ocorrido_em__date__gte=desde)
+        resumos = resumos.filter(dia__gte=desde)
+
+    agregados = (
+        logs.annotate(dia=TruncDate("ocorrido_em"))
+        .values("machine_id", "dia", "tipo", "app_nome")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+
+    linhas: dict[tuple, int] = {}
+    for row in agregados.iterator():
+        app_nome = row["app_nome"] if row["tipo"] == "app_iniciado" else ""
+        chave = (row["machine_id"], row["dia"], row["tipo"], app_nome[:255])
+        linhas[chave] = linhas.get(chave, 0) + row["total"]
+
+    with transaction.atomic():
+        resumos.delete()
+        ResumoAtividadeDiaria.objects.bulk_create(
+            [
+                ResumoAtividadeDiaria(
+                    machine_id=machine_id, dia=dia, tipo=tipo, app_nome=app_nome, total=total,
+                )
+                for (machine_id, dia, tipo, app_nome), total in linhas.items()
+            ],
+            batch_size=1000,
+        )
+
+    logger.info("ResumoAtividade | recalculado linhas=%d machine=%s desde=%s", len(linhas), machine, desde)
+    return len(linhas)
+
+
+def _filtrar_periodo(qs, dias):
+    if dias:
+        qs = qs.filter(dia__gte=timezone.localdate() - timedelta(days=dias - 1))
+    return qs
+
+
+def top_apps_maquina(machine, dias=None, limite: int = 10):
+    """Ranking de apps da máquina — ``dias=None`` considera todo o histórico."""
+    qs = ResumoAtividadeDiaria.objects.filter(machine=machine, tipo="app_iniciado")
+    return (
+        _filtrar_periodo(qs, dias)
+        .values("app_nome")
+        .annotate(total=Sum("total"))
+        .order_by("-total")[:limite]
+    )
+
+
+def atividade_por_dia(machine=None, dias: int = 30):
+    """
+    Totais por dia e tipo para gráficos: [{"dia", "login", "logoff", "app_iniciado"}].
+    ``machine=None`` soma a frota inteira.
+    """
+    qs = ResumoAtividadeDiaria.objects.all()
+    if machine is not None:
+        qs = qs.filter(machine=machine)
+    rows = (
+        _filtrar_periodo(qs, dias)
+        .values("dia", "tipo")
+        .annotate(total=Sum("total"))
+        .order_by("dia")
+    )
+    por_dia: dict = {}
+    for row in rows:
+        item = por_dia.setdefault(row["dia"], {"dia": row["dia"], "login": 0, "logoff": 0, "app_iniciado": 0})
+        item[row["tipo"]] = row["total"]
+    return list(por_dia.values())
+
+
+def top_apps_frota(dias: int = 30, limite: int = 10):
+    """Apps mais usados na frota: total de aberturas e máquinas distintas."""
+    qs = ResumoAtividadeDiaria.objects.filter(tipo="app_iniciado")
+    return (
+        _filtrar_periodo(qs, dias)
+        .values("app_nome")
+        .annotate(total=Sum("total"), maquinas=Count("machine", distinct=True))
+        .order_by("-total")[:limite]
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin, messages
-from .models import Machine, MachineGroup, BlockedSite, Notification
+from .models import (Machine, MachineGroup, BlockedSite, Notification, NotificationBroadcast,
+                     MachineMemoryModule, MachineNetworkAdapter, MachineTpm)
 from import_export.admin import ImportExportMixin
 
 @admin.register(MachineGroup)
@@ -7,12 +8,31 @@ class MachineGroupAdmin(ImportExportMixin, admin.ModelAdmin):
     list_display  = ('name', 'description')
     search_fields = ('name',)
 
+class MachineMemoryModuleInline(admin.TabularInline):
+    model = MachineMemoryModule
+    extra = 0
+    can_delete = False
+    readonly_fields = ('bank_label', 'device_locator', 'capacity_gb', 'speed_mhz', 'manufacturer')
+
+class MachineNetworkAdapterInline(admin.TabularInline):
+    model = MachineNetworkAdapter
+    extra = 0
+    can_delete = False
+    readonly_fields = ('name', 'mac', 'mac_prefix', 'ip', 'gateway', 'dhcp')
+
+class MachineTpmInline(admin.StackedInline):
+    model = MachineTpm
+    extra = 0
+    can_delete = False
+    readonly_fields = ('present', 'ready', 'enabled', 'spec_version', 'manufacturer')
+
 @admin.register(Machine)
 class MachineAdmin(ImportExportMixin, admin.ModelAdmin):
     list_display    = ('hostname', 'loggedUser', 'tpm', 'ip_address', 'group', 'is_online', 'last_seen', 'ram_gb', 'disk_free_gb')
     list_filter     = ('group', 'is_online', 'last_seen')
     search_fields   = ('hostname', 'ip_address')
     readonly_fields = ('last_seen',)
+    inlines         = (MachineMemoryModuleInline, MachineNetworkAdapterInline, MachineTpmInline)
 
 @admin.register(BlockedSite)
 class BlockedSiteAdmin(ImportExportMixin, admin.ModelAdmin):
@@ -20,3 +40,15 @@ class BlockedSiteAdmin(ImportExportMixin, admin.ModelAdmin):
     list_filter   = ('group', 'machine')
     search_fields = ('url',)
 
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    # Criado pela tela de envio em massa (fan_out); aqui só consulta e exclusão
+    list_display    = ('title', 'type', 'priority', 'all_machines', 'recipients_count', 'created_by', 'created_at')
+    list_filter     = ('type', 'priority', 'all_machines', 'created_at')
+    search_fields   = ('title', 'message')
+    readonly_fields = ('title', 'message', 'type', 'priority', 'expires_at', 'groups', 'all_machines',
+                       'recipients_count', 'read_count', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
+
+    def has_add_permission(self, request):
+        return False
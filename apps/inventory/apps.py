@@ -7,3 +7,6 @@ class InventoryConfig(AppConfig):
 
     def ready(self):
         import apps.inventory.signals
+        from django.db.models.signals import post_migrate
+        from apps.inventory.search import ensure_search_indexes
+        post_migrate.connect(ensure_search_indexes, sender=self)
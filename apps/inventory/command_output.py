@@ -0,0 +1,94 @@
+"""
+Armazenamento fora da linha da saída de comandos remotos (RemoteCommandAudit).
+
+A linha de auditoria guarda só uma prévia de stdout/stderr, o tamanho em
+bytes e o SHA-256 da saída completa. Quando a saída passa da prévia, o
+texto completo é gravado comprimido (gzip) no storage padrão
+(MEDIA_ROOT/command_output/...) e servido sob demanda pelo
+RemoteCommandOutputView, que descomprime em streaming uma única vez
+(``iter_command_output``), sem Content-Length.
+"""
+import gzip
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+REMOTE_COMMAND_OUTPUT_PREVIEW = 2000
+# Limite de segurança para a saída completa aceita do agente (caracteres)
+REMOTE_COMMAND_OUTPUT_MAX = 10 * 1024 * 1024
+# Limite do resultado do canal reverso guardado no cache (caracteres)
+REMOTE_COMMAND_RESULT_CACHE_MAX = 20000
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+STREAMS = ("stdout", "stderr")
+
+
+def store_command_output(audit, stream: str, text) -> list[str]:
+    """
+    Preenche prévia, tamanho, hash e arquivo comprimido de ``stream`` em ``audit``.
+
+    Não salva o audit — retorna os nomes de campos alterados para o
+    ``update_fields`` de quem chamou.
+    """
+    if stream not in STREAMS:
+        raise ValueError(f"stream inválido: {stream}")
+
+    text = str(text or "")[:REMOTE_COMMAND_OUTPUT_MAX]
+    data = text.encode("utf-8", errors="replace")
+
+    setattr(audit, stream, text[:REMOTE_COMMAND_OUTPUT_PREVIEW])
+    setattr(audit, f"{stream}_size", len(data))
+    setattr(audit, f"{stream}_sha256", hashlib.sha256(data).hexdigest() if data else "")
+
+    file_field = getattr(audit, f"{stream}_file")
+    if len(text) > REMOTE_COMMAND_OUTPUT_PREVIEW:
+        try:
+            file_field.save(
+                f"{audit.pk}_{stream}.txt.gz",
+                ContentFile(gzip.compress(data, compresslevel=6)),
+                save=False,
+            )
+        except Exception as e:
+            logger.error(f"CommandOutput | falha ao gravar {stream} da auditoria {audit.pk}: {e}")
+
+    return [stream, f"{stream}_size", f"{stream}_sha256", f"{stream}_file"]
+
+
+def open_command_output(audit, stream: str):
+    """
+    Abre a saída completa de ``stream`` como arquivo binário (UTF-8).
+
+    Usa o arquivo comprimido quando existe; caso contrário a prévia já é a
+    saída inteira.
+    """
+    if stream not in STREAMS:
+        raise ValueError(f"stream inválido: {stream}")
+    file_field = getattr(audit, f"{stream}_file")
+    if file_field:
+        file_field.open("rb")
+        return gzip.GzipFile(fileobj=file_field.file, mode="rb")
+    return io.BytesIO(getattr(audit, stream).encode("utf-8"))
+
+
+def iter_command_output(output, chunk_size: int = OUTPUT_CHUNK_SIZE):
+    """Lê ``output`` (de open_command_output) em blocos e fecha no fim."""
+    try:
+        while chunk := output.read(chunk_size):
+            yield chunk
+    finally:
+        output.close()
+
+
+def delete_command_output_files(audit) -> None:
+    """Remove os arquivos comprimidos da auditoria (post_delete)."""
+    for stream in STREAMS:
+        file_field = getattr(audit, f"{stream}_file")
+        if file_field:
+            try:
+                file_field.delete(save=False)
+            except Exception as e:
+                logger.warning(f"CommandOutput | falha ao remover {file_field.name}: {e}")
@@ -0,0 +1,150 @@
+"""
+Consumer WebSocket do gateway de agentes (requer ``channels``).
+
+Conexão: ``/ws/agent/`` com os mesmos headers do polling HTTP —
+``Authorization: Bearer <token_hash>`` e ``X-Machine-Name``. O token precisa
+estar vinculado à máquina (AgentTokenUsage); senão fecha com 4401.
+
+Servidor → agente:
+    {"type": "command", "command": {...}}          (mesmo formato do pull)
+    {"type": "notifications", "notifications": [{...}]}  (não lidas, como o GET)
+    {"type": "rdp.offer", "offers": [{...}]}       (mesmo formato do signal/pull)
+    {"type": "pong"}
+
+Agente → servidor:
+    {"type": "ping"}
+    {"type": "command.result", "request_id": ..., "stdout": ..., ...}
+    {"type": "rdp.answer", "session_id": ..., "answer": {...}}
+    {"type": "notification.read", "notification_id": 123}
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .gateway import agent_group, notification_payload, save_command_result, take_pending_commands
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_DRAIN_LIMIT = 20
+
+
+def _authenticate_agent(token_hash: str, machine_name: str) -> bool:
+    """
+    Mesma validação dos endpoints HTTP de sinalização: token ativo, não
+    expirado e vinculado (AgentTokenUsage) à máquina do X-Machine-Name.
+    """
+    from apps.rdp.views import agent_token_for_machine
+
+    return agent_token_for_machine(token_hash, machine_name) is not None
+
+
+def _pending_notifications(machine_name: str) -> list[dict]:
+    """Mesmo conjunto do GET de MachineNotificationView (status=pending)."""
+    notifications = (
+        Notification.objects.filter(machine__hostname__iexact=machine_name, is_read=False)
+        .order_by("-created_at")[:GATEWAY_DRAIN_LIMIT]
+    )
+    return [notification_payload(notif) for notif in notifications]
+
+
+def _mark_notification_read(machine_name: str, notification_id) -> bool:
+    notif = Notification.objects.filter(pk=notification_id, machine__hostname__iexact=machine_name).first()
+    if not notif:
+        return False
+    notif.mark_as_read()
+    return True
+
+
+def _drain_rdp_offers(machine_name: str) -> list[dict]:
+    from apps.rdp.signaling import get_signal_bus, offer_channel
+
+    return get_signal_bus().drain(offer_channel(machine_name), timeout=0, limit=GATEWAY_DRAIN_LIMIT)
+
+
+def _publish_rdp_answer(session_id: str, answer: dict) -> None:
+    from apps.rdp.signaling import answer_channel, get_signal_bus
+    from apps.rdp.views import SIGNAL_WAIT_TIMEOUT
+
+    get_signal_bus().publish(answer_channel(session_id), answer, ttl=SIGNAL_WAIT_TIMEOUT + 5)
+
+
+class AgentGatewayConsumer(AsyncJsonWebsocketConsumer):
+    machine_name = ""
+    group_name = ""
+
+    async def connect(self):
+        headers = dict(self.scope.get("headers") or [])
+        auth = headers.get(b"authorization", b"").decode("latin-1")
+        machine_name = headers.get(b"x-machine-name", b"").decode("latin-1").strip()
+        if not machine_name or not auth.startswith("Bearer "):
+            await self.close(code=4401)
+            return
+        if not await database_sync_to_async(_authenticate_agent)(auth[7:].strip(), machine_name):
+            await self.close(code=4401)
+            return
+
+        self.machine_name = machine_name
+        self.group_name = agent_group(machine_name)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        logger.info(f"AgentGateway | {machine_name} conectado")
+
+        # Entrega o que ficou pendente enquanto o agente estava desconectado
+        await self._send_commands()
+        await self._send_notifications()
+        await self._send_rdp_offers()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            logger.info(f"AgentGateway | {self.machine_name} desconectado ({code})")
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get("type") if isinstance(content, dict) else None
+        if kind == "ping":
+            await self.send_json({"type": "pong"})
+        elif kind == "command.result":
+            ok = await sync_to_async(save_command_result)(content)
+            await self.send_json({"type": "ack", "of": kind, "ok": ok})
+        elif kind == "rdp.answer":
+            session_id = str(content.get("session_id") or content.get("request_id") or "").strip()
+            answer = content.get("answer")
+            ok = bool(session_id) and isinstance(answer, dict)
+            if ok:
+                await sync_to_async(_publish_rdp_answer)(session_id, answer)
+            await self.send_json({"type": "ack", "of": kind, "ok": ok})
+        elif kind == "notification.read":
+            ok = await database_sync_to_async(_mark_notification_read)(
+                self.machine_name, content.get("notification_id"),
+            )
+            await self.send_json({"type": "ack", "of": kind, "ok": ok})
+        else:
+            await self.send_json({"type": "error", "error": "tipo de mensagem desconhecido"})
+
+    # -- eventos da channel layer (apps/inventory/gateway.py) ----------------
+
+    async def agent_command(self, event):
+        await self._send_commands()
+
+    async def agent_notification(self, event):
+        await self._send_notifications()
+
+    async def agent_rdp_offer(self, event):
+        await self._send_rdp_offers()
+
+    async def _send_commands(self):
+        for command in await sync_to_async(take_pending_commands)(self.machine_name, GATEWAY_DRAIN_LIMIT):
+            await self.send_json({"type": "command", "command": command})
+
+    async def _send_notifications(self):
+        notifications = await database_sync_to_async(_pending_notifications)(self.machine_name)
+        if notifications:
+            await self.send_json({"type": "notifications", "notifications": notifications})
+
+    async def _send_rdp_offers(self):
+        offers = await sync_to_async(_drain_rdp_offers)(self.machine_name)
+        if offers:
+            await self.send_json({"type": "rdp.offer", "offers": offers})
@@ -112,10 +112,22 @@ class BulkNotificationForm(forms.Form):
     machines = forms.ModelMultipleChoiceField(
         queryset=Machine.objects.all(),
         widget=forms.CheckboxSelectMultiple,
+        required=False,
         label='Máquinas',
         help_text='Selecione as máquinas que receberão a notificação'
     )
 
+    groups = forms.ModelMultipleChoiceField(
+        queryset=MachineGroup.objects.all(),
+        required=False,
+        label='Grupos',
+    )
+
+    all_machines = forms.BooleanField(
+        required=False,
+        label='Todas as máquinas',
+    )
+
     title = forms.CharField(
         max_length=200,
         widget=forms.TextInput(attrs={
@@ -153,6 +165,12 @@ class BulkNotificationForm(forms.Form):
         label='Expira em (opcional)'
     )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not (cleaned_data.get('machines') or cleaned_data.get('groups') or cleaned_data.get('all_machines')):
+            raise forms.ValidationError('Selecione ao menos uma máquina, um grupo ou todas as máquinas.')
+        return cleaned_data
+
 
 class AgentTokenGenerateForm(forms.Form):
     """
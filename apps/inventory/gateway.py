@@ -0,0 +1,176 @@
+"""
+Gateway de conexão persistente dos agentes (WebSocket via Django Channels).
+
+Hoje o agente consulta por polling HTTP: comandos (AgentCommandPullAPIView),
+notificações (MachineNotificationView) e sinalização RDP
+(RDPAgentSignalPullView). Com o gateway o agente mantém uma conexão
+autenticada em ``/ws/agent/`` (apps/inventory/consumers.py) e o servidor
+empurra os eventos assim que surgem.
+
+Este módulo não depende de Channels: ``push_to_agent`` apenas avisa o
+grupo da máquina na channel layer; sem ``channels`` instalado (ou sem
+CHANNEL_LAYERS) vira no-op e o agente continua recebendo tudo pelo polling,
+que permanece como fallback. O aviso é só um "acorde", sem payload — o
+consumer lê as mesmas fontes do polling: comandos e ofertas RDP saem da
+fila (cada item é entregue uma única vez por um dos dois caminhos);
+notificações são o conjunto não lido da máquina, o mesmo que o GET de
+MachineNotificationView devolve a cada ciclo até o ``notification.read``,
+e o agente as identifica pelo ``id``.
+"""
+import logging
+import re
+
+from django.core.cache import cache
+
+from .command_output import REMOTE_COMMAND_OUTPUT_MAX, REMOTE_COMMAND_RESULT_CACHE_MAX, store_command_output
+
+logger = logging.getLogger(__name__)
+
+try:
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+except ImportError:  # dependência opcional
+    get_channel_layer = None
+
+EVENT_COMMAND = "agent.command"
+EVENT_NOTIFICATION = "agent.notification"
+EVENT_RDP_OFFER = "agent.rdp_offer"
+
+
+def agent_group(machine_name: str) -> str:
+    """Nome do grupo da máquina na channel layer (só [a-z0-9_.-])."""
+    return "agent." + re.sub(r"[^a-z0-9_.-]", "_", machine_name.lower())[:90]
+
+
+def gateway_enabled() -> bool:
+    return get_channel_layer is not None and get_channel_layer() is not None
+
+
+def push_to_agents(machine_names, event: str) -> int:
+    """
+    Avisa várias máquinas numa única passagem sync → async (um group_send
+    por máquina no mesmo loop). Retorna quantas foram avisadas.
+    """
+    groups = sorted({agent_group(name) for name in machine_names if name})
+    if not groups or not gateway_enabled():
+        return 0
+    layer = get_channel_layer()
+
+    async def send_all():
+        sent = 0
+        for group in groups:
+            try:
+                await layer.group_send(group, {"type": event, "payload": {}})
+                sent += 1
+            except Exception as e:
+                logger.warning(f"AgentGateway | falha ao avisar {group}: {e}")
+        return sent
+
+    return async_to_sync(send_all)()
+
+
+def push_to_agent(machine_name: str, event: str, payload: dict | None = None) -> bool:
+    """
+    Avisa o agente conectado ao gateway. Retorna False se não há channel layer.
+    Nunca levanta exceção — o polling continua como caminho de entrega.
+    """
+    if not gateway_enabled():
+        return False
+    layer = get_channel_layer()
+    try:
+        async_to_sync(layer.group_send)(agent_group(machine_name), {"type": event, "payload": payload or {}})
+        return True
+    except Exception as e:
+        logger.warning(f"AgentGateway | falha ao avisar {machine_name}: {e}")
+        return False
+
+
+# ============================================================================
+# FILA DE COMANDOS (compartilhada entre polling e gateway)
+# ============================================================================
+
+def command_queue_key(machine_name: str) -> str:
+    return f"inventory:agent-command:queue:{machine_name.lower()}"
+
+
+def command_result_key(request_id: str) -> str:
+    return f"inventory:agent-command:result:{request_id}"
+
+
+def command_audit_key(request_id: str) -> str:
+    """request_id → RemoteCommandAudit que recebe a saída completa."""
+    return f"inventory:agent-command:audit:{request_id}"
+
+
+def take_pending_commands(machine_name: str, limit: int = 1) -> list[dict]:
+    """Retira até ``limit`` comandos da fila reversa da máquina."""
+    queue_key = command_queue_key(machine_name)
+    queue = cache.get(queue_key, [])
+    if not isinstance(queue, list) or not queue:
+        return []
+    taken, rest = queue[:limit], queue[limit:]
+    if rest:
+        cache.set(queue_key, rest, timeout=600)
+    else:
+        cache.delete(queue_key)
+    return taken
+
+
+def _store_result_output(request_id: str, stdout: str, stderr: str) -> bool:
+    """Grava a saída completa na auditoria do comando, se houver uma."""
+    key = command_audit_key(request_id)
+    audit_id = cache.get(key)
+    if not audit_id:
+        return False
+    from .models import RemoteCommandAudit
+
+    audit = RemoteCommandAudit.objects.filter(pk=audit_id).first()
+    if audit is None:
+        return False
+    fields = store_command_output(audit, "stdout", stdout) + store_command_output(audit, "stderr", stderr)
+    audit.save(update_fields=fields)
+    cache.delete(key)
+    return True
+
+
+def save_command_result(data) -> bool:
+    """
+    Guarda o resultado enviado pelo agente para quem espera o request_id.
+
+    A saída completa vai direto para a auditoria do comando
+    (``output_stored``); o cache leva só a cópia devolvida ao navegador,
+    limitada a ``REMOTE_COMMAND_RESULT_CACHE_MAX``.
+    """
+    request_id = str(data.get("request_id", "")).strip()
+    if not request_id:
+        return False
+    try:
+        exit_code = int(data.get("exit_code", -1))
+    except (TypeError, ValueError):
+        exit_code = -1
+    stdout = str(data.get("stdout", ""))[:REMOTE_COMMAND_OUTPUT_MAX]
+    stderr = str(data.get("stderr", ""))[:REMOTE_COMMAND_OUTPUT_MAX]
+    result = {
+        "request_id": request_id,
+        "stdout": stdout[:REMOTE_COMMAND_RESULT_CACHE_MAX],
+        "stderr": stderr[:REMOTE_COMMAND_RESULT_CACHE_MAX],
+        "exit_code": exit_code,
+        "error": str(data.get("error", ""))[:5000],
+        "executed_at": data.get("executed_at"),
+        "output_stored": _store_result_output(request_id, stdout, stderr),
+    }
+    cache.set(command_result_key(request_id), result, timeout=300)
+    return True
+
+
+def notification_payload(notif) -> dict:
+    return {
+        'id': notif.id,
+        'title': notif.title,
+        'message': notif.message,
+        'type': getattr(notif, 'type', 'info'),
+        'priority': getattr(notif, 'priority', 'normal'),
+        'status': getattr(notif, 'status', 'pending'),
+        'is_read': notif.is_read,
+        'created_at': notif.created_at.isoformat(),
+    }
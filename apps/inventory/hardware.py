@@ -0,0 +1,191 @@
+"""
+Inventário de hardware normalizado.
+
+O check-in grava ``memory_modules``, ``network_info`` e ``tpm`` de Machine
+como JSON opaco. Aqui esses payloads são projetados em tabelas tipadas e
+indexadas (MachineMemoryModule, MachineNetworkAdapter, MachineTpm), para
+que relatórios da frota — "máquinas com menos de 8 GB", "placas com este
+prefixo MAC", "TPM desabilitado" — rodem como SQL em vez de varrer JSON
+em Python.
+
+A projeção só é refeita quando o payload muda: o SHA-256 do JSON canônico
+fica em ``Machine.hardware_hash`` e check-ins idênticos não escrevem nada.
+Máquinas antigas são projetadas pelo comando ``projetar_hardware``.
+"""
+import hashlib
+import json
+import logging
+import re
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Machine, MachineMemoryModule, MachineNetworkAdapter, MachineTpm
+from .reachability import extract_ipv4_values
+
+logger = logging.getLogger(__name__)
+
+_MAC_HEX_RE = re.compile(r"[^0-9A-F]")
+
+
+def hardware_fingerprint(machine) -> str:
+    """SHA-256 do JSON canônico dos três payloads de hardware."""
+    payload = [machine.memory_modules, machine.network_info, machine.tpm]
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_mac(value) -> str:
+    """``aa-bb-cc-dd-ee-ff`` → ``AA:BB:CC:DD:EE:FF`` (vazio se inválido)."""
+    digits = _MAC_HEX_RE.sub("", str(value or "").upper())
+    if len(digits) != 12:
+        return ""
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def _text(value, max_length: int) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value if v not in (None, ""))
+    return str(value).strip()[:max_length]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _positive_int(value):
+    try:
+        number = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def _bool(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ("true", "1", "sim", "yes"):
+        return True
+    if text in ("false", "0", "não", "nao", "no"):
+        return False
+    return None
+
+
+def _as_list(value) -> list[dict]:
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [item for item in value if isinstance(item, dict)]
+
+
+def _memory_rows(machine) -> list[MachineMemoryModule]:
+    return [
+        MachineMemoryModule(
+            machine=machine,
+            bank_label=_text(module.get("bank_label"), 100),
+            device_locator=_text(module.get("device_locator"), 100),
+            capacity_gb=_float(module.get("capacity_gb")),
+            speed_mhz=_positive_int(module.get("speed_mhz")),
+            manufacturer=_text(module.get("manufacturer"), 100),
+        )
+        for module in _as_list(machine.memory_modules)
+    ]
+
+
+def _adapter_rows(machine) -> list[MachineNetworkAdapter]:
+    rows = []
+    for adapter in _as_list(machine.network_info):
+        mac = normalize_mac(adapter.get("mac"))
+        ips = (
+            extract_ipv4_values(adapter.get("ip"))
+            or extract_ipv4_values(adapter.get("ip_address"))
+            or extract_ipv4_values(adapter.get("ips"))
+        )
+        rows.append(MachineNetworkAdapter(
+            machine=machine,
+            name=_text(adapter.get("name"), 200),
+            mac=mac,
+            mac_prefix=mac[:8],
+            ip=ips[0] if ips else None,
+            gateway=_text(adapter.get("gateway"), 100),
+            dhcp=_bool(adapter.get("dhcp")),
+        ))
+    return rows
+
+
+def sync_machine_hardware(machine, force: bool = False) -> bool:
+    """
+    Projeta o hardware da máquina nas tabelas normalizadas se o payload mudou.
+
+    Returns:
+        True se as tabelas foram reescritas.
+    """
+    fingerprint = hardware_fingerprint(machine)
+    if not force and fingerprint == machine.hardware_hash:
+        return False
+
+    with transaction.atomic():
+        MachineMemoryModule.objects.filter(machine=machine).delete()
+        MachineMemoryModule.objects.bulk_create(_memory_rows(machine))
+        MachineNetworkAdapter.objects.filter(machine=machine).delete()
+        MachineNetworkAdapter.objects.bulk_create(_adapter_rows(machine))
+
+        tpm = machine.tpm if isinstance(machine.tpm, dict) else None
+        if tpm:
+            MachineTpm.objects.update_or_create(
+                machine=machine,
+                defaults={
+                    "present": _bool(tpm.get("present")),
+                    "ready": _bool(tpm.get("ready")),
+                    "enabled": _bool(tpm.get("enabled")),
+                    "spec_version": _text(tpm.get("spec_version"), 100),
+                    "manufacturer": _text(tpm.get("manufacturer"), 100),
+                },
+            )
+        else:
+            MachineTpm.objects.filter(machine=machine).delete()
+
+        Machine.objects.filter(pk=machine.pk).update(hardware_hash=fingerprint)
+    machine.hardware_hash = fingerprint
+    return True
+
+
+# ============================================================================
+# CONSULTAS DA FROTA
+# ============================================================================
+
+def machines_with_memory_below(gb: float):
+    """Máquinas cuja soma dos módulos projetados é menor que ``gb``."""
+    return (
+        Machine.objects.annotate(installed_memory_gb=Sum("hardware_memory__capacity_gb"))
+        .filter(installed_memory_gb__lt=gb)
+    )
+
+
+def machines_with_mac_prefix(prefix: str):
+    """Máquinas com alguma placa cujo MAC começa com ``prefix`` (ex.: ``00:1A:2B``)."""
+    digits = _MAC_HEX_RE.sub("", str(prefix or "").upper())[:12]
+    if not digits:
+        return Machine.objects.none()
+    normalized = ":".join(digits[i:i + 2] for i in range(0, len(digits), 2))
+    if len(digits) >= 6:
+        adapters = MachineNetworkAdapter.objects.filter(
+            mac_prefix=normalized[:8], mac__startswith=normalized,
+        )
+    else:
+        adapters = MachineNetworkAdapter.objects.filter(mac__startswith=normalized)
+    return Machine.objects.filter(pk__in=adapters.values("machine_id"))
+
+
+def machines_without_enabled_tpm():
+    """Máquinas sem TPM presente e habilitado (inclui as ainda sem projeção)."""
+    return Machine.objects.exclude(hardware_tpm__present=True, hardware_tpm__enabled=True)
@@ -0,0 +1,52 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+
+def _payload(adapters: int) -> bytes:
+    """Check-in representativo com ``adapters`` placas de rede e 4 módulos de memória."""
+    hardware = {
+        "logged_user": "DOMINIO\\usuario",
+        "manufacturer": "Dell Inc.\x00",
+        "cpu": "Intel(R) Core(TM) i5-10400 CPU @ 2.90GHz",
+        "tpm": {"present": True, "enabled": True, "spec_version": "2.0, 0, 1.59", "manufacturer_ver": "11.8.50.3399\x00"},
+        "memory_modules": [
+            {"bank_label": f"BANK {i}", "device_locator": f"DIMM{i}", "capacity_gb": 8, "speed_mhz": 2666,
+             "manufacturer": "Kingston\x00"}
+            for i in range(4)
+        ],
+        "network_adapters": [
+            {"name": f"Adaptador {i}", "mac": f"00:1A:2B:3C:{i // 256:02X}:{i % 256:02X}", "ip": f"10.0.{i // 256}.{i % 256}",
+             "gateway": "10.0.0.1", "dns": ["10.0.0.2", "10.0.0.3"], "dhcp": True}
+            for i in range(adapters)
+        ],
+    }
+    return json.dumps({"hostname": "PC-BENCH", "ip": "10.0.0.1", "token": "x", "hardware": hardware}).encode()
+
+
+class Command(BaseCommand):
+    help = "Mede o custo de decodificar e sanear payloads de check-in de tamanhos variados"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticoes", type=int, default=200, help="Execuções por tamanho de payload")
+
+    def handle(self, *args, **options):
+        from apps.inventory.sanitize import load_agent_json, sanitize_json, sanitize_str
+
+        repeticoes = max(1, options["repeticoes"])
+        for adapters in (2, 50, 500):
+            raw = _payload(adapters)
+            started = time.perf_counter()
+            for _ in range(repeticoes):
+                data = load_agent_json(raw)
+                hw = data["hardware"]
+                for key in ("tpm", "memory_modules", "network_adapters"):
+                    sanitize_json(hw.get(key))
+                for key in ("logged_user", "manufacturer", "cpu"):
+                    sanitize_str(hw.get(key))
+            elapsed_us = (time.perf_counter() - started) / repeticoes * 1_000_000
+            self.stdout.write(
+                f"{adapters:>4} adaptadores | {len(raw) / 1024:8.1f} KB | "
+                f"{elapsed_us:9.1f} µs/payload | {elapsed_us / (len(raw) / 1024):6.2f} µs/KB"
+            )
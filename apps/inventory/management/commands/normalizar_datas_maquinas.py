@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Converte install_date/last_boot (texto WMI) para os campos tipados os_installed_at/last_boot_at"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hostname", type=str, default="", help="Limita a uma máquina")
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Reprocessa também máquinas que já têm as datas tipadas",
+        )
+
+    def handle(self, *args, **options):
+        from django.db.models import Q
+
+        from apps.inventory.models import Machine
+        from apps.inventory.timestamps import normalize_machine_dates
+
+        machines = Machine.objects.only(
+            "id", "install_date", "last_boot", "os_installed_at", "last_boot_at",
+        ).order_by("pk")
+        if options["hostname"]:
+            machines = machines.filter(hostname__iexact=options["hostname"])
+            if not machines.exists():
+                raise CommandError(f'Máquina "{options["hostname"]}" não encontrada.')
+        if not options["forcar"]:
+            machines = machines.filter(
+                Q(os_installed_at__isnull=True, install_date__isnull=False)
+                | Q(last_boot_at__isnull=True, last_boot__isnull=False)
+            )
+
+        total = normalize_machine_dates(machines, force=options["forcar"])
+        self.stdout.write(self.style.SUCCESS(f"Datas normalizadas: {total} máquina(s) atualizada(s)"))
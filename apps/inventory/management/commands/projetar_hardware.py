@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Projeta memória, rede e TPM de Machine nas tabelas de hardware normalizadas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hostname", type=str, default="", help="Limita a uma máquina")
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Reescreve mesmo quando o hash do hardware não mudou",
+        )
+
+    def handle(self, *args, **options):
+        from apps.inventory.models import Machine
+        from apps.inventory.hardware import sync_machine_hardware
+
+        machines = Machine.objects.only(
+            "id", "hostname", "memory_modules", "network_info", "tpm", "hardware_hash",
+        ).order_by("pk")
+        if options["hostname"]:
+            machines = machines.filter(hostname__iexact=options["hostname"])
+            if not machines.exists():
+                raise CommandError(f'Máquina "{options["hostname"]}" não encontrada.')
+
+        total = atualizadas = 0
+        for machine in machines.iterator(chunk_size=200):
+            total += 1
+            if sync_machine_hardware(machine, force=options["forcar"]):
+                atualizadas += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Hardware projetado: {atualizadas} de {total} máquina(s) atualizada(s)"
+        ))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Reconstrói os resumos diários de atividade (ResumoAtividadeDiaria) a partir de LogAtividade"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hostname", type=str, default="", help="Limita a uma máquina")
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=0,
+            help="Recalcula apenas os últimos N dias (0 = todo o histórico)",
+        )
+
+    def handle(self, *args, **options):
+        from apps.inventory.models import Machine
+        from apps.inventory.activity_utils import recalcular_resumos
+
+        machine = None
+        if options["hostname"]:
+            machine = Machine.objects.filter(hostname__iexact=options["hostname"]).first()
+            if not machine:
+                raise CommandError(f'Máquina "{options["hostname"]}" não encontrada.')
+
+        desde = None
+        if options["dias"] > 0:
+            desde = timezone.localdate() - timedelta(days=options["dias"] - 1)
+
+        total = recalcular_resumos(machine=machine, desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"Resumos de atividade recalculados: {total} linha(s)"))
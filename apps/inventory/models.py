@@ -1,9 +1,12 @@
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 import secrets
 import string
 import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class MachineGroup(models.Model):
@@ -41,6 +44,9 @@ class Machine(models.Model):
     os_build        = models.CharField("Build SO", max_length=20, null=True, blank=True)
     install_date    = models.CharField("Instalação SO", max_length=50, null=True, blank=True)
     last_boot       = models.CharField("Último Boot", max_length=50, null=True, blank=True)
+    # Versões tipadas de install_date/last_boot, convertidas no check-in (apps.inventory.timestamps)
+    os_installed_at = models.DateTimeField("Instalação SO (data)", null=True, blank=True, db_index=True)
+    last_boot_at    = models.DateTimeField("Último Boot (data)", null=True, blank=True, db_index=True)
     uptime_days     = models.FloatField("Uptime (dias)", null=True, blank=True)
 
     cpu             = models.CharField("CPU", max_length=200, null=True, blank=True)
@@ -58,12 +64,20 @@ class Machine(models.Model):
     is_online = models.BooleanField("Online", default=False)
     group     = models.ForeignKey(MachineGroup, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Hash do último payload de hardware projetado (apps.inventory.hardware)
+    hardware_hash = models.CharField("Hash do Hardware", max_length=64, blank=True, default="")
+
     def __str__(self):
         return self.hostname
 
     class Meta:
         verbose_name = "Máquina"
         verbose_name_plural = "Máquinas"
+        indexes = [
+            # Paginação por cursor da listagem (apps.inventory.search)
+            models.Index(fields=["-last_seen", "-id"], name="machine_last_seen_keyset"),
+            models.Index(fields=["ram_gb"], name="machine_ram_gb"),
+        ]
 
     def update_online_status(self):
         new_status = self.is_currently_online
@@ -220,6 +234,16 @@ class Notification(models.Model):
         help_text='Data e hora de expiração (opcional)'
     )
 
+    broadcast = models.ForeignKey(
+        'NotificationBroadcast',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name='Envio em massa',
+        help_text='Envio em massa que originou esta notificação (se houver)'
+    )
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Notificação'
@@ -298,6 +322,124 @@ class Notification(models.Model):
         super().save(*args, **kwargs)
 
 
+class NotificationBroadcast(models.Model):
+    """
+    Envio em massa de uma notificação para grupos, máquinas ou a frota toda.
+
+    Guarda o conteúdo uma única vez e distribui com ``bulk_create`` uma
+    Notification por máquina destinatária — o agente continua lendo pelo
+    MachineNotificationView, e o estado de leitura fica no is_read de cada
+    linha. Notificar a frota inteira custa um SELECT de IDs e um INSERT em
+    lote, sem disparar post_save por máquina.
+    """
+
+    title = models.CharField(max_length=200, verbose_name='Título')
+    message = models.TextField(verbose_name='Mensagem')
+    type = models.CharField(
+        max_length=20,
+        choices=Notification.TYPE_CHOICES,
+        default='info',
+        verbose_name='Tipo',
+    )
+    priority = models.CharField(
+        max_length=20,
+        choices=Notification.PRIORITY_CHOICES,
+        default='normal',
+        verbose_name='Prioridade',
+    )
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Expira em')
+
+    groups = models.ManyToManyField(
+        MachineGroup,
+        blank=True,
+        related_name='notification_broadcasts',
+        verbose_name='Grupos',
+    )
+    all_machines = models.BooleanField(default=False, verbose_name='Todas as máquinas')
+    recipients_count = models.PositiveIntegerField(default=0, verbose_name='Destinatários')
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notification_broadcasts',
+        verbose_name='Criado por',
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Envio em Massa'
+        verbose_name_plural = 'Envios em Massa'
+
+    def __str__(self):
+        return f'{self.title} ({self.recipients_count} máquina(s))'
+
+    def fan_out(self, machine_ids, batch_size: int = 500) -> int:
+        """
+        Cria uma Notification por máquina em ``machine_ids`` via bulk_create.
+
+        bulk_create não chama save() — o status de expiração que o save()
+        de Notification calcularia é aplicado aqui.
+
+        Returns:
+            Quantidade de notificações criadas.
+        """
+        status = 'pending'
+        if self.expires_at and timezone.now() > self.expires_at:
+            status = 'expired'
+
+        # Lotes e contador numa transação: falha no meio não deixa envio parcial
+        with transaction.atomic():
+            created = Notification.objects.bulk_create(
+                [
+                    Notification(
+                        machine_id=machine_id,
+                        broadcast=self,
+                        title=self.title,
+                        message=self.message,
+                        type=self.type,
+                        priority=self.priority,
+                        status=status,
+                        expires_at=self.expires_at,
+                    )
+                    for machine_id in machine_ids
+                ],
+                batch_size=batch_size,
+            )
+            self.recipients_count = len(created)
+            self.save(update_fields=['recipients_count'])
+        if status == 'pending':
+            transaction.on_commit(lambda: _push_notifications(created))
+        return self.recipients_count
+
+    @property
+    def read_count(self) -> int:
+        """Quantas máquinas já marcaram a notificação como lida."""
+        return self.notifications.filter(is_read=True).count()
+
+
+def _push_notifications(notifications) -> None:
+    """
+    Avisa (on_commit) os agentes conectados ao gateway que há notificação
+    nova. O envio roda no worker (``inventory.avisar_notificacoes``), um
+    aviso por máquina — a requisição não paga pelos round-trips.
+    """
+    from .gateway import gateway_enabled
+
+    machine_ids = sorted({n.machine_id for n in notifications if n.machine_id})
+    if not machine_ids or not gateway_enabled():
+        return
+    from .tasks import avisar_notificacoes
+
+    try:
+        avisar_notificacoes.delay(machine_ids)
+    except Exception as e:
+        # O polling continua entregando as notificações
+        logger.warning(f"AgentGateway | falha ao agendar aviso de notificações: {e}")
+
+
 class AgentToken(models.Model):
     """Token de instalação do agente"""
 
@@ -689,8 +831,16 @@ class RemoteCommandAudit(models.Model):
     source_ip = models.GenericIPAddressField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     exit_code = models.IntegerField(null=True, blank=True)
+    # stdout/stderr guardam apenas uma prévia; a saída completa fica
+    # comprimida (gzip) em stdout_file/stderr_file — ver command_output.py
     stdout = models.TextField(blank=True)
     stderr = models.TextField(blank=True)
+    stdout_size = models.PositiveIntegerField(default=0)
+    stderr_size = models.PositiveIntegerField(default=0)
+    stdout_sha256 = models.CharField(max_length=64, blank=True)
+    stderr_sha256 = models.CharField(max_length=64, blank=True)
+    stdout_file = models.FileField(upload_to="command_output/%Y/%m/%d/", blank=True)
+    stderr_file = models.FileField(upload_to="command_output/%Y/%m/%d/", blank=True)
     error = models.TextField(blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -708,3 +858,167 @@ class RemoteCommandAudit(models.Model):
 
     def __str__(self) -> str:
         return f"{self.machine.hostname} | {self.command_type} | {self.status} | {self.started_at:%d/%m/%Y %H:%M}"
+
+
+class ResumoAtividadeDiaria(models.Model):
+    """
+    Contador pré-agregado de LogAtividade por máquina, dia, tipo e aplicativo.
+
+    Mantido incrementalmente pelo AgentActivityAPIView a cada lote recebido
+    e reconstruível pelo comando ``recalcular_resumo_atividade``. Rankings
+    de apps, gráficos diários e resumos da frota leem desta tabela em vez
+    de agregar os logs brutos a cada requisição.
+
+    Para login/logoff ``app_nome`` fica vazio — o contador é por tipo.
+    """
+
+    machine = models.ForeignKey(
+        "Machine",
+        on_delete=models.CASCADE,
+        related_name="resumos_atividade",
+        verbose_name="Máquina",
+    )
+    dia = models.DateField(verbose_name="Dia")
+    tipo = models.CharField(
+        max_length=20,
+        choices=LogAtividade.TIPO_CHOICES,
+        verbose_name="Tipo",
+    )
+    app_nome = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Aplicativo",
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name="Total")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        ordering = ["-dia", "-total"]
+        verbose_name = "Resumo Diário de Atividade"
+        verbose_name_plural = "Resumos Diários de Atividade"
+        unique_together = (("machine", "dia", "tipo", "app_nome"),)
+        indexes = [
+            models.Index(fields=["machine", "tipo", "dia"]),
+            models.Index(fields=["tipo", "dia"]),
+        ]
+
+    def __str__(self) -> str:
+        alvo = self.app_nome or self.get_tipo_display()
+        return f"{self.machine.hostname} | {self.dia:%d/%m/%Y} | {alvo} | {self.total}"
+
+
+class AgentRoute(models.Model):
+    """
+    Alcançabilidade de um endereço candidato do agente (máquina, IP, porta).
+
+    Alimentada pelo prober em background (apps/inventory/reachability.py) e
+    pelas próprias chamadas diretas; as views consultam a tabela para tentar
+    primeiro o endereço que sabidamente responde.
+    """
+    machine = models.ForeignKey(
+        Machine,
+        on_delete=models.CASCADE,
+        related_name="agent_routes",
+        verbose_name="Máquina",
+    )
+    ip = models.GenericIPAddressField(protocol="IPv4", verbose_name="IP")
+    port = models.PositiveIntegerField(verbose_name="Porta")
+    latency_ms = models.FloatField(null=True, blank=True, verbose_name="Latência média (ms)")
+    success_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rota do Agente"
+        verbose_name_plural = "Rotas dos Agentes"
+        unique_together = (("machine", "ip", "port"),)
+
+    def __str__(self) -> str:
+        return f"{self.machine.hostname} → {self.ip}:{self.port}"
+
+
+# ============================================================================
+# INVENTÁRIO DE HARDWARE NORMALIZADO
+# ============================================================================
+# Projeção dos JSONFields memory_modules, network_info e tpm de Machine,
+# reescrita por apps.inventory.hardware só quando o payload muda.
+
+class MachineMemoryModule(models.Model):
+    machine = models.ForeignKey(
+        Machine,
+        on_delete=models.CASCADE,
+        related_name="hardware_memory",
+        verbose_name="Máquina",
+    )
+    bank_label = models.CharField("Banco", max_length=100, blank=True, default="")
+    device_locator = models.CharField("Localizador", max_length=100, blank=True, default="")
+    capacity_gb = models.FloatField("Capacidade (GB)", null=True, blank=True)
+    speed_mhz = models.PositiveIntegerField("Velocidade (MHz)", null=True, blank=True)
+    manufacturer = models.CharField("Fabricante", max_length=100, blank=True, default="")
+
+    class Meta:
+        verbose_name = "Módulo de Memória"
+        verbose_name_plural = "Módulos de Memória"
+        indexes = [
+            models.Index(fields=["capacity_gb"], name="hw_mem_capacity"),
+            models.Index(fields=["manufacturer"], name="hw_mem_manufacturer"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.machine.hostname} | {self.device_locator or self.bank_label} | {self.capacity_gb} GB"
+
+
+class MachineNetworkAdapter(models.Model):
+    machine = models.ForeignKey(
+        Machine,
+        on_delete=models.CASCADE,
+        related_name="hardware_adapters",
+        verbose_name="Máquina",
+    )
+    name = models.CharField("Nome", max_length=200, blank=True, default="")
+    mac = models.CharField("MAC", max_length=17, blank=True, default="")
+    # OUI (três primeiros octetos) — filtro por fabricante da placa
+    mac_prefix = models.CharField("Prefixo MAC", max_length=8, blank=True, default="")
+    ip = models.GenericIPAddressField("IP", null=True, blank=True)
+    gateway = models.CharField("Gateway", max_length=100, blank=True, default="")
+    dhcp = models.BooleanField("DHCP", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Adaptador de Rede"
+        verbose_name_plural = "Adaptadores de Rede"
+        indexes = [
+            models.Index(fields=["mac"], name="hw_net_mac"),
+            models.Index(fields=["mac_prefix"], name="hw_net_mac_prefix"),
+            models.Index(fields=["ip"], name="hw_net_ip"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.machine.hostname} | {self.name} | {self.mac or '-'}"
+
+
+class MachineTpm(models.Model):
+    machine = models.OneToOneField(
+        Machine,
+        on_delete=models.CASCADE,
+        related_name="hardware_tpm",
+        verbose_name="Máquina",
+    )
+    present = models.BooleanField("Presente", null=True, blank=True)
+    ready = models.BooleanField("Pronto", null=True, blank=True)
+    enabled = models.BooleanField("Habilitado", null=True, blank=True)
+    spec_version = models.CharField("Versão Spec", max_length=100, blank=True, default="")
+    manufacturer = models.CharField("Fabricante", max_length=100, blank=True, default="")
+
+    class Meta:
+        verbose_name = "TPM"
+        verbose_name_plural = "TPMs"
+        indexes = [
+            models.Index(fields=["present", "enabled"], name="hw_tpm_state"),
+            models.Index(fields=["spec_version"], name="hw_tpm_spec"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.machine.hostname} | TPM {self.spec_version or '-'}"
@@ -0,0 +1,86 @@
+"""
+Política de sites bloqueados compilada e versionada por máquina.
+
+O MachineCheckinView.get é consultado pelo agente a cada poll. Em vez de
+consultar BlockedSite (por máquina e por grupo) a cada chamada, a lista
+efetiva é compilada uma vez por hostname, guardada no cache junto com um
+hash de versão e reaproveitada até ser invalidada pelos signals de
+BlockedSite, MachineGroup e Machine (mudança de grupo).
+
+Invalidação global usa um contador de geração embutido na chave — subir a
+geração descarta todas as políticas compiladas sem precisar enumerá-las.
+Com LocMemCache (padrão) cada processo tem sua cópia; o TTL limita quanto
+tempo um worker pode servir uma política antiga. Em produção configure um
+cache compartilhado (Redis) para a invalidação valer entre workers.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import BlockedSite, Machine
+
+POLICY_CACHE_TIMEOUT = 300
+_GENERATION_KEY = "inventory:blocked-sites:generation"
+
+
+def _generation() -> int:
+    cache.add(_GENERATION_KEY, 1, timeout=None)
+    return cache.get(_GENERATION_KEY, 1)
+
+
+def _policy_key(hostname: str, generation: int | None = None) -> str:
+    if generation is None:
+        generation = _generation()
+    return f"inventory:blocked-sites:{generation}:{hostname}"
+
+
+def invalidate_blocked_sites() -> None:
+    """Descarta todas as políticas compiladas (mudança em BlockedSite/MachineGroup)."""
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, 2, timeout=None)
+
+
+def invalidate_machine_policy(hostname: str) -> None:
+    """Descarta apenas a política compilada de uma máquina."""
+    cache.delete(_policy_key(hostname))
+
+
+def compile_blocked_sites(hostname: str) -> dict:
+    """Monta a lista efetiva (máquina + grupo) e o hash de versão."""
+    sites = sorted(set(
+        BlockedSite.objects.filter(
+            Q(machine__hostname=hostname) | Q(group__machine__hostname=hostname)
+        ).values_list("url", flat=True)
+    ))
+    group_id = (
+        Machine.objects.filter(hostname=hostname).values_list("group_id", flat=True).first()
+    )
+    version = hashlib.sha256(json.dumps(sites).encode("utf-8")).hexdigest()
+    return {"version": version, "sites": sites, "group_id": group_id}
+
+
+def get_blocked_sites_policy(hostname: str) -> dict:
+    """Retorna a política compilada do hostname, compilando na primeira chamada."""
+    key = _policy_key(hostname)
+    policy = cache.get(key)
+    if policy is None:
+        policy = compile_blocked_sites(hostname)
+        cache.set(key, policy, timeout=POLICY_CACHE_TIMEOUT)
+    return policy
+
+
+def discard_if_group_changed(machine) -> None:
+    """
+    Descarta a política da máquina se ela foi compilada com outro grupo.
+
+    Chamado no post_save de Machine — o check-in salva a máquina a cada
+    poll, então só invalida quando o grupo realmente mudou.
+    """
+    key = _policy_key(machine.hostname)
+    policy = cache.get(key)
+    if policy is not None and policy["group_id"] != machine.group_id:
+        cache.delete(key)
@@ -0,0 +1,295 @@
+"""
+Alcançabilidade dos agentes: endereços candidatos e tabela de rotas.
+
+As chamadas diretas ao agente (comandos remotos, RDP) tentavam os IPs
+candidatos um a um no caminho da requisição, pagando o connect timeout de
+cada IP morto, e só lembravam o vencedor no cache local do processo.
+
+Aqui:
+
+- ``probe_machine`` / ``probe_fleet`` testam em background (Celery, task
+  ``inventory.sondar_rotas_agentes``) a porta do agente em cada IP
+  candidato, registrando sucesso e latência em AgentRoute. Cada execução
+  de ``probe_fleet`` sonda no máximo ``PROBE_BATCH_SIZE`` máquinas — as de
+  rota mais antiga primeiro, pulando as sondadas (ou usadas) há menos de
+  ``PROBE_INTERVAL`` — e grava tudo com um único ``bulk_create``;
+- as chamadas diretas também registram o resultado (``record_route``);
+- ``ranked_ips`` devolve os candidatos na ordem: rotas que respondem (por
+  latência), IPs ainda não sondados, e por último rotas falhando — rotas
+  dadas como mortas ficam de fora quando existe alternativa.
+"""
+import concurrent.futures
+import ipaddress
+import logging
+import re
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import AgentRoute, Machine
+
+logger = logging.getLogger(__name__)
+
+AGENT_WEBRTC_PORT = getattr(settings, "AGENT_WEBRTC_PORT", 7071)
+PROBE_TIMEOUT = float(getattr(settings, "AGENT_PROBE_TIMEOUT", 1.0))
+PROBE_WORKERS = 32
+# Máquinas sondadas por execução de probe_fleet, e intervalo mínimo entre
+# duas sondagens da mesma máquina
+PROBE_BATCH_SIZE = int(getattr(settings, "AGENT_PROBE_BATCH_SIZE", 200))
+PROBE_INTERVAL = timedelta(minutes=getattr(settings, "AGENT_PROBE_INTERVAL_MINUTES", 10))
+# Rota com esta quantidade de falhas seguidas é considerada morta
+ROUTE_DOWN_AFTER = 3
+# Peso da nova amostra na média móvel de latência
+LATENCY_EWMA_ALPHA = 0.3
+
+
+# ============================================================================
+# ENDEREÇOS CANDIDATOS
+# ============================================================================
+
+def extract_ipv4_values(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        raw_values = value
+    else:
+        raw_values = re.split(r"[,;\s]+", str(value))
+
+    ips: list[str] = []
+    for raw in raw_values:
+        candidate = str(raw).strip().strip("[]")
+        if not candidate:
+            continue
+        try:
+            ip = ipaddress.ip_address(candidate)
+        except ValueError:
+            continue
+        if ip.version != 4:
+            continue
+        if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_unspecified:
+            continue
+        ips.append(str(ip))
+    return ips
+
+
+def machine_ip_candidates(machine) -> list[str]:
+    """IPv4 candidatos da máquina: ip_address e IPs das placas em network_info."""
+    candidates: list[str] = []
+
+    def add(value):
+        for ip in extract_ipv4_values(value):
+            if ip not in candidates:
+                candidates.append(ip)
+
+    add(getattr(machine, "ip_address", ""))
+    network_info = getattr(machine, "network_info", None)
+    if isinstance(network_info, list):
+        for adapter in network_info:
+            if not isinstance(adapter, dict):
+                continue
+            add(adapter.get("ip"))
+            add(adapter.get("ip_address"))
+            add(adapter.get("ips"))
+    elif isinstance(network_info, dict):
+        add(network_info.get("ip"))
+        add(network_info.get("ip_address"))
+        add(network_info.get("ips"))
+        adapters = network_info.get("adapters")
+        if isinstance(adapters, list):
+            for adapter in adapters:
+                if isinstance(adapter, dict):
+                    add(adapter.get("ip"))
+                    add(adapter.get("ip_address"))
+                    add(adapter.get("ips"))
+    return candidates
+
+
+# ============================================================================
+# TABELA DE ROTAS
+# ============================================================================
+
+def record_route(machine, ip: str, port: int, ok: bool, latency_ms: float | None = None) -> None:
+    """Registra o resultado de uma tentativa (sonda ou chamada real) em AgentRoute."""
+    now = timezone.now()
+    try:
+        route, _ = AgentRoute.objects.get_or_create(machine=machine, ip=ip, port=port)
+        if ok:
+            updates = {
+                "success_count": F("success_count") + 1,
+                "consecutive_failures": 0,
+                "last_success_at": now,
+                "updated_at": now,
+            }
+            if latency_ms is not None:
+                previous = route.latency_ms
+                updates["latency_ms"] = (
+                    latency_ms if previous is None
+                    else previous + LATENCY_EWMA_ALPHA * (latency_ms - previous)
+                )
+        else:
+            updates = {
+                "failure_count": F("failure_count") + 1,
+                "consecutive_failures": F("consecutive_failures") + 1,
+                "last_failure_at": now,
+                "updated_at": now,
+            }
+        AgentRoute.objects.filter(pk=route.pk).update(**updates)
+    except Exception as e:
+        logger.warning(f"AgentRoute | falha ao registrar {machine.hostname} {ip}:{port}: {e}")
+
+
+def record_routes(results: list[tuple], port: int) -> None:
+    """
+    Registra [(machine, ip, latência em ms | None)] de uma sondagem: lê as
+    rotas existentes numa consulta e grava todas com um ``bulk_create``.
+    """
+    if not results:
+        return
+    now = timezone.now()
+    existing = {
+        (route.machine_id, route.ip): route
+        for route in AgentRoute.objects.filter(machine_id__in={m.pk for m, _, _ in results}, port=port)
+    }
+    rows = []
+    for machine, ip, latency_ms in results:
+        previous = existing.get((machine.pk, ip)) or AgentRoute()
+        # Sem pk: o conflito tratado é o de (machine, ip, port)
+        route = AgentRoute(
+            machine_id=machine.pk, ip=ip, port=port,
+            latency_ms=previous.latency_ms,
+            success_count=previous.success_count,
+            failure_count=previous.failure_count,
+            consecutive_failures=previous.consecutive_failures,
+            last_success_at=previous.last_success_at,
+            last_failure_at=previous.last_failure_at,
+            updated_at=now,
+        )
+        if latency_ms is not None:
+            route.success_count += 1
+            route.consecutive_failures = 0
+            route.last_success_at = now
+            route.latency_ms = (
+                latency_ms if route.latency_ms is None
+                else route.latency_ms + LATENCY_EWMA_ALPHA * (latency_ms - route.latency_ms)
+            )
+        else:
+            route.failure_count += 1
+            route.consecutive_failures += 1
+            route.last_failure_at = now
+        rows.append(route)
+    AgentRoute.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["machine", "ip", "port"],
+        update_fields=[
+            "latency_ms", "success_count", "failure_count", "consecutive_failures",
+            "last_success_at", "last_failure_at", "updated_at",
+        ],
+    )
+
+
+def _route_rank(route: AgentRoute | None):
+    if route is None:
+        return (1, 0.0)
+    if route.consecutive_failures == 0 and route.last_success_at:
+        return (0, route.latency_ms if route.latency_ms is not None else float("inf"))
+    return (2, float(route.consecutive_failures))
+
+
+def ranked_ips(machine, port: int = AGENT_WEBRTC_PORT) -> list[str]:
+    """
+    Candidatos da máquina ordenados pela tabela de rotas.
+
+    Rotas com ``ROUTE_DOWN_AFTER`` falhas seguidas são omitidas se houver
+    outro candidato; se todas estiverem mortas, ainda são devolvidas.
+    """
+    candidates = machine_ip_candidates(machine)
+    if not candidates:
+        return []
+    routes = {
+        r.ip: r for r in AgentRoute.objects.filter(machine=machine, port=port, ip__in=candidates)
+    }
+    ordered = sorted(candidates, key=lambda ip: _route_rank(routes.get(ip)))
+    alive = [
+        ip for ip in ordered
+        if ip not in routes or routes[ip].consecutive_failures < ROUTE_DOWN_AFTER
+    ]
+    return alive or ordered
+
+
+def has_known_route(machine, port: int = AGENT_WEBRTC_PORT) -> bool:
+    """True se algum IP da máquina respondeu na última tentativa."""
+    return AgentRoute.objects.filter(
+        machine=machine, port=port, consecutive_failures=0, last_success_at__isnull=False,
+    ).exists()
+
+
+# ============================================================================
+# SONDAGEM
+# ============================================================================
+
+def _tcp_probe(ip: str, port: int, timeout: float) -> float | None:
+    """Tempo de connect TCP em ms, ou None se não conectou."""
+    started = time.monotonic()
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return (time.monotonic() - started) * 1000
+    except OSError:
+        return None
+
+
+def _probe_targets(targets: list[tuple], port: int, timeout: float) -> list:
+    """Connect TCP em paralelo para [(machine, ip)] — só rede, sem acesso ao banco."""
+    if not targets:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(targets), PROBE_WORKERS)) as pool:
+        return list(pool.map(lambda target: _tcp_probe(target[1], port, timeout), targets))
+
+
+def _probe_and_record(machines, port: int, timeout: float) -> dict:
+    targets = [(m, ip) for m in machines for ip in machine_ip_candidates(m)]
+    latencies = _probe_targets(targets, port, timeout)
+    try:
+        record_routes([(machine, ip, latency) for (machine, ip), latency in zip(targets, latencies)], port)
+    except Exception as e:
+        logger.warning(f"AgentRoute | falha ao registrar sondagem de {len(targets)} rota(s): {e}")
+    results: dict = {}
+    for (machine, ip), latency in zip(targets, latencies):
+        results.setdefault(machine.pk, {})[ip] = latency
+    return results
+
+
+def probe_machine(machine, port: int = AGENT_WEBRTC_PORT, timeout: float = PROBE_TIMEOUT) -> dict:
+    """Sonda os IPs candidatos da máquina. Retorna {ip: latência em ms | None}."""
+    return _probe_and_record([machine], port, timeout).get(machine.pk, {})
+
+
+def probe_fleet(port: int = AGENT_WEBRTC_PORT, timeout: float = PROBE_TIMEOUT,
+                batch_size: int = PROBE_BATCH_SIZE) -> dict:
+    """
+    Sonda até ``batch_size`` máquinas com heartbeat recente cujas rotas não
+    foram atualizadas nos últimos ``PROBE_INTERVAL`` — nunca sondadas
+    primeiro, depois as de atualização mais antiga.
+
+    Returns:
+        {"machines": n, "reachable": n}
+    """
+    now = timezone.now()
+    offline_after = getattr(settings, "MACHINE_OFFLINE_TIMEOUT", 15)
+    machines = list(
+        Machine.objects.filter(last_seen__gte=now - timedelta(minutes=offline_after))
+        .annotate(last_probe=Max("agent_routes__updated_at", filter=Q(agent_routes__port=port)))
+        .filter(Q(last_probe__isnull=True) | Q(last_probe__lt=now - PROBE_INTERVAL))
+        .order_by(F("last_probe").asc(nulls_first=True), "pk")
+        .only("id", "hostname", "ip_address", "network_info")[:batch_size]
+    )
+    results = _probe_and_record(machines, port, timeout)
+    reachable = sum(
+        1 for latencies in results.values() if any(v is not None for v in latencies.values())
+    )
+    logger.info("AgentRoute | sondadas=%d alcançáveis=%d", len(machines), reachable)
+    return {"machines": len(machines), "reachable": reachable}
@@ -0,0 +1,151 @@
+"""
+Saneamento e decodificação limitada dos payloads JSON do agente.
+
+PostgreSQL rejeita ``\\u0000`` em text/varchar e dentro de jsonb
+("unsupported Unicode escape sequence"); o PowerShell serializa strings
+WMI com null bytes no final (ex.: ``tpm.manufacturer_ver = '11.8.50.3399\\x00'``).
+
+A versão anterior (em views.py) filtrava cada string caractere a caractere
+com ``ord()`` e percorria o payload inteiro em Python a cada check-in. Aqui
+o caso comum — string sem null byte — custa um ``in`` em C; só as strings
+afetadas passam pela tabela de tradução pré-compilada.
+
+``read_agent_body`` recusa o corpo pelo Content-Length e lê no máximo
+``AGENT_PAYLOAD_MAX_BYTES`` + 1 bytes do stream; ``load_agent_json`` mede
+o aninhamento nos próprios bytes (``json_nesting_exceeds``) antes do
+``json.loads`` — um corpo gigante ou aninhado demais é recusado sem ser
+lido inteiro nem decodificado.
+"""
+import json
+import re
+
+from django.conf import settings
+
+AGENT_PAYLOAD_MAX_BYTES = getattr(settings, "AGENT_PAYLOAD_MAX_BYTES", 2 * 1024 * 1024)
+AGENT_PAYLOAD_MAX_DEPTH = getattr(settings, "AGENT_PAYLOAD_MAX_DEPTH", 32)
+
+_NULL_TABLE = str.maketrans("", "", "\x00")
+# Null byte real e as sequências literais que o agente às vezes envia escapadas
+_NULL_TEXT_RE = re.compile(r"\x00|\\u0000|\\x00")
+
+
+class PayloadError(ValueError):
+    """Payload do agente recusado; ``status`` é o código HTTP sugerido."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def sanitize_str(v) -> "str | None":
+    """
+    Texto para CharField: sem null bytes (reais ou escapados), sem espaços
+    nas pontas; None se vazio, None ou a string "none".
+    """
+    if v is None:
+        return None
+    text = v if isinstance(v, str) else str(v)
+    if "\x00" in text or "\\" in text:
+        text = _NULL_TEXT_RE.sub("", text)
+    text = text.strip()
+    return text if text and text.lower() != "none" else None
+
+
+def _clean(obj):
+    if isinstance(obj, str):
+        if "\x00" in obj:
+            obj = obj.translate(_NULL_TABLE)
+        return obj or None
+    if isinstance(obj, dict):
+        return {k: _clean(val) for k, val in obj.items()}
+    if isinstance(obj, list):
+        return [_clean(item) for item in obj]
+    return obj
+
+
+def sanitize_json(v):
+    """
+    Garante dict/list ou None para JSONField, sem null bytes nas strings.
+
+    Aceita também o JSON serializado em string (agentes antigos).
+    """
+    if v is None:
+        return None
+    if isinstance(v, str):
+        try:
+            v = json.loads(v)
+        except (ValueError, RecursionError):
+            return None
+    if isinstance(v, (dict, list)):
+        return _clean(v)
+    return None
+
+
+def read_agent_body(request, max_bytes: int | None = None) -> bytes:
+    """
+    Corpo da requisição, lendo no máximo ``max_bytes`` + 1 bytes.
+
+    Raises:
+        PayloadError: Content-Length ou corpo maior que ``max_bytes`` (413).
+    """
+    max_bytes = AGENT_PAYLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        declared = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        declared = 0
+    if declared > max_bytes:
+        raise PayloadError(f"payload excede {max_bytes} bytes", status=413)
+    raw = request.read(max_bytes + 1)
+    if len(raw) > max_bytes:
+        raise PayloadError(f"payload excede {max_bytes} bytes", status=413)
+    return raw
+
+
+# Tudo que não é delimitador de array/objeto (para bytes.translate)
+_NON_BRACKET_BYTES = bytes(c for c in range(256) if c not in b"[]{}")
+_EMPTY_PAIR_RE = re.compile(rb"\[\]|\{\}")
+
+
+def json_nesting_exceeds(raw: bytes, max_depth: int) -> bool:
+    """
+    True se o JSON em ``raw`` tem mais que ``max_depth`` níveis de [] / {}.
+
+    Trabalha sobre os bytes, sem decodificar: tira os escapes, descarta o
+    conteúdo das strings e tudo que não é delimitador, e remove um nível de
+    pares vazios por passada — só operações de bytes/regex em C. JSON
+    malformado devolve False — o ``json.loads`` recusa depois.
+    """
+    unescaped = raw.replace(b"\\\\", b"").replace(b'\\"', b"")
+    outside_strings = b"".join(unescaped.split(b'"')[::2])
+    brackets = outside_strings.translate(None, _NON_BRACKET_BYTES)
+    for _ in range(max_depth):
+        if not brackets:
+            return False
+        brackets, removed = _EMPTY_PAIR_RE.subn(b"", brackets)
+        if not removed:
+            return False
+    return bool(brackets)
+
+
+def load_agent_json(raw, max_bytes: int | None = None, max_depth: int | None = None):
+    """
+    Decodifica o corpo JSON do agente com limites de tamanho e profundidade.
+
+    Raises:
+        PayloadError: corpo maior que ``max_bytes`` (413), JSON inválido ou
+        mais profundo que ``max_depth`` (400).
+    """
+    max_bytes = AGENT_PAYLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    max_depth = AGENT_PAYLOAD_MAX_DEPTH if max_depth is None else max_depth
+    if len(raw) > max_bytes:
+        raise PayloadError(f"payload excede {max_bytes} bytes", status=413)
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8", errors="replace")
+    if json_nesting_exceeds(raw, max_depth):
+        raise PayloadError(f"payload excede {max_depth} níveis de aninhamento")
+    try:
+        return json.loads(raw)
+    except RecursionError:
+        raise PayloadError(f"payload excede {max_depth} níveis de aninhamento")
+    except ValueError as e:
+        raise PayloadError(f"JSON inválido: {e}")
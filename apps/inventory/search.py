@@ -0,0 +1,214 @@
+"""
+Busca e paginação por cursor (keyset) da listagem de máquinas.
+
+MachineListView filtrava com vários ``icontains`` e paginava com OFFSET —
+scans sequenciais e páginas profundas cada vez mais caras em frotas
+grandes. Aqui:
+
+- ``filter_machines`` aplica os filtros da listagem;
+- ``ensure_search_indexes`` (post_migrate, só PostgreSQL) cria índices
+  trigram GIN sobre as mesmas expressões que o Django gera para
+  ``icontains`` (``UPPER(col::text)`` / ``UPPER(HOST(ip))``), de modo que
+  o LIKE '%...%' use índice;
+- ``keyset_page`` pagina por (last_seen DESC NULLS FIRST, id DESC) usando
+  o cursor do último/primeiro item, coberto pelo índice
+  ``machine_last_seen_keyset`` declarado em Machine.Meta.
+"""
+import base64
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Machine
+
+logger = logging.getLogger(__name__)
+
+MACHINE_PAGE_SIZE = 20
+
+
+# ============================================================================
+# ÍNDICES TRIGRAM (PostgreSQL)
+# ============================================================================
+
+def _trigram_index_sql(connection) -> list[str]:
+    qn = connection.ops.quote_name
+    table = qn(Machine._meta.db_table)
+    hostname = qn(Machine._meta.get_field("hostname").column)
+    logged_user = qn(Machine._meta.get_field("loggedUser").column)
+    ip_address = qn(Machine._meta.get_field("ip_address").column)
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS inventory_machine_hostname_trgm "
+        f"ON {table} USING gin (UPPER({hostname}::text) gin_trgm_ops)",
+        f"CREATE INDEX IF NOT EXISTS inventory_machine_loggeduser_trgm "
+        f"ON {table} USING gin (UPPER({logged_user}::text) gin_trgm_ops)",
+        f"CREATE INDEX IF NOT EXISTS inventory_machine_ip_trgm "
+        f"ON {table} USING gin (UPPER(HOST({ip_address})) gin_trgm_ops)",
+    ]
+
+
+def ensure_search_indexes(sender, using="default", **kwargs):
+    """
+    Handler de post_migrate: cria os índices trigram de busca de máquinas.
+
+    Idempotente (IF NOT EXISTS). Em bancos que não são PostgreSQL não faz
+    nada — os filtros continuam funcionando, apenas sem índice.
+    """
+    if getattr(sender, "name", "") != "apps.inventory":
+        return
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with connection.cursor() as cursor:
+            for sql in _trigram_index_sql(connection):
+                cursor.execute(sql)
+    except Exception as e:
+        logger.warning(f"MachineSearch | não foi possível criar índices trigram: {e}")
+
+
+# ============================================================================
+# FILTROS
+# ============================================================================
+
+def filter_machines(queryset, params):
+    """Aplica os filtros da listagem (hostname, usuário, IP, grupo, online, dias sem reboot)."""
+    hostname = (params.get("hostname") or "").strip()
+    logged_user = (params.get("loggedUser") or "").strip()
+    ip_address = (params.get("ip_address") or "").strip()
+    group = params.get("group")
+    is_online = params.get("is_online")
+    no_reboot_days = (params.get("no_reboot_days") or "").strip()
+
+    if hostname:
+        queryset = queryset.filter(hostname__icontains=hostname)
+    if logged_user:
+        queryset = queryset.filter(loggedUser__icontains=logged_user)
+    if ip_address:
+        queryset = queryset.filter(ip_address__icontains=ip_address)
+    if group:
+        queryset = queryset.filter(group_id=group)
+    if is_online in ("true", "false"):
+        timeout = getattr(settings, "MACHINE_OFFLINE_TIMEOUT", 15)
+        threshold = timezone.now() - timedelta(minutes=timeout)
+        if is_online == "true":
+            queryset = queryset.filter(last_seen__gte=threshold)
+        else:
+            queryset = queryset.filter(Q(last_seen__lt=threshold) | Q(last_seen__isnull=True))
+    if no_reboot_days.isdigit():
+        # last_boot_at é indexado — ver apps.inventory.timestamps
+        queryset = queryset.filter(last_boot_at__lt=timezone.now() - timedelta(days=int(no_reboot_days)))
+    return queryset
+
+
+# ============================================================================
+# PAGINAÇÃO POR CURSOR
+# ============================================================================
+
+def encode_cursor(machine) -> str:
+    last_seen = machine.last_seen.isoformat() if machine.last_seen else ""
+    raw = f"{last_seen}|{machine.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Retorna (last_seen | None, id) ou None se o cursor for inválido."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_seen_raw, pk_raw = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        last_seen = parse_datetime(last_seen_raw) if last_seen_raw else None
+        if last_seen_raw and last_seen is None:
+            return None
+        return last_seen, int(pk_raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after(last_seen, pk) -> Q:
+    """Itens que vêm depois do cursor na ordem (last_seen DESC NULLS FIRST, id DESC)."""
+    if last_seen is None:
+        return Q(last_seen__isnull=True, id__lt=pk) | Q(last_seen__isnull=False)
+    return Q(last_seen__lt=last_seen) | Q(last_seen=last_seen, id__lt=pk)
+
+
+def _before(last_seen, pk) -> Q:
+    """Itens que vêm antes do cursor na mesma ordem."""
+    if last_seen is None:
+        return Q(last_seen__isnull=True, id__gt=pk)
+    return (
+        Q(last_seen__gt=last_seen)
+        | Q(last_seen=last_seen, id__gt=pk)
+        | Q(last_seen__isnull=True)
+    )
+
+
+# NULLS FIRST é o padrão do PostgreSQL para DESC — mesma ordem que a
+# listagem já tinha com order_by('-last_seen') e que o índice
+# (last_seen DESC, id DESC) cobre.
+FORWARD_ORDER = (F("last_seen").desc(nulls_first=True), F("id").desc())
+BACKWARD_ORDER = (F("last_seen").asc(nulls_last=True), F("id").asc())
+
+
+@dataclass
+class KeysetPage:
+    object_list: list = field(default_factory=list)
+    has_next: bool = False
+    has_previous: bool = False
+    next_cursor: str = ""
+    previous_cursor: str = ""
+
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, after: str = "", before: str = "", last: bool = False,
+                page_size: int = MACHINE_PAGE_SIZE) -> KeysetPage:
+    """
+    Retorna uma página de ``queryset`` a partir do cursor.
+
+    Args:
+        after:  cursor do último item da página anterior (avançar).
+        before: cursor do primeiro item da página seguinte (voltar).
+        last:   se True, retorna a última página.
+    """
+    after_cursor = decode_cursor(after)
+    before_cursor = decode_cursor(before)
+
+    if before_cursor or last:
+        qs = queryset
+        if before_cursor:
+            qs = qs.filter(_before(*before_cursor))
+        rows = list(qs.order_by(*BACKWARD_ORDER)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        has_next = bool(before_cursor)
+    else:
+        qs = queryset
+        if after_cursor:
+            qs = qs.filter(_after(*after_cursor))
+        rows = list(qs.order_by(*FORWARD_ORDER)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = bool(after_cursor)
+
+    return KeysetPage(
+        object_list=rows,
+        has_next=has_next and bool(rows),
+        has_previous=has_previous and bool(rows),
+        next_cursor=encode_cursor(rows[-1]) if rows else "",
+        previous_cursor=encode_cursor(rows[0]) if rows else "",
+    )
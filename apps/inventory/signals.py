@@ -1,7 +1,10 @@
-from .models import Notification, Machine
+from .models import Notification, Machine, BlockedSite, MachineGroup, RemoteCommandAudit, _push_notifications
+from .command_output import delete_command_output_files
+from .policy import invalidate_blocked_sites, invalidate_machine_policy, discard_if_group_changed
 import logging
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
@@ -15,9 +18,36 @@ def notification_created(sender, instance, created, **kwargs):
     """Signal executado após criar/atualizar uma notificação"""
     if created:
         # Notificação foi criada
-        print(f"Nova notificação criada: {instance.title}")
+        logger.debug("Nova notificação criada: %s", instance.title)
+        if instance.machine_id and instance.status == 'pending':
+            transaction.on_commit(lambda: _push_notifications([instance]))
     else:
         # Notificação foi atualizada
         if instance.is_read:
-            print(f"Notificação marcada como lida: {instance.title}")
+            logger.debug("Notificação marcada como lida: %s", instance.title)
 
+
+@receiver(post_save, sender=BlockedSite)
+@receiver(post_delete, sender=BlockedSite)
+@receiver(post_save, sender=MachineGroup)
+@receiver(post_delete, sender=MachineGroup)
+def blocked_sites_changed(sender, instance, **kwargs):
+    """Invalida todas as políticas de sites bloqueados compiladas."""
+    invalidate_blocked_sites()
+
+
+@receiver(post_save, sender=Machine)
+def machine_policy_group_changed(sender, instance, **kwargs):
+    """Recompila a política da máquina apenas se o grupo mudou."""
+    discard_if_group_changed(instance)
+
+
+@receiver(post_delete, sender=Machine)
+def machine_policy_deleted(sender, instance, **kwargs):
+    invalidate_machine_policy(instance.hostname)
+
+
+@receiver(post_delete, sender=RemoteCommandAudit)
+def remote_command_output_deleted(sender, instance, **kwargs):
+    """Remove a saída comprimida do storage junto com a auditoria."""
+    delete_command_output_files(instance)
@@ -0,0 +1,37 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='inventory.sondar_rotas_agentes', bind=True, max_retries=2)
+def sondar_rotas_agentes(self):
+    """
+    Sonda os IPs candidatos dos agentes online e atualiza AgentRoute.
+    Roda a cada 2 minutos via Celery Beat.
+    """
+    try:
+        from apps.inventory.reachability import probe_fleet
+
+        return probe_fleet()
+    except Exception as exc:
+        logger.error(f"[TASK/ROTAS] Erro ao sondar agentes: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+
+@shared_task(name='inventory.avisar_notificacoes', bind=True, max_retries=2)
+def avisar_notificacoes(self, machine_ids):
+    """
+    Avisa pelo gateway os agentes de ``machine_ids`` que há notificação não
+    lida. Agendada no on_commit de Notification/NotificationBroadcast.
+    """
+    try:
+        from apps.inventory.gateway import EVENT_NOTIFICATION, push_to_agents
+        from apps.inventory.models import Machine
+
+        hostnames = Machine.objects.filter(id__in=machine_ids).values_list("hostname", flat=True)
+        return {'avisadas': push_to_agents(list(hostnames), EVENT_NOTIFICATION)}
+    except Exception as exc:
+        logger.error(f"[TASK/GATEWAY] Erro ao avisar notificações: {exc}")
+        raise self.retry(exc=exc, countdown=30)
@@ -1,20 +1,53 @@
 
+import datetime
 import json
 import hashlib
+import os
+import tempfile
 from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-from django.test import TestCase, Client
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 
 from .models import (
     Machine, MachineGroup, AgentToken, AgentTokenUsage,
     AgentVersion, Notification, BlockedSite,
+    LogAtividade, ResumoAtividadeDiaria, NotificationBroadcast, RemoteCommandAudit,
+    AgentRoute, MachineMemoryModule, MachineNetworkAdapter, MachineTpm,
+)
+from .command_output import REMOTE_COMMAND_OUTPUT_PREVIEW, REMOTE_COMMAND_RESULT_CACHE_MAX
+from .views import _finish_remote_command_audit
+from .activity_utils import top_apps_maquina
+from .gateway import (
+    EVENT_COMMAND, EVENT_NOTIFICATION, agent_group, command_audit_key, command_queue_key, command_result_key,
+    push_to_agent, push_to_agents,
+    save_command_result, take_pending_commands,
+)
+from .hardware import (
+    machines_with_mac_prefix, machines_with_memory_below, machines_without_enabled_tpm, normalize_mac,
+    sync_machine_hardware,
+)
+from .sanitize import PayloadError, json_nesting_exceeds, load_agent_json, read_agent_body, sanitize_json, sanitize_str
+from .timestamps import machines_without_reboot, parse_wmi_date
+from .reachability import (
+    ROUTE_DOWN_AFTER, has_known_route, machine_ip_candidates, probe_fleet, ranked_ips, record_route,
 )
 
 User = get_user_model()
 
+try:
+    import channels.testing  # noqa: F401  (channels + daphne)
+    channels_available = True
+except ImportError:
+    channels_available = False
+
 
 # ============================================================================
 # FIXTURES / HELPERS
@@ -362,4 +395,682 @@ class AgentHealthCheckTest(TestCase):
         resp = self.client.get(reverse('inventario:api_health_check'))
         self.assertEqual(resp.status_code, 200)
         data = resp.json()
-        self.assertEqual(data.get('status'), 'ok')
\ No newline at end of file
+        self.assertEqual(data.get('status'), 'ok')
+
+# ============================================================================
+# RESUMO DE ATIVIDADE (ResumoAtividadeDiaria)
+# ============================================================================
+
+class ResumoAtividadeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", password="pass")
+        self.raw_token, self.token = make_token(self.user)
+        self.machine = make_machine(hostname="PC-ACT")
+        self.url = reverse('inventario:api_agent_activity')
+
+    def _post_events(self, events):
+        return self.client.post(
+            self.url,
+            data=json.dumps({"events": events}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f"Bearer {self.token.token_hash}",
+            HTTP_X_MACHINE_NAME=self.machine.hostname,
+        )
+
+    def _app_event(self, exe, nome, when):
+        return {
+            "tipo": "app_iniciado",
+            "app_nome": nome,
+            "app_exe": exe,
+            "usuario_windows": "DOM\\user",
+            "ocorrido_em": when.isoformat(),
+        }
+
+    def test_ingest_increments_rollup(self):
+        now = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+        resp = self._post_events([
+            self._app_event("chrome.exe", "Chrome", now),
+            self._app_event("excel.exe", "Excel", now),
+            {"tipo": "login", "usuario_windows": "DOM\\user", "ocorrido_em": now.isoformat()},
+        ])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["criados"], 3)
+
+        dia = timezone.localtime(now).date()
+        resumo = ResumoAtividadeDiaria.objects.get(
+            machine=self.machine, dia=dia, tipo="app_iniciado", app_nome="Chrome"
+        )
+        self.assertEqual(resumo.total, 1)
+        self.assertTrue(
+            ResumoAtividadeDiaria.objects.filter(machine=self.machine, tipo="login", app_nome="").exists()
+        )
+
+        self._post_events([self._app_event("chrome.exe", "Chrome", now + timedelta(hours=2))])
+        resumo.refresh_from_db()
+        self.assertEqual(resumo.total, 2)
+
+    def test_recalcular_matches_raw_logs(self):
+        now = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+        for i in range(3):
+            LogAtividade.objects.create(
+                machine=self.machine, tipo="app_iniciado", app_nome="Teams",
+                usuario_windows="user", ocorrido_em=now - timedelta(minutes=i),
+            )
+        call_command("recalcular_resumo_atividade", stdout=StringIO())
+
+        tops = list(top_apps_maquina(self.machine))
+        self.assertEqual(tops, [{"app_nome": "Teams", "total": 3}])
+
+    def test_activity_log_view_reads_rollup(self):
+        ResumoAtividadeDiaria.objects.create(
+            machine=self.machine, dia=timezone.localdate(), tipo="app_iniciado",
+            app_nome="Outlook", total=7,
+        )
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('inventario:machine_activity_log', args=[self.machine.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(list(resp.context["top_apps"]), [{"app_nome": "Outlook", "total": 7}])
+        self.assertEqual(resp.context["atividade_diaria"][0]["app_iniciado"], 7)
+
+
+# ============================================================================
+# VIEW: BulkNotificationCreateView / NotificationBroadcast
+# ============================================================================
+
+class BulkNotificationBroadcastTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.client.force_login(self.user)
+        self.group = MachineGroup.objects.create(name="Financeiro")
+        self.m1 = make_machine(hostname="PC-A", ip="10.0.0.1")
+        self.m2 = make_machine(hostname="PC-B", ip="10.0.0.2")
+        self.m3 = make_machine(hostname="PC-C", ip="10.0.0.3")
+        self.m2.group = self.group
+        self.m2.save()
+        self.url = reverse('inventario:notifications_bulk')
+
+    def _post(self, **extra):
+        data = {"title": "Manutenção", "message": "Reinicie", "type": "info", "priority": "normal"}
+        data.update(extra)
+        return self.client.post(self.url, data)
+
+    def test_group_and_machine_targets_are_merged(self):
+        resp = self._post(machines=[self.m1.pk, self.m2.pk], groups=[self.group.pk])
+        self.assertEqual(resp.status_code, 302)
+        broadcast = NotificationBroadcast.objects.get()
+        self.assertEqual(broadcast.recipients_count, 2)
+        self.assertEqual(
+            set(broadcast.notifications.values_list("machine__hostname", flat=True)),
+            {"PC-A", "PC-B"},
+        )
+
+    def test_all_machines_fans_out_in_bulk(self):
+        # sessão + usuário + broadcast + SELECT ids + INSERT em lote + contador,
+        # mais SAVEPOINT/RELEASE dos dois atomic
+        with self.assertNumQueries(10):
+            resp = self._post(all_machines="on")
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Notification.objects.filter(status="pending").count(), 3)
+
+    def test_requires_some_target(self):
+        resp = self._post()
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(NotificationBroadcast.objects.exists())
+
+    def test_fan_out_marks_past_expiry_as_expired(self):
+        broadcast = NotificationBroadcast.objects.create(
+            title="x", message="y", expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        broadcast.fan_out([self.m1.pk])
+        self.assertEqual(broadcast.notifications.get().status, "expired")
+
+    def test_gateway_push_is_one_task_per_broadcast(self):
+        with mock.patch("apps.inventory.gateway.gateway_enabled", return_value=True), \
+                mock.patch("apps.inventory.tasks.avisar_notificacoes.delay") as delay, \
+                mock.patch("apps.inventory.gateway.push_to_agent") as push:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._post(all_machines="on")
+        delay.assert_called_once_with(sorted([self.m1.pk, self.m2.pk, self.m3.pk]))
+        push.assert_not_called()
+
+    def test_push_to_agents_sends_one_wakeup_per_machine(self):
+        sent = []
+
+        class FakeLayer:
+            async def group_send(self, group, message):
+                sent.append((group, message))
+
+        with mock.patch("apps.inventory.gateway.get_channel_layer", lambda: FakeLayer()):
+            self.assertEqual(push_to_agents(["PC-A", "pc-a", "PC-B"], EVENT_NOTIFICATION), 2)
+        self.assertEqual(
+            sent,
+            [("agent.pc-a", {"type": EVENT_NOTIFICATION, "payload": {}}),
+             ("agent.pc-b", {"type": EVENT_NOTIFICATION, "payload": {}})],
+        )
+
+    def test_failed_fan_out_rolls_back_broadcast(self):
+        with mock.patch.object(NotificationBroadcast, "fan_out", side_effect=RuntimeError("falha")):
+            with self.assertRaises(RuntimeError):
+                self._post(all_machines="on")
+        self.assertFalse(NotificationBroadcast.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+# ============================================================================
+# VIEW: MachineCheckinView.get — política de sites bloqueados
+# ============================================================================
+
+class BlockedSitePolicyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = MachineGroup.objects.create(name="Vendas")
+        self.machine = make_machine(hostname="PC-POL")
+        BlockedSite.objects.create(url="facebook.com", machine=self.machine)
+        self.url = reverse('inventario:checkin')
+
+    def _get(self, **headers):
+        return self.client.get(self.url, {"host": "PC-POL"}, **headers)
+
+    def test_returns_sites_with_version(self):
+        resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), ["facebook.com"])
+        self.assertTrue(resp["X-Policy-Version"])
+
+    def test_unchanged_version_returns_304_without_queries(self):
+        version = self._get()["X-Policy-Version"]
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url, {"host": "PC-POL", "version": version})
+        self.assertEqual(resp.status_code, 304)
+        resp = self._get(HTTP_IF_NONE_MATCH=f'"{version}"')
+        self.assertEqual(resp.status_code, 304)
+
+    def test_new_blocked_site_changes_version(self):
+        version = self._get()["X-Policy-Version"]
+        BlockedSite.objects.create(url="youtube.com", group=self.group)
+        self.machine.group = self.group
+        self.machine.save()
+        resp = self.client.get(self.url, {"host": "PC-POL", "version": version})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), ["facebook.com", "youtube.com"])
+
+    def test_group_change_invalidates_machine_policy(self):
+        BlockedSite.objects.create(url="youtube.com", group=self.group)
+        self.assertEqual(self._get().json(), ["facebook.com"])
+        self.machine.group = self.group
+        self.machine.save()
+        self.assertEqual(self._get().json(), ["facebook.com", "youtube.com"])
+
+
+# ============================================================================
+# VIEW: MachineListView — busca e paginação por cursor
+# ============================================================================
+
+class MachineListKeysetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", password="pass")
+        self.client.force_login(self.user)
+        base = timezone.now()
+        for i in range(45):
+            Machine.objects.create(
+                hostname=f"PC-{i:03d}",
+                ip_address=f"10.0.0.{i + 1}",
+                # alguns com mesmo last_seen para exercitar o desempate por id
+                last_seen=base - timedelta(minutes=i // 2),
+            )
+        Machine.objects.create(hostname="PC-NUNCA", ip_address="10.0.1.1")
+        self.url = reverse('inventario:machine_list')
+
+    def _walk_forward(self):
+        seen, params = [], {}
+        while True:
+            resp = self.client.get(self.url, params)
+            page = resp.context["page_obj"]
+            seen.extend(m.hostname for m in resp.context["machines"])
+            if not page.has_next:
+                return seen
+            params = {"after": page.next_cursor}
+
+    def test_forward_walk_visits_every_machine_once(self):
+        seen = self._walk_forward()
+        self.assertEqual(len(seen), 46)
+        self.assertEqual(len(set(seen)), 46)
+        self.assertEqual(seen[0], "PC-NUNCA")
+
+    def test_previous_page_round_trip(self):
+        first = self.client.get(self.url).context["page_obj"]
+        second = self.client.get(self.url, {"after": first.next_cursor}).context["page_obj"]
+        back = self.client.get(self.url, {"before": second.previous_cursor}).context["page_obj"]
+        self.assertEqual([m.pk for m in back], [m.pk for m in first])
+        self.assertFalse(back.has_previous)
+
+    def test_last_page(self):
+        page = self.client.get(self.url, {"last": "1"}).context["page_obj"]
+        self.assertEqual(len(page), 20)
+        self.assertEqual(page.object_list[-1].hostname, "PC-044")
+        self.assertFalse(page.has_next)
+
+    def test_search_filters_and_invalid_cursor(self):
+        resp = self.client.get(self.url, {"hostname": "pc-01", "after": "lixo"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context["machines"]), 10)
+
+
+# ============================================================================
+# RemoteCommandAudit — saída comprimida fora da linha
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix="cmd_output_tests_"))
+class RemoteCommandOutputTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.client.force_login(self.user)
+        self.machine = make_machine(hostname="PC-CMD")
+        self.audit = RemoteCommandAudit.objects.create(
+            user=self.user, machine=self.machine, command_type="powershell",
+            command_preview="Get-Process", command_sha256="x" * 64,
+        )
+
+    def _url(self, stream):
+        return reverse('inventario:run_command_output', args=[self.audit.pk, stream])
+
+    def test_large_output_is_stored_compressed_with_preview(self):
+        big = "linha de saída\n" * 5000
+        _finish_remote_command_audit(self.audit, status_value="success", exit_code=0, stdout=big)
+        self.audit.refresh_from_db()
+
+        self.assertEqual(len(self.audit.stdout), REMOTE_COMMAND_OUTPUT_PREVIEW)
+        self.assertEqual(self.audit.stdout_size, len(big.encode("utf-8")))
+        self.assertEqual(self.audit.stdout_sha256, hashlib.sha256(big.encode("utf-8")).hexdigest())
+        self.assertTrue(self.audit.stdout_file.name.endswith(".gz"))
+
+        with mock.patch("gzip.GzipFile.seek", side_effect=AssertionError("descompressão dupla")):
+            resp = self.client.get(self._url("stdout"), {"download": "1"})
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn("Content-Length", resp)
+            self.assertIn("attachment", resp["Content-Disposition"])
+            self.assertEqual(b"".join(resp.streaming_content).decode("utf-8"), big)
+
+    def test_cached_reverse_result_keeps_small_cap(self):
+        save_command_result({"request_id": "cmd-big", "stdout": "x" * (REMOTE_COMMAND_RESULT_CACHE_MAX + 10)})
+        self.assertEqual(len(cache.get(command_result_key("cmd-big"))["stdout"]), REMOTE_COMMAND_RESULT_CACHE_MAX)
+
+    def test_reverse_result_stores_full_output_in_audit(self):
+        big = "y" * (REMOTE_COMMAND_RESULT_CACHE_MAX * 2)
+        cache.set(command_audit_key("cmd-full"), self.audit.pk)
+        save_command_result({"request_id": "cmd-full", "stdout": big, "exit_code": 0})
+        result = cache.get(command_result_key("cmd-full"))
+        self.assertTrue(result["output_stored"])
+        self.assertEqual(len(result["stdout"]), REMOTE_COMMAND_RESULT_CACHE_MAX)
+
+        _finish_remote_command_audit(
+            self.audit, status_value="success", exit_code=0, stdout=result["stdout"], output_stored=True,
+        )
+        self.audit.refresh_from_db()
+        self.assertEqual(self.audit.stdout_size, len(big))
+        self.assertEqual(self.audit.stdout_sha256, hashlib.sha256(big.encode()).hexdigest())
+        resp = self.client.get(self._url("stdout"))
+        self.assertEqual(b"".join(resp.streaming_content).decode(), big)
+
+    def test_small_output_stays_inline(self):
+        _finish_remote_command_audit(self.audit, status_value="failed", exit_code=1, stderr="erro")
+        self.audit.refresh_from_db()
+        self.assertFalse(self.audit.stderr_file)
+        resp = self.client.get(self._url("stderr"))
+        self.assertEqual(b"".join(resp.streaming_content), b"erro")
+
+    def test_delete_removes_file(self):
+        _finish_remote_command_audit(self.audit, status_value="success", exit_code=0, stdout="x" * 5000)
+        self.audit.refresh_from_db()
+        path = self.audit.stdout_file.path
+        self.assertTrue(os.path.exists(path))
+        self.audit.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_invalid_stream(self):
+        self.assertEqual(self.client.get(self._url("stdin")).status_code, 400)
+
+
+# ============================================================================
+# AgentRoute — tabela de rotas e sondagem
+# ============================================================================
+
+class AgentRouteTest(TestCase):
+    def setUp(self):
+        self.machine = make_machine(hostname="PC-ROTA", ip="10.0.0.1")
+        self.machine.network_info = [{"ip": "10.0.0.2"}, {"ips": ["10.0.0.3", "127.0.0.1"]}]
+        self.machine.save()
+
+    def test_candidates_ignore_loopback(self):
+        self.assertEqual(machine_ip_candidates(self.machine), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+
+    def test_ranked_ips_prefers_fast_routes_and_skips_dead_ones(self):
+        record_route(self.machine, "10.0.0.3", 7071, ok=True, latency_ms=5)
+        record_route(self.machine, "10.0.0.2", 7071, ok=True, latency_ms=50)
+        for _ in range(ROUTE_DOWN_AFTER):
+            record_route(self.machine, "10.0.0.1", 7071, ok=False)
+
+        self.assertEqual(ranked_ips(self.machine, 7071), ["10.0.0.3", "10.0.0.2"])
+        self.assertTrue(has_known_route(self.machine, 7071))
+
+    def test_dead_routes_returned_when_nothing_else(self):
+        self.machine.network_info = None
+        self.machine.save()
+        for _ in range(ROUTE_DOWN_AFTER):
+            record_route(self.machine, "10.0.0.1", 7071, ok=False)
+        self.assertEqual(ranked_ips(self.machine, 7071), ["10.0.0.1"])
+        self.assertFalse(has_known_route(self.machine, 7071))
+
+    def test_probe_fleet_records_results(self):
+        latencies = {"10.0.0.1": None, "10.0.0.2": 12.0, "10.0.0.3": None}
+        with mock.patch("apps.inventory.reachability._tcp_probe", side_effect=lambda ip, port, timeout: latencies[ip]):
+            result = probe_fleet(port=7071)
+
+        self.assertEqual(result, {"machines": 1, "reachable": 1})
+        route = AgentRoute.objects.get(machine=self.machine, ip="10.0.0.2", port=7071)
+        self.assertEqual(route.latency_ms, 12.0)
+        self.assertEqual(ranked_ips(self.machine, 7071)[0], "10.0.0.2")
+
+    def test_probe_fleet_is_bounded_and_skips_recent_routes(self):
+        outra = make_machine(hostname="PC-ROTA-2", ip="10.0.1.1")
+        terceira = make_machine(hostname="PC-ROTA-3", ip="10.0.2.1")
+        record_route(outra, "10.0.1.1", 7071, ok=True, latency_ms=3)
+        AgentRoute.objects.filter(machine=outra).update(updated_at=timezone.now() - timedelta(hours=1))
+        record_route(terceira, "10.0.2.1", 7071, ok=True, latency_ms=3)
+
+        with mock.patch("apps.inventory.reachability._tcp_probe", return_value=8.0) as probe:
+            with self.assertNumQueries(3):  # máquinas, rotas existentes, bulk_create
+                result = probe_fleet(port=7071, batch_size=2)
+
+        self.assertEqual(result["machines"], 2)  # a recém-usada (PC-ROTA-3) fica de fora
+        self.assertEqual({call.args[0] for call in probe.call_args_list}, {"10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.1.1"})
+        route = AgentRoute.objects.get(machine=outra, ip="10.0.1.1")
+        self.assertEqual(route.success_count, 2)
+        self.assertAlmostEqual(route.latency_ms, 3 + 0.3 * 5)
+
+
+# ============================================================================
+# Gateway de agentes (WebSocket)
+# ============================================================================
+
+class AgentGatewayPollingFallbackTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        _, self.token = make_token(self.user)
+        self.token_hash = self.token.token_hash
+        self.machine = make_machine(hostname="PC-GW")
+
+    def test_pull_takes_commands_one_at_a_time(self):
+        cache.set(command_queue_key("PC-GW"), [{"request_id": "a"}, {"request_id": "b"}])
+        for expected in ("a", "b"):
+            resp = self.client.post(
+                reverse("inventario:api_agent_command_pull"),
+                HTTP_AUTHORIZATION=f"Bearer {self.token_hash}",
+                HTTP_X_MACHINE_NAME="PC-GW",
+            )
+            self.assertEqual(resp.json()["command"]["request_id"], expected)
+        self.assertEqual(take_pending_commands("PC-GW"), [])
+
+    def test_agent_group_name_is_channel_safe(self):
+        self.assertEqual(agent_group("PC Financeiro#1"), "agent.pc_financeiro_1")
+
+
+@skipUnless(channels_available, "channels não instalado")
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class AgentGatewayConsumerTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        _, self.token = make_token(self.user)
+        self.token_hash = self.token.token_hash
+        self.machine = make_machine(hostname="PC-WS")
+        AgentTokenUsage.objects.create(agent_token=self.token, machine_name="PC-WS")
+
+    def _communicator(self, token_hash=None, machine_name=b"PC-WS"):
+        from channels.testing import WebsocketCommunicator
+        from .consumers import AgentGatewayConsumer
+
+        return WebsocketCommunicator(
+            AgentGatewayConsumer.as_asgi(), "/ws/agent/",
+            headers=[
+                (b"authorization", f"Bearer {token_hash or self.token_hash}".encode()),
+                (b"x-machine-name", machine_name),
+            ],
+        )
+
+    def test_rejects_invalid_token(self):
+        async def scenario():
+            communicator = self._communicator(token_hash="x" * 64)
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+    def test_rejects_token_not_bound_to_machine(self):
+        async def scenario():
+            communicator = self._communicator(machine_name=b"PC-OUTRO")
+            connected, code = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, 4401)
+
+        async_to_sync(scenario)()
+
+    def test_pushes_commands_and_notifications(self):
+        async def scenario():
+            communicator = self._communicator()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            cache.set(command_queue_key("PC-WS"), [{"request_id": "cmd-1"}])
+            await sync_to_async(push_to_agent)("PC-WS", EVENT_COMMAND)
+            message = await communicator.receive_json_from(timeout=2)
+            self.assertEqual(message, {"type": "command", "command": {"request_id": "cmd-1"}})
+
+            notif = await sync_to_async(Notification.objects.create)(
+                machine=self.machine, title="Aviso", message="Reinicie",
+            )
+            await sync_to_async(push_to_agent)("PC-WS", EVENT_NOTIFICATION)
+            message = await communicator.receive_json_from(timeout=2)
+            self.assertEqual(message["type"], "notifications")
+            self.assertEqual([n["id"] for n in message["notifications"]], [notif.pk])
+
+            await communicator.send_json_to({"type": "command.result", "request_id": "cmd-1", "stdout": "ok"})
+            self.assertTrue((await communicator.receive_json_from(timeout=2))["ok"])
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+        self.assertEqual(cache.get(command_result_key("cmd-1"))["stdout"], "ok")
+
+
+# ============================================================================
+# INVENTÁRIO DE HARDWARE NORMALIZADO
+# ============================================================================
+
+class MachineHardwareProjectionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="hw", password="pass")
+        self.raw_token, self.token = make_token(self.user)
+        self.url = reverse('inventario:checkin')
+        self.hardware = {
+            "memory_modules": [
+                {"bank_label": "BANK 0", "device_locator": "DIMM0", "capacity_gb": 4, "speed_mhz": "2666",
+                 "manufacturer": "Kingston"},
+                {"bank_label": "BANK 1", "device_locator": "DIMM1", "capacity_gb": 2.0, "speed_mhz": 2666,
+                 "manufacturer": "Kingston"},
+            ],
+            "network_adapters": [
+                {"name": "Ethernet", "mac": "00-1a-2b-3c-4d-5e", "ip": "10.0.0.5", "dhcp": True},
+                {"name": "Wi-Fi", "mac": "AA:BB:CC:00:11:22", "ip": "", "dhcp": "false"},
+            ],
+            "tpm": {"present": True, "ready": True, "enabled": False, "spec_version": "2.0"},
+        }
+
+    def _checkin(self, hostname, hardware):
+        return self.client.post(
+            self.url,
+            data=json.dumps({"hostname": hostname, "ip": "10.0.0.5", "token": self.token.token_hash,
+                             "hardware": hardware}),
+            content_type='application/json',
+        )
+
+    def test_checkin_projects_hardware(self):
+        self.assertEqual(self._checkin("PC-HW", self.hardware).status_code, 200)
+        machine = Machine.objects.get(hostname="PC-HW")
+
+        modules = MachineMemoryModule.objects.filter(machine=machine).order_by("device_locator")
+        self.assertEqual([m.capacity_gb for m in modules], [4.0, 2.0])
+        self.assertEqual(modules[0].speed_mhz, 2666)
+        adapter = MachineNetworkAdapter.objects.get(machine=machine, name="Ethernet")
+        self.assertEqual((adapter.mac, adapter.mac_prefix, adapter.ip), ("00:1A:2B:3C:4D:5E", "00:1A:2B", "10.0.0.5"))
+        self.assertFalse(MachineNetworkAdapter.objects.get(machine=machine, name="Wi-Fi").dhcp)
+        self.assertFalse(MachineTpm.objects.get(machine=machine).enabled)
+        self.assertEqual(len(machine.hardware_hash), 64)
+
+    def test_unchanged_payload_skips_projection(self):
+        self._checkin("PC-HW", self.hardware)
+        machine = Machine.objects.get(hostname="PC-HW")
+        self.assertFalse(sync_machine_hardware(machine))
+
+        self.hardware["memory_modules"].pop()
+        self.hardware.pop("tpm")
+        self._checkin("PC-HW", self.hardware)
+        self.assertEqual(MachineMemoryModule.objects.filter(machine=machine).count(), 1)
+        self.assertFalse(MachineTpm.objects.filter(machine=machine).exists())
+
+    def test_fleet_queries(self):
+        self._checkin("PC-HW", self.hardware)
+        big = dict(self.hardware, memory_modules=[{"capacity_gb": 16}], network_adapters=[{"mac": "11:22:33:44:55:66"}],
+                   tpm={"present": True, "enabled": True})
+        self._checkin("PC-BIG", big)
+
+        self.assertEqual(list(machines_with_memory_below(8).values_list("hostname", flat=True)), ["PC-HW"])
+        self.assertEqual(list(machines_with_mac_prefix("00-1A-2B").values_list("hostname", flat=True)), ["PC-HW"])
+        self.assertEqual(list(machines_with_mac_prefix("11:22").values_list("hostname", flat=True)), ["PC-BIG"])
+        self.assertEqual(list(machines_without_enabled_tpm().values_list("hostname", flat=True)), ["PC-HW"])
+        self.assertEqual(normalize_mac("invalido"), "")
+
+    def test_backfill_command(self):
+        machine = make_machine(hostname="PC-ANTIGA", ip="10.0.0.9")
+        machine.memory_modules = [{"capacity_gb": 8}]
+        machine.save()
+        out = StringIO()
+        call_command("projetar_hardware", stdout=out)
+        self.assertIn("1 de 1", out.getvalue())
+        self.assertEqual(MachineMemoryModule.objects.get(machine=machine).capacity_gb, 8.0)
+
+
+# ============================================================================
+# DATAS DE INSTALAÇÃO / BOOT
+# ============================================================================
+
+class MachineTimestampsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ts", password="pass")
+        self.raw_token, self.token = make_token(self.user)
+
+    def test_parse_wmi_date_formats(self):
+        utc = datetime.timezone.utc
+        expected = datetime.datetime(2024, 1, 15, 8, 30, tzinfo=utc)
+        self.assertEqual(parse_wmi_date("/Date(1705307400000)/"), expected)
+        self.assertEqual(parse_wmi_date("2024-01-15T08:30:00Z"), expected)
+        self.assertEqual(parse_wmi_date("2024-01-15 08:30:00+00:00"), expected)
+        self.assertEqual(parse_wmi_date("2024-01-15T05:30:00.000-03:00"), expected)
+        self.assertEqual(parse_wmi_date("20240115053000.000000-180"), expected)
+        self.assertIsNone(parse_wmi_date("ontem"))
+        self.assertIsNone(parse_wmi_date(None))
+
+    def test_checkin_stores_typed_dates(self):
+        self.client.post(
+            reverse('inventario:checkin'),
+            data=json.dumps({
+                "hostname": "PC-BOOT", "ip": "10.0.0.1", "token": self.token.token_hash,
+                "hardware": {"install_date": "/Date(1705307400000)/", "last_boot": "2024-01-15T08:30:00Z"},
+            }),
+            content_type='application/json',
+        )
+        machine = Machine.objects.get(hostname="PC-BOOT")
+        self.assertEqual(machine.install_date, "/Date(1705307400000)/")
+        self.assertEqual(machine.os_installed_at, machine.last_boot_at)
+        self.assertEqual(machine.last_boot_at.year, 2024)
+
+    def test_backfill_and_reboot_filter(self):
+        stale = make_machine(hostname="PC-VELHA", ip="10.0.0.2")
+        fresh = make_machine(hostname="PC-NOVA", ip="10.0.0.3")
+        Machine.objects.filter(pk=stale.pk).update(last_boot=(timezone.now() - timedelta(days=40)).isoformat())
+        Machine.objects.filter(pk=fresh.pk).update(last_boot=(timezone.now() - timedelta(days=2)).isoformat())
+
+        out = StringIO()
+        call_command("normalizar_datas_maquinas", stdout=out)
+        self.assertIn("2 máquina(s)", out.getvalue())
+
+        self.assertEqual(list(machines_without_reboot(30).values_list("hostname", flat=True)), ["PC-VELHA"])
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('inventario:machine_list'), {"no_reboot_days": "30"})
+        self.assertEqual([m.hostname for m in resp.context["machines"]], ["PC-VELHA"])
+
+
+# ============================================================================
+# SANEAMENTO DO PAYLOAD DO AGENTE
+# ============================================================================
+
+class AgentPayloadSanitizeTest(TestCase):
+    def test_sanitize_str_removes_real_and_escaped_nulls(self):
+        self.assertEqual(sanitize_str("11.6.10.1196\x00"), "11.6.10.1196")
+        self.assertEqual(sanitize_str("Dell\u0000 "), "Dell")
+        self.assertEqual(sanitize_str("Dell\x00"), "Dell")
+        self.assertEqual(sanitize_str("C:\\Windows"), "C:\\Windows")
+        self.assertIsNone(sanitize_str("None"))
+        self.assertIsNone(sanitize_str("\x00"))
+        self.assertEqual(sanitize_str(3), "3")
+
+    def test_sanitize_json_cleans_nested_strings(self):
+        payload = {"tpm": {"ver": "11.8\x00", "vazio": "\x00", "n": 1}, "lista": ["a\x00b", None]}
+        self.assertEqual(
+            sanitize_json(payload),
+            {"tpm": {"ver": "11.8", "vazio": None, "n": 1}, "lista": ["ab", None]},
+        )
+        self.assertEqual(sanitize_json('[{"a": "x"}]'), [{"a": "x"}])
+        self.assertIsNone(sanitize_json("texto"))
+        self.assertIsNone(sanitize_json(42))
+
+    def test_load_agent_json_limits(self):
+        self.assertEqual(load_agent_json(b'{"a": [1, {"b": 2}]}', max_depth=3), {"a": [1, {"b": 2}]})
+        with self.assertRaises(PayloadError) as ctx:
+            load_agent_json(b"x" * 11, max_bytes=10)
+        self.assertEqual(ctx.exception.status, 413)
+        with self.assertRaises(PayloadError):
+            load_agent_json(b'{"a": [1, {"b": 2}]}', max_depth=2)
+        with self.assertRaises(PayloadError):
+            load_agent_json(b"[" * 100000 + b"]" * 100000)
+        with self.assertRaises(PayloadError):
+            load_agent_json(b"{nao e json")
+
+    def test_nesting_measured_on_raw_bytes(self):
+        self.assertFalse(json_nesting_exceeds(b'{"a": "[[[[{{{{", "b": [{"c": "\\"]]]"}]}', 3))
+        self.assertTrue(json_nesting_exceeds(b'{"a": [{"b": []}]}', 3))
+        self.assertFalse(json_nesting_exceeds(b'[[], [[]], {}]', 3))
+        with mock.patch("json.loads") as loads, self.assertRaises(PayloadError):
+            load_agent_json(b"[" * 50 + b"]" * 50)
+        loads.assert_not_called()
+
+    def test_read_agent_body_bounded(self):
+        request = mock.Mock(META={"CONTENT_LENGTH": "11"})
+        with self.assertRaises(PayloadError) as ctx:
+            read_agent_body(request, max_bytes=10)
+        self.assertEqual(ctx.exception.status, 413)
+        request.read.assert_not_called()
+
+        request = mock.Mock(META={}, read=mock.Mock(return_value=b"x" * 11))
+        with self.assertRaises(PayloadError):
+            read_agent_body(request, max_bytes=10)
+        request.read.assert_called_once_with(11)
+
+    def test_checkin_rejects_oversized_payload(self):
+        user = User.objects.create_user(username="big", password="pass")
+        _, token = make_token(user)
+        body = json.dumps({"hostname": "PC-BIG", "token": token.token_hash, "hardware": {"x": "a" * 2048}})
+        with mock.patch("apps.inventory.sanitize.AGENT_PAYLOAD_MAX_BYTES", 1024):
+            resp = self.client.post(reverse('inventario:checkin'), data=body, content_type='application/json')
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(Machine.objects.filter(hostname="PC-BIG").exists())
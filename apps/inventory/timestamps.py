@@ -0,0 +1,116 @@
+"""
+Normalização das datas de instalação do SO e de último boot.
+
+O agente envia ``install_date`` e ``last_boot`` como strings WMI/PowerShell
+em formatos variados. Os valores brutos continuam em
+``Machine.install_date`` / ``Machine.last_boot`` (CharField, para
+reprocessamento), mas são convertidos uma única vez, no check-in, para
+``os_installed_at`` / ``last_boot_at`` — DateTimeFields indexados. Filtros
+de uptime ("sem reboot há 30 dias") viram comparação indexada no banco em
+vez de ``strptime`` linha a linha.
+
+Registros anteriores são convertidos pelo comando ``normalizar_datas_maquinas``.
+"""
+import datetime
+import logging
+import re
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Machine
+
+logger = logging.getLogger(__name__)
+
+# /Date(1700000000000)/ — ConvertTo-Json padrão (pode trazer offset: /Date(...-0300)/)
+_JSON_DATE_RE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+# 20240115083000.000000-180 — CIM_DATETIME (offset em minutos)
+_CIM_DATE_RE = re.compile(r"^(\d{14})(?:\.\d+)?([+-]\d{3})?$")
+
+
+def parse_wmi_date(value) -> "datetime.datetime | None":
+    """
+    Converte data WMI/PowerShell para datetime timezone-aware.
+
+    Formatos suportados:
+      - /Date(1234567890000)/      — timestamp ms (ConvertTo-Json padrão)
+      - 20240115083000.000000-180  — CIM_DATETIME
+      - ISO 8601 (com ou sem Z/offset/fração, 'T' ou espaço)
+      - datetime Python            — passado diretamente
+    Datas sem fuso são tratadas como UTC.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    if not isinstance(value, str):
+        return None
+
+    text = value.strip()
+    match = _JSON_DATE_RE.match(text)
+    if match:
+        try:
+            return datetime.datetime.fromtimestamp(int(match.group(1)) / 1000, tz=datetime.timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    match = _CIM_DATE_RE.match(text)
+    if match:
+        try:
+            parsed = datetime.datetime.strptime(match.group(1), "%Y%m%d%H%M%S")
+        except ValueError:
+            return None
+        offset = int(match.group(2) or 0)
+        return parsed.replace(tzinfo=datetime.timezone(timedelta(minutes=offset)))
+
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        logger.debug(f"parse_wmi_date: formato não reconhecido {value!r}")
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def raw_wmi_date(value) -> "str | None":
+    """Valor bruto para o CharField de origem (datetime vira ISO 8601)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    text = str(value).replace("\x00", "").strip()
+    return text[:50] or None
+
+
+def normalize_machine_dates(machines, batch_size: int = 500, force: bool = False) -> int:
+    """
+    Preenche ``os_installed_at`` / ``last_boot_at`` a partir dos valores brutos.
+
+    Sem ``force``, só toca campos tipados ainda vazios. Retorna quantas
+    máquinas foram alteradas.
+    """
+    changed, total = [], 0
+    for machine in machines.iterator(chunk_size=batch_size):
+        dirty = False
+        for raw_field, typed_field in (("install_date", "os_installed_at"), ("last_boot", "last_boot_at")):
+            if not force and getattr(machine, typed_field) is not None:
+                continue
+            parsed = parse_wmi_date(getattr(machine, raw_field))
+            if parsed != getattr(machine, typed_field):
+                setattr(machine, typed_field, parsed)
+                dirty = True
+        if dirty:
+            changed.append(machine)
+        if len(changed) >= batch_size:
+            Machine.objects.bulk_update(changed, ["os_installed_at", "last_boot_at"])
+            total += len(changed)
+            changed = []
+    if changed:
+        Machine.objects.bulk_update(changed, ["os_installed_at", "last_boot_at"])
+        total += len(changed)
+    return total
+
+
+def machines_without_reboot(days: int, queryset=None):
+    """Máquinas cujo último boot conhecido é anterior a ``days`` dias."""
+    queryset = Machine.objects.all() if queryset is None else queryset
+    return queryset.filter(last_boot_at__lt=timezone.now() - timedelta(days=days))
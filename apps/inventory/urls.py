@@ -3,6 +3,7 @@ from .views import (
     # API Endpoints
     MachineCheckinView,
     RunCommandView,
+    RemoteCommandOutputView,
     AgentDownloadView,
     MachineNotificationView,
     AgentVersionView,
@@ -46,6 +47,11 @@ urlpatterns = [
     path('inventario/checkin/', MachineCheckinView.as_view(), name='checkin'),
     path('run/<int:machine_id>/', RunCommandView.as_view(), name='run_command'),
     path("run/bulk/", BulkRunCommandView.as_view(), name="bulk_run_command"),
+    path(
+        "run/audit/<int:pk>/output/<str:stream>/",
+        RemoteCommandOutputView.as_view(),
+        name="run_command_output",
+    ),
     path('notifications/', MachineNotificationView.as_view(), name='machine-notifications'),
     path('agent/download/', AgentDownloadView.as_view(), name='agent_download'),
     path('agent/version/', AgentVersionView.as_view(), name='agent_version'),
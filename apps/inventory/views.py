@@ -6,25 +6,25 @@ import json
 import requests
 import secrets
 import time
-import ipaddress
 from datetime import timedelta
-import datetime
 import logging
 import hashlib
 import datetime as dt
+from collections import Counter
 from django.conf import settings
+from django.db import transaction
 from django.core.cache import cache
 from django.views import View
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, FileResponse, HttpResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
+from django.utils.http import content_disposition_header
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
-from django.db import models as dj_models
 from django.views.generic import ListView, DetailView, UpdateView, CreateView, DeleteView, TemplateView
 from django.urls import reverse_lazy
 from rest_framework.decorators import api_view
@@ -34,12 +34,27 @@ from rest_framework.views import APIView
 from django.db.models import Q
 from .forms import MachineForm, NotificationForm, BlockedSiteForm, MachineGroupForm, AgentTokenGenerateForm
 from .models import (Machine, BlockedSite, Notification, MachineGroup, AgentToken, AgentVersion, AgentTokenUsage,
-                     AgentDownloadLog, AgentUpdateReport, LogAtividade, RemoteCommandAudit)
+                     AgentDownloadLog, AgentUpdateReport, LogAtividade, RemoteCommandAudit,
+                     NotificationBroadcast)
+from .command_output import iter_command_output, open_command_output, store_command_output
+from .hardware import sync_machine_hardware
+from .policy import get_blocked_sites_policy
+from .sanitize import (
+    PayloadError, load_agent_json, read_agent_body, sanitize_json as _sanitize_json, sanitize_str as _sanitize_str,
+)
+from .timestamps import parse_wmi_date, raw_wmi_date
+from .search import filter_machines, keyset_page
+from .gateway import (
+    EVENT_COMMAND, command_audit_key, command_queue_key, command_result_key, notification_payload, push_to_agent,
+    save_command_result, take_pending_commands,
+)
+from .reachability import machine_ip_candidates, ranked_ips, record_route
+from .activity_utils import chave_resumo, incrementar_resumos, top_apps_maquina, atividade_por_dia
 
 logger = logging.getLogger(__name__)
 
+AGENT_WEBRTC_PORT = getattr(settings, "AGENT_WEBRTC_PORT", 7071)
 REMOTE_COMMAND_MAX_LENGTH = 8000
-REMOTE_COMMAND_OUTPUT_LIMIT = 20000
 REMOTE_COMMAND_REVERSE_WAIT_SECONDS = 70
 REMOTE_COMMAND_BLOCKLIST = [
     re.compile(pattern, re.IGNORECASE)
@@ -51,92 +66,6 @@ REMOTE_COMMAND_BLOCKLIST = [
 ]
 
 
-def _agent_command_queue_key(machine_name: str) -> str:
-    return f"inventory:agent-command:queue:{machine_name.lower()}"
-
-
-def _agent_command_result_key(request_id: str) -> str:
-    return f"inventory:agent-command:result:{request_id}"
-
-
-def _agent_best_ip_key(machine_name: str, purpose: str) -> str:
-    return f"inventory:agent:best-ip:{purpose}:{machine_name.lower()}"
-
-
-def _remember_best_ip(machine, purpose: str, ip: str) -> None:
-    if ip:
-        cache.set(_agent_best_ip_key(machine.hostname, purpose), ip, timeout=3600)
-
-
-def _get_best_ip(machine, purpose: str) -> str:
-    return cache.get(_agent_best_ip_key(machine.hostname, purpose), "") or ""
-
-
-def _extract_ipv4_values(value) -> list[str]:
-    if value is None:
-        return []
-    if isinstance(value, (list, tuple, set)):
-        raw_values = value
-    else:
-        raw_values = re.split(r"[,;\s]+", str(value))
-
-    ips: list[str] = []
-    for raw in raw_values:
-        candidate = str(raw).strip().strip("[]")
-        if not candidate:
-            continue
-        try:
-            ip = ipaddress.ip_address(candidate)
-        except ValueError:
-            continue
-        if ip.version != 4:
-            continue
-        if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_unspecified:
-            continue
-        ips.append(str(ip))
-    return ips
-
-
-def _machine_ip_candidates(machine) -> list[str]:
-    candidates: list[str] = []
-
-    def add(value):
-        for ip in _extract_ipv4_values(value):
-            if ip not in candidates:
-                candidates.append(ip)
-
-    add(getattr(machine, "ip_address", ""))
-    network_info = getattr(machine, "network_info", None)
-    if isinstance(network_info, list):
-        for adapter in network_info:
-            if not isinstance(adapter, dict):
-                continue
-            add(adapter.get("ip"))
-            add(adapter.get("ip_address"))
-            add(adapter.get("ips"))
-    elif isinstance(network_info, dict):
-        add(network_info.get("ip"))
-        add(network_info.get("ip_address"))
-        add(network_info.get("ips"))
-        adapters = network_info.get("adapters")
-        if isinstance(adapters, list):
-            for adapter in adapters:
-                if isinstance(adapter, dict):
-                    add(adapter.get("ip"))
-                    add(adapter.get("ip_address"))
-                    add(adapter.get("ips"))
-    return candidates
-
-
-def _ordered_ip_candidates(machine, purpose: str) -> list[str]:
-    candidates = _machine_ip_candidates(machine)
-    best_ip = _get_best_ip(machine, purpose)
-    if best_ip and best_ip in candidates:
-        candidates.remove(best_ip)
-        candidates.insert(0, best_ip)
-    return candidates
-
-
 def _get_request_ip(request) -> str | None:
     xff = request.META.get("HTTP_X_FORWARDED_FOR", "")
     if xff:
@@ -165,24 +94,30 @@ def _create_remote_command_audit(request, machine, command: str, cmd_type: str,
     )
 
 
-def _finish_remote_command_audit(audit, *, status_value: str, exit_code=None, stdout="", stderr="", error="", elapsed_ms=None):
+def _finish_remote_command_audit(audit, *, status_value: str, exit_code=None, stdout="", stderr="", error="",
+                                 elapsed_ms=None, output_stored=False):
+    """``output_stored``: a saída completa já foi gravada (canal reverso, save_command_result)."""
     if not audit:
         return
     audit.status = status_value
     audit.exit_code = exit_code
-    audit.stdout = str(stdout or "")[:REMOTE_COMMAND_OUTPUT_LIMIT]
-    audit.stderr = str(stderr or "")[:REMOTE_COMMAND_OUTPUT_LIMIT]
+    output_fields = []
+    if not output_stored:
+        output_fields += store_command_output(audit, "stdout", stdout)
+        output_fields += store_command_output(audit, "stderr", stderr)
     audit.error = str(error or "")[:5000]
     audit.completed_at = timezone.now()
     audit.duration_ms = elapsed_ms
     audit.save(update_fields=[
-        "status", "exit_code", "stdout", "stderr", "error", "completed_at", "duration_ms"
+        "status", "exit_code", "error", "completed_at", "duration_ms", *output_fields
     ])
 
 
-def _enqueue_reverse_command(machine, command: str, cmd_type: str, timeout: int) -> str:
+def _enqueue_reverse_command(machine, command: str, cmd_type: str, timeout: int, audit=None) -> str:
     request_id = secrets.token_hex(16)
-    queue_key = _agent_command_queue_key(machine.hostname)
+    if audit:
+        cache.set(command_audit_key(request_id), audit.pk, timeout=max(timeout + 300, 600))
+    queue_key = command_queue_key(machine.hostname)
     queue = cache.get(queue_key, [])
     if not isinstance(queue, list):
         queue = []
@@ -194,11 +129,12 @@ def _enqueue_reverse_command(machine, command: str, cmd_type: str, timeout: int)
         "created_at": int(time.time()),
     })
     cache.set(queue_key, queue[-20:], timeout=max(timeout + 300, 600))
+    push_to_agent(machine.hostname, EVENT_COMMAND)
     return request_id
 
 
 def _wait_reverse_command_result(request_id: str, wait_seconds: int = REMOTE_COMMAND_REVERSE_WAIT_SECONDS) -> dict:
-    result_key = _agent_command_result_key(request_id)
+    result_key = command_result_key(request_id)
     deadline = time.monotonic() + wait_seconds
     while time.monotonic() < deadline:
         result = cache.get(result_key)
@@ -209,15 +145,15 @@ def _wait_reverse_command_result(request_id: str, wait_seconds: int = REMOTE_COM
     raise TimeoutError("Timeout aguardando resultado via canal reverso")
 
 
-def _run_reverse_command(machine, command: str, cmd_type: str, timeout: int) -> dict:
-    request_id = _enqueue_reverse_command(machine, command, cmd_type, timeout)
+def _run_reverse_command(machine, command: str, cmd_type: str, timeout: int, audit=None) -> dict:
+    request_id = _enqueue_reverse_command(machine, command, cmd_type, timeout, audit)
     result = _wait_reverse_command_result(request_id, wait_seconds=timeout + 10)
     result.setdefault("request_id", request_id)
     return result
 
 
 def _post_agent_command_direct(machine, token_hash: str, command: str, cmd_type: str, timeout: int) -> dict:
-    candidates = _ordered_ip_candidates(machine, "command")
+    candidates = ranked_ips(machine, AGENT_WEBRTC_PORT)
     if not candidates:
         raise requests.exceptions.ConnectionError("Máquina sem IP candidato para conexão direta")
 
@@ -229,7 +165,7 @@ def _post_agent_command_direct(machine, token_hash: str, command: str, cmd_type:
     for ip in candidates:
         try:
             resp = requests.post(
-                f"http://{ip}:7071/command",
+                f"http://{ip}:{AGENT_WEBRTC_PORT}/command",
                 json={"type": cmd_type, "script": command, "timeout": timeout},
                 headers=headers,
                 timeout=(connect_timeout, timeout + 5),
@@ -240,11 +176,12 @@ def _post_agent_command_direct(machine, token_hash: str, command: str, cmd_type:
             data["_status_code"] = resp.status_code
             data["_elapsed_ms"] = int((time.monotonic() - started) * 1000)
             data["_tried_ips"] = candidates
-            _remember_best_ip(machine, "command", ip)
+            record_route(machine, ip, AGENT_WEBRTC_PORT, ok=True)
             return data
         except requests.exceptions.ReadTimeout:
             raise
         except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as exc:
+            record_route(machine, ip, AGENT_WEBRTC_PORT, ok=False)
             last_error = exc
             continue
 
@@ -361,64 +298,6 @@ class AgentTokenRequiredMixin:
             return None, JsonResponse(error, status=404)
 
 
-def _sanitize_str(v) -> "str | None":
-    """
-    Remove null bytes (\\u0000) e retorna None se vazio/None.
-
-    PostgreSQL text/varchar rejeita \\u0000 com:
-      unsupported Unicode escape sequence / \\u0000 cannot be converted to text
-    Origem: PowerShell serializa strings WMI com null bytes no final
-            ex: tpm.manufacturer_ver = "11.6.10.1196\\u0000"
-    """
-    if v is None:
-        return None
-    cleaned = str(v).replace("\\u0000", "").replace("\\x00", "").strip()
-    return cleaned if cleaned and cleaned.lower() != "none" else None
-
-
-def _remove_null_chars(s: str) -> str:
-    """
-    Remove todos os caracteres nulos de uma string.
-    Usa filter+ord porque replace('\\x00','') pode falhar dependendo
-    de como o Python internalizou o caractere (\\u0000 vs \\x00).
-    """
-    return ''.join(c for c in s if ord(c) != 0)
-
-
-def _sanitize_json(v):
-    """
-    Garante dict/list ou None para JSONField — remove null bytes (\\x00/\\u0000).
-    PostgreSQL jsonb rejeita null bytes: DataError: unsupported Unicode escape sequence.
-    Origem: PowerShell serializa strings WMI com null bytes no final
-            ex: tpm.manufacturer_ver = '11.8.50.3399\\x00'
-    Usa ord(c) != 0 porque replace('\\x00','') pode não capturar todos os casos.
-    """
-    if v is None:
-        return None
-
-    def _clean(obj):
-        if isinstance(obj, str):
-            cleaned = _remove_null_chars(obj)
-            return cleaned if cleaned else None
-        if isinstance(obj, dict):
-            return {k: _clean(val) for k, val in obj.items()}
-        if isinstance(obj, list):
-            return [_clean(item) for item in obj]
-        return obj
-
-    if isinstance(v, (dict, list)):
-        return _clean(v)
-    if isinstance(v, str):
-        try:
-            import json as _json
-            parsed = _json.loads(v)
-            if isinstance(parsed, (dict, list)):
-                return _clean(parsed)
-        except Exception:
-            pass
-    return None
-
-
 def _sanitize_float(v) -> "float | None":
     """Converte para float ou None. PostgreSQL FloatField rejeita strings não-numéricas."""
     if v is None:
@@ -439,55 +318,15 @@ def _sanitize_int(v) -> "int | None":
         return None
 
 
-def parse_wmi_date(wmi_date_str):
-    """
-    Converte data WMI/PowerShell para datetime timezone-aware (UTC).
-
-    Formatos suportados:
-      - /Date(1234567890000)/  — timestamp ms (ConvertTo-Json padrão)
-      - ISO 8601               — PowerShell 5+ com -Depth alto
-      - datetime Python        — passado diretamente
-    """
-    if not wmi_date_str:
-        return None
-    try:
-        if isinstance(wmi_date_str, str) and wmi_date_str.startswith("/Date("):
-            ms = int(wmi_date_str.replace("/Date(", "").replace(")/", ""))
-            return datetime.datetime.fromtimestamp(
-                ms / 1000, tz=datetime.timezone.utc
-            )
-        if isinstance(wmi_date_str, datetime.datetime):
-            if wmi_date_str.tzinfo is None:
-                return wmi_date_str.replace(tzinfo=datetime.timezone.utc)
-            return wmi_date_str
-        if isinstance(wmi_date_str, str):
-            for fmt in (
-                    "%Y-%m-%dT%H:%M:%S%z",
-                    "%Y-%m-%dT%H:%M:%SZ",
-                    "%Y-%m-%dT%H:%M:%S.%f%z",
-                    "%Y-%m-%dT%H:%M:%S",
-                    "%Y-%m-%dT%H:%M:%S.%f",
-            ):
-                try:
-                    s = wmi_date_str.rstrip("Z") if fmt.endswith("Z") else wmi_date_str
-                    f = fmt.rstrip("Z") if fmt.endswith("Z") else fmt
-                    parsed = datetime.datetime.strptime(s, f)
-                    if parsed.tzinfo is None:
-                        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
-                    return parsed
-                except ValueError:
-                    continue
-    except Exception as e:
-        logger.error(f"parse_wmi_date: {wmi_date_str!r} — {e}")
-    return None
-
-
 @method_decorator(csrf_exempt, name='dispatch')
 class MachineCheckinView(View):
     def post(self, request):
         try:
-            raw = request.body.decode('utf-8')
-            data = json.loads(raw)
+            data = load_agent_json(read_agent_body(request))
+        except PayloadError as e:
+            logger.warning(f"Checkin recusado: {e}")
+            return JsonResponse({'error': str(e)}, status=e.status)
+        try:
             hostname = data['hostname']
             ip = data.get('ip', '')
             hw = data.get('hardware', {})
@@ -507,8 +346,8 @@ class MachineCheckinView(View):
                 machine_name=hostname,
             )
 
-            install_date = parse_wmi_date(hw.get('install_date'))
-            last_boot = parse_wmi_date(hw.get('last_boot'))
+            install_date = hw.get('install_date')
+            last_boot = hw.get('last_boot')
 
             machine, _ = Machine.objects.update_or_create(
                 hostname=hostname,
@@ -540,8 +379,10 @@ class MachineCheckinView(View):
                     'os_caption':     _sanitize_str(hw.get('os_caption')),
                     'os_architecture':_sanitize_str(hw.get('os_architecture')),
                     'os_build':       _sanitize_str(hw.get('os_build')),
-                    'install_date':   install_date,
-                    'last_boot':      last_boot,
+                    'install_date':   raw_wmi_date(install_date),
+                    'last_boot':      raw_wmi_date(last_boot),
+                    'os_installed_at': parse_wmi_date(install_date),
+                    'last_boot_at':    parse_wmi_date(last_boot),
 
                     # Métricas — FloatField, PostgreSQL rejeita string não-numérica
                     'uptime_days':  _sanitize_float(hw.get('uptime_days')),
@@ -561,25 +402,41 @@ class MachineCheckinView(View):
                     'av_state':       _sanitize_str(hw.get('av_state')),
                 },
             )
+            # Tabelas de hardware normalizadas — só reescreve se o payload mudou
+            try:
+                sync_machine_hardware(machine)
+            except Exception as e:
+                logger.warning(f"Checkin | projeção de hardware falhou para {hostname}: {e}")
             return JsonResponse({'status': 'ok', 'machine_id': machine.id})
         except Exception as e:
             logger.error(f"Checkin error: {e}")
             return JsonResponse({'error': str(e)}, status=500)
 
     def get(self, request):
+        """
+        Lista de sites bloqueados efetiva para o host.
+
+        A política vem compilada do cache (apps.inventory.policy). O agente
+        pode enviar a versão que já possui em ``?version=`` ou no header
+        If-None-Match — se não mudou, responde 304 sem corpo.
+        """
         host = request.GET.get('host')
         if not host:
             return JsonResponse({'error': 'host parameter required'}, status=400)
 
-        sites = (
-            BlockedSite.objects.filter(
-                dj_models.Q(machine__hostname=host)
-                | dj_models.Q(group__machine__hostname=host)
-            )
-            .values_list('url', flat=True)
-            .distinct()
+        policy = get_blocked_sites_policy(host)
+        etag = f'"{policy["version"]}"'
+        client_version = (
+            request.GET.get('version')
+            or request.META.get('HTTP_IF_NONE_MATCH', '').strip().strip('"')
         )
-        return JsonResponse(list(sites), safe=False)
+        if client_version == policy['version']:
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse(policy['sites'], safe=False)
+        response['ETag'] = etag
+        response['X-Policy-Version'] = policy['version']
+        return response
 
 
 class RunCommandView(LoginRequiredMixin, View):
@@ -675,7 +532,7 @@ class RunCommandView(LoginRequiredMixin, View):
             try:
                 import time as _time
                 t0 = _time.monotonic()
-                data = _run_reverse_command(machine, cmd, cmd_type, 60)
+                data = _run_reverse_command(machine, cmd, cmd_type, 60, audit)
                 elapsed_ms = int((_time.monotonic() - t0) * 1000)
                 status_value = (
                     RemoteCommandAudit.STATUS_SUCCESS
@@ -690,6 +547,7 @@ class RunCommandView(LoginRequiredMixin, View):
                     stderr=data.get('stderr', ''),
                     error=data.get('error', ''),
                     elapsed_ms=elapsed_ms,
+                    output_stored=data.get('output_stored', False),
                 )
                 return JsonResponse({
                     'stdout':    data.get('stdout', ''),
@@ -706,7 +564,7 @@ class RunCommandView(LoginRequiredMixin, View):
                     error=str(reverse_timeout),
                 )
                 return JsonResponse(
-                    {'error': 'Agente offline ou sem polling reverso ativo', 'tried_ips': _machine_ip_candidates(machine)},
+                    {'error': 'Agente offline ou sem polling reverso ativo', 'tried_ips': machine_ip_candidates(machine)},
                     status=504
                 )
             except Exception as reverse_error:
@@ -739,6 +597,46 @@ class RunCommandView(LoginRequiredMixin, View):
             return JsonResponse({'error': str(e)}, status=500)
 
 
+class RemoteCommandOutputView(LoginRequiredMixin, View):
+    """
+    Serve a saída completa (stdout/stderr) de uma auditoria de comando remoto.
+
+    GET /api/run/audit/<pk>/output/<stream>/[?download=1]
+
+    A saída fica comprimida fora da linha de auditoria (command_output.py)
+    e é descomprimida em streaming — não carrega o texto inteiro em memória.
+    Sem Content-Length: medir o GzipFile exigiria descomprimi-lo duas vezes.
+    """
+
+    def handle_no_permission(self):
+        return JsonResponse({'error': 'Autenticação necessária'}, status=401)
+
+    def get(self, request, pk, stream):
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Acesso negado'}, status=403)
+        if stream not in ('stdout', 'stderr'):
+            return JsonResponse({'error': "Stream inválido. Use 'stdout' ou 'stderr'."}, status=400)
+
+        audit = get_object_or_404(RemoteCommandAudit, pk=pk)
+        try:
+            output = open_command_output(audit, stream)
+        except (FileNotFoundError, OSError) as e:
+            logger.error(f"RemoteCommandOutput | auditoria {pk} {stream}: {e}")
+            return JsonResponse({'error': 'Saída não encontrada no armazenamento'}, status=404)
+
+        response = StreamingHttpResponse(
+            iter_command_output(output),
+            content_type='text/plain; charset=utf-8',
+        )
+        response['Content-Disposition'] = content_disposition_header(
+            request.GET.get('download') == '1',
+            f"{audit.machine.hostname}_{audit.pk}_{stream}.txt",
+        )
+        response['X-Content-SHA256'] = getattr(audit, f'{stream}_sha256')
+        response['X-Content-Size'] = str(getattr(audit, f'{stream}_size'))
+        return response
+
+
 class BulkRunCommandView(LoginRequiredMixin, TemplateView):
     """
     Executa um comando PowerShell ou CMD em múltiplas máquinas em paralelo.
@@ -998,7 +896,7 @@ class BulkRunCommandView(LoginRequiredMixin, TemplateView):
             elapsed = int((_time.monotonic() - t0) * 1000)
             try:
                 reverse_t0 = _time.monotonic()
-                data = _run_reverse_command(machine, command, cmd_type, timeout)
+                data = _run_reverse_command(machine, command, cmd_type, timeout, audit)
                 elapsed = int((_time.monotonic() - reverse_t0) * 1000)
                 status_value = (
                     RemoteCommandAudit.STATUS_SUCCESS
@@ -1013,6 +911,7 @@ class BulkRunCommandView(LoginRequiredMixin, TemplateView):
                     stderr=data.get("stderr", ""),
                     error=data.get("error", ""),
                     elapsed_ms=elapsed,
+                    output_stored=data.get("output_stored", False),
                 )
                 return {
                     **base,
@@ -1120,16 +1019,7 @@ class MachineNotificationView(AgentTokenRequiredMixin, View):
 
             notifications = notifications_query.order_by('is_read', '-created_at')[:limit]
 
-            notifications_data = [{
-                'id': notif.id,
-                'title': notif.title,
-                'message': notif.message,
-                'type': getattr(notif, 'type', 'info'),
-                'priority': getattr(notif, 'priority', 'normal'),
-                'status': getattr(notif, 'status', 'pending'),
-                'is_read': notif.is_read,
-                'created_at': notif.created_at.isoformat(),
-            } for notif in notifications]
+            notifications_data = [notification_payload(notif) for notif in notifications]
 
             return JsonResponse({
                 'success': True,
@@ -1220,43 +1110,28 @@ class AgentVersionView(View):
 # ==================== VIEWS PARA INTERFACE WEB ====================
 
 class MachineListView(LoginRequiredMixin, ListView):
+    """
+    Listagem de máquinas com filtros e paginação por cursor.
+
+    Paginação keyset (?after= / ?before= / ?last=1) em vez de OFFSET —
+    ver apps.inventory.search.
+    """
     model = Machine
     template_name = 'inventario/machine_list.html'
     context_object_name = 'machines'
-    paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-
-        # Filtros
-        hostname = self.request.GET.get('hostname')
-        loggedUser = self.request.GET.get('loggedUser')
-        ip_address = self.request.GET.get('ip_address')
-        group = self.request.GET.get('group')
-        is_online = self.request.GET.get('is_online')
-
-        if hostname:
-            queryset = queryset.filter(hostname__icontains=hostname)
-        if loggedUser:
-            queryset = queryset.filter(loggedUser__icontains=loggedUser)
-        if ip_address:
-            queryset = queryset.filter(ip_address__icontains=ip_address)
-        if group:
-            queryset = queryset.filter(group_id=group)
-        if is_online in ('true', 'false'):
-            timeout = getattr(settings, 'MACHINE_OFFLINE_TIMEOUT', 15)
-            threshold = timezone.now() - timedelta(minutes=timeout)
-            if is_online == 'true':
-                queryset = queryset.filter(last_seen__gte=threshold)
-            else:
-                queryset = queryset.filter(
-                    Q(last_seen__lt=threshold) | Q(last_seen__isnull=True)
-                )
-
-        return queryset.order_by('-last_seen')
+        return filter_machines(super().get_queryset(), self.request.GET)
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+        page = keyset_page(
+            self.object_list,
+            after=self.request.GET.get('after', ''),
+            before=self.request.GET.get('before', ''),
+            last=self.request.GET.get('last') == '1',
+        )
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['page_obj'] = page
         context['grupos'] = MachineGroup.objects.all()
         return context
 
@@ -2323,6 +2198,7 @@ class AgentActivityAPIView(AgentTokenRequiredMixin, APIView):
         criados    = 0
         duplicados = 0
         erros      = 0
+        contagens  = Counter()
 
         for ev in events:
             try:
@@ -2388,11 +2264,18 @@ class AgentActivityAPIView(AgentTokenRequiredMixin, APIView):
                     detalhes        = ev.get("detalhes") if isinstance(ev.get("detalhes"), dict) else {},
                     ocorrido_em     = ocorrido_em,
                 )
+                contagens[chave_resumo(tipo, ocorrido_em, str(ev.get("app_nome", ""))[:255])] += 1
                 criados += 1
 
             except Exception:
                 erros += 1
 
+        if contagens:
+            try:
+                incrementar_resumos(machine, contagens)
+            except Exception as e:
+                logger.error(f"ActivityLog | falha ao atualizar resumo de {machine_name}: {e}")
+
         logger.info(
             "ActivityLog | máquina=%s criados=%d duplicados=%d erros=%d",
             machine_name,
@@ -2424,18 +2307,11 @@ class AgentCommandPullAPIView(AgentTokenRequiredMixin, APIView):
         if not machine_name:
             return Response({"ok": False, "error": "X-Machine-Name ausente."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queue_key = _agent_command_queue_key(machine_name)
-        queue = cache.get(queue_key, [])
-        if not queue:
+        commands = take_pending_commands(machine_name)
+        if not commands:
             return Response({"ok": True, "has_command": False})
 
-        command = queue.pop(0)
-        if queue:
-            cache.set(queue_key, queue, timeout=600)
-        else:
-            cache.delete(queue_key)
-
-        return Response({"ok": True, "has_command": True, "command": command})
+        return Response({"ok": True, "has_command": True, "command": commands[0]})
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -2450,24 +2326,8 @@ class AgentCommandResultAPIView(AgentTokenRequiredMixin, APIView):
         if error_response:
             return error_response
 
-        request_id = str(request.data.get("request_id", "")).strip()
-        if not request_id:
+        if not save_command_result(request.data):
             return Response({"ok": False, "error": "request_id obrigatório."}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            exit_code = int(request.data.get("exit_code", -1))
-        except (TypeError, ValueError):
-            exit_code = -1
-
-        result = {
-            "request_id": request_id,
-            "stdout": str(request.data.get("stdout", ""))[:REMOTE_COMMAND_OUTPUT_LIMIT],
-            "stderr": str(request.data.get("stderr", ""))[:REMOTE_COMMAND_OUTPUT_LIMIT],
-            "exit_code": exit_code,
-            "error": str(request.data.get("error", ""))[:5000],
-            "executed_at": request.data.get("executed_at"),
-        }
-        cache.set(_agent_command_result_key(request_id), result, timeout=300)
         return Response({"ok": True})
 
 
@@ -2505,14 +2365,9 @@ class AgentActivityLogView(LoginRequiredMixin, ListView):
         ctx["filtro_tipo"]    = self.request.GET.get("tipo", "")
         ctx["filtro_usuario"] = self.request.GET.get("usuario", "")
         ctx["filtro_app"]     = self.request.GET.get("app", "")
-        # Top apps para o período exibido
-        from django.db.models import Count
-        ctx["top_apps"] = (
-            LogAtividade.objects.filter(machine=self.machine, tipo="app_iniciado")
-            .values("app_nome")
-            .annotate(total=Count("id"))
-            .order_by("-total")[:10]
-        )
+        # Top apps e gráfico diário vêm dos resumos pré-agregados
+        ctx["top_apps"] = top_apps_maquina(self.machine, limite=10)
+        ctx["atividade_diaria"] = atividade_por_dia(self.machine, dias=30)
         return ctx
 
 
@@ -2529,7 +2384,13 @@ class AgentHealthCheckAPIView(APIView):
         return Response({'ok': True, 'status': 'ok', 'health': 'healthy', 'timestamp': timezone.now().isoformat()})
 
 class BulkNotificationCreateView(LoginRequiredMixin, View):
-    """Envia a mesma notificação para múltiplas máquinas ou grupos"""
+    """
+    Envia a mesma notificação para múltiplas máquinas, grupos ou a frota toda.
+
+    Registra um único NotificationBroadcast e distribui as notificações com
+    bulk_create (NotificationBroadcast.fan_out) — sem um INSERT e um
+    post_save por máquina.
+    """
     template_name = 'inventario/notification_bulk_form.html'
 
     def get(self, request):
@@ -2547,29 +2408,32 @@ class BulkNotificationCreateView(LoginRequiredMixin, View):
             return render(request, self.template_name, {'form': form, 'groups': groups})
 
         machines = form.cleaned_data['machines']
-        title = form.cleaned_data['title']
-        message = form.cleaned_data['message']
-        notif_type = form.cleaned_data['type']
-        priority = form.cleaned_data['priority']
-        expires_at = form.cleaned_data.get('expires_at')
-
-        # Adiciona máquinas dos grupos selecionados
-        group_ids = request.POST.getlist('groups')
-        if group_ids:
-            group_machines = Machine.objects.filter(group_id__in=group_ids)
-            machines = (machines | group_machines).distinct()
-
-        created = 0
-        for machine in machines:
-            Notification.objects.create(
-                machine=machine,
-                title=title,
-                message=message,
-                type=notif_type,
-                priority=priority,
-                expires_at=expires_at,
+        selected_groups = form.cleaned_data['groups']
+        all_machines = form.cleaned_data['all_machines']
+
+        # Envio e notificações entram juntos ou não entram
+        with transaction.atomic():
+            broadcast = NotificationBroadcast.objects.create(
+                title=form.cleaned_data['title'],
+                message=form.cleaned_data['message'],
+                type=form.cleaned_data['type'],
+                priority=form.cleaned_data['priority'],
+                expires_at=form.cleaned_data.get('expires_at'),
+                all_machines=all_machines,
+                created_by=request.user,
             )
-            created += 1
+            if selected_groups:
+                broadcast.groups.set(selected_groups)
+
+            # Resolve destinatários em um único SELECT de IDs
+            if all_machines:
+                target_ids = Machine.objects.values_list('id', flat=True)
+            else:
+                target_ids = Machine.objects.filter(
+                    Q(id__in=[m.id for m in machines]) | Q(group__in=selected_groups)
+                ).values_list('id', flat=True).distinct()
+
+            created = broadcast.fan_out(list(target_ids))
 
         messages.success(request, f'Notificação enviada para {created} máquina(s) com sucesso!')
         return redirect(reverse_lazy('inventario:notifications_list'))
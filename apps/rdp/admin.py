@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.rdp.models import RDPMachinePolicy, RDPSessionAudit, RDPSessionToken
+from apps.rdp.models import RDPActiveSession, RDPMachinePolicy, RDPSessionAudit, RDPSessionToken
 
 
 @admin.register(RDPMachinePolicy)
@@ -30,3 +30,10 @@ class RDPSessionAuditAdmin(admin.ModelAdmin):
     list_display = ("event_type", "machine", "user", "connection_mode", "session_id", "created_at")
     list_filter = ("event_type", "connection_mode", "created_at")
     search_fields = ("machine__hostname", "user__username", "session_id", "reason")
+
+
+@admin.register(RDPActiveSession)
+class RDPActiveSessionAdmin(admin.ModelAdmin):
+    list_display = ("session_id", "machine", "user", "connection_mode", "started_at", "expires_at")
+    list_filter = ("connection_mode", "started_at")
+    search_fields = ("machine__hostname", "user__username", "session_id")
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RdpConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.rdp'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from apps.inventory.models import AgentToken, AgentTokenUsage
+        from apps.rdp.credentials import invalidate_on_usage_change, invalidate_revocation_list
+        post_save.connect(invalidate_revocation_list, sender=AgentToken, dispatch_uid="rdp_revocation_save")
+        post_delete.connect(invalidate_revocation_list, sender=AgentToken, dispatch_uid="rdp_revocation_delete")
+        post_save.connect(invalidate_on_usage_change, sender=AgentTokenUsage, dispatch_uid="rdp_binding_save")
+        post_delete.connect(invalidate_on_usage_change, sender=AgentTokenUsage, dispatch_uid="rdp_binding_delete")
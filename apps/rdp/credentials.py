@@ -0,0 +1,109 @@
+"""
+Credenciais assinadas (HMAC) para os polls de sinalização RDP do agente.
+
+O agente troca seu Bearer (hash do AgentToken, validado no banco uma única
+vez) por uma credencial curta assinada com o SECRET_KEY via
+``django.core.signing``. A credencial carrega máquina, AgentToken, sessão
+(opcional) e expiração, e é verificada em memória a cada poll.
+
+O banco só entra na lista de vínculos válidos: pares (AgentToken, máquina)
+de AgentTokenUsage com token ativo e não vencido, mantida em cache por
+``REVOCATION_CACHE_TTL`` segundos e descartada quando um AgentToken é
+salvo/excluído ou um vínculo é criado/removido. Uma credencial só vale
+enquanto o token dela existir, estiver ativo e ainda estiver vinculado à
+máquina — desativar ou excluir o token, ou remover o AgentTokenUsage,
+revoga as credenciais já emitidas. Um par ausente do cache é conferido no
+banco antes da recusa (vínculo recém-criado em outro processo).
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.inventory.models import AgentToken, AgentTokenUsage
+
+CREDENTIAL_SALT = "rdp.signal.credential"
+CREDENTIAL_TTL = getattr(settings, "RDP_SIGNAL_CREDENTIAL_TTL", 300)
+REVOCATION_CACHE_TTL = 30
+_REVOCATION_KEY = "rdp:signal:bound-agent-tokens"
+
+
+def issue_signal_credential(machine_name: str, agent_token: AgentToken, session_id: str = "",
+                            ttl: int = CREDENTIAL_TTL) -> tuple[str, int]:
+    """
+    Assina uma credencial para ``machine_name`` (e ``session_id``, se dado).
+
+    Returns:
+        (credencial, segundos até expirar)
+    """
+    now = time.time()
+    expires = now + ttl
+    if agent_token.expires_at:
+        expires = min(expires, agent_token.expires_at.timestamp())
+    payload = {
+        "m": machine_name.lower(),
+        "t": agent_token.pk,
+        "s": session_id,
+        "exp": int(expires),
+    }
+    return signing.dumps(payload, salt=CREDENTIAL_SALT, compress=False), max(0, int(expires - now))
+
+
+def bound_agent_tokens() -> frozenset:
+    """Pares (id do AgentToken, máquina em minúsculas) ainda válidos."""
+    bound = cache.get(_REVOCATION_KEY)
+    if bound is None:
+        bound = frozenset(
+            (token_id, machine_name.lower())
+            for token_id, machine_name in AgentTokenUsage.objects.filter(
+                agent_token__is_active=True, agent_token__expires_at__gt=timezone.now(),
+            ).values_list("agent_token_id", "machine_name")
+        )
+        cache.set(_REVOCATION_KEY, bound, timeout=REVOCATION_CACHE_TTL)
+    return bound
+
+
+def _is_bound(token_id, machine_name: str) -> bool:
+    if (token_id, machine_name) in bound_agent_tokens():
+        return True
+    return AgentTokenUsage.objects.filter(
+        agent_token_id=token_id,
+        machine_name__iexact=machine_name,
+        agent_token__is_active=True,
+        agent_token__expires_at__gt=timezone.now(),
+    ).exists()
+
+
+def invalidate_revocation_list(**kwargs) -> None:
+    cache.delete(_REVOCATION_KEY)
+
+
+def invalidate_on_usage_change(created: bool = True, **kwargs) -> None:
+    """post_save/post_delete de AgentTokenUsage — ignora o toque em ``last_used_at``."""
+    if created:
+        invalidate_revocation_list()
+
+
+def verify_signal_credential(credential: str, machine_name: str, session_id: str | None = None) -> dict | None:
+    """
+    Verifica assinatura, máquina, expiração e revogação da credencial.
+
+    Com ``session_id``, aceita credenciais da máquina inteira (sem sessão)
+    ou emitidas para essa sessão; sem ``session_id``, só as da máquina.
+    """
+    try:
+        payload = signing.loads(credential, salt=CREDENTIAL_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(payload, dict) or payload.get("m") != machine_name.lower():
+        return None
+    if time.time() >= float(payload.get("exp") or 0):
+        return None
+    bound_session = payload.get("s") or ""
+    if bound_session and bound_session != session_id:
+        return None
+    if not _is_bound(payload.get("t"), payload["m"]):
+        return None
+    return payload
@@ -0,0 +1,90 @@
+"""
+Ciclo de vida de RDPSessionToken e RDPSessionAudit.
+
+- ``sweep_expired_tokens`` apaga, em lotes pequenos, tokens vencidos há
+  mais de ``RDP_SESSION_TOKEN_RETENTION_HOURS`` (a auditoria mantém o
+  vínculo nulo via SET_NULL). A tabela de tokens fica do tamanho das
+  sessões recentes, e com ela os índices de ``expires_at`` (usado pela
+  própria varredura) e o único de ``token_hash`` (validação do token).
+- ``archive_old_audits`` exporta eventos de auditoria mais antigos que
+  ``RDP_AUDIT_RETENTION_DAYS`` para um JSON Lines comprimido no storage
+  padrão (``rdp_audit_archive/``) e os remove em lotes.
+
+Ambos rodam via Celery Beat (apps/rdp/tasks.py).
+"""
+import gzip
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.rdp.models import RDPSessionAudit, RDPSessionToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RETENTION_HOURS = getattr(settings, "RDP_SESSION_TOKEN_RETENTION_HOURS", 24)
+AUDIT_RETENTION_DAYS = getattr(settings, "RDP_AUDIT_RETENTION_DAYS", 180)
+SWEEP_BATCH_SIZE = 500
+
+AUDIT_ARCHIVE_FIELDS = (
+    "id", "event_type", "user_id", "user__username", "machine_id", "machine__hostname",
+    "session_id", "reason", "connection_mode", "client_ip", "created_at",
+)
+
+
+def _delete_in_batches(queryset, batch_size: int) -> int:
+    total = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return total
+        queryset.model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+def sweep_expired_tokens(retention_hours: int = TOKEN_RETENTION_HOURS, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Apaga tokens vencidos há mais de ``retention_hours``. Retorna quantos."""
+    cutoff = timezone.now() - timedelta(hours=retention_hours)
+    total = _delete_in_batches(RDPSessionToken.objects.filter(expires_at__lt=cutoff), batch_size)
+    if total:
+        logger.info("RDP lifecycle | %d tokens vencidos removidos", total)
+    return total
+
+
+def archive_old_audits(retention_days: int = AUDIT_RETENTION_DAYS, batch_size: int = SWEEP_BATCH_SIZE,
+                       archive: bool = True) -> dict:
+    """
+    Arquiva e remove auditorias com mais de ``retention_days`` dias.
+
+    Returns:
+        {"removidos": n, "arquivo": nome no storage ou ""}
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    old = RDPSessionAudit.objects.filter(created_at__lt=cutoff)
+    if not old.exists():
+        return {"removidos": 0, "arquivo": ""}
+
+    archive_name = ""
+    if archive:
+        with tempfile.TemporaryFile() as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode="wb") as gz:
+                for row in old.order_by("pk").values(*AUDIT_ARCHIVE_FIELDS).iterator(chunk_size=batch_size):
+                    gz.write((json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n").encode("utf-8"))
+            tmp.seek(0)
+            now = timezone.localtime()
+            archive_name = default_storage.save(
+                f"rdp_audit_archive/{now:%Y/%m}/audit_ate_{cutoff:%Y%m%d}_{now:%H%M%S}.jsonl.gz",
+                File(tmp),
+            )
+
+    total = _delete_in_batches(old, batch_size)
+    logger.info("RDP lifecycle | %d auditorias removidas (arquivo=%s)", total, archive_name or "-")
+    return {"removidos": total, "arquivo": archive_name}
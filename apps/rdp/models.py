@@ -154,3 +154,48 @@ class RDPSessionAudit(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Auditoria de Sessão RDP"
         verbose_name_plural = "Auditoria de Sessões RDP"
+        indexes = [
+            models.Index(fields=["created_at"], name="rdp_audit_created"),
+            models.Index(fields=["machine", "created_at"], name="rdp_audit_machine_created"),
+        ]
+
+
+class RDPActiveSession(models.Model):
+    """
+    Registro de sessão RDP ativa (uma linha por sessão).
+
+    Substitui as listas por usuário no cache: cada sessão é um registro
+    próprio, compartilhado entre workers, com expiração por ``expires_at``
+    e índices por usuário e por máquina para contagem/listagem.
+    Linhas são removidas no encerramento; o histórico fica em
+    RDPSessionAudit.
+    """
+
+    session_id = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="rdp_active_sessions")
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name="rdp_active_sessions")
+    session_token = models.ForeignKey(
+        RDPSessionToken,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="active_sessions",
+    )
+    connection_mode = models.CharField(max_length=20, default=RDPMachinePolicy.MODE_AUTO)
+    quality = models.CharField(max_length=10, default=RDPMachinePolicy.QUALITY_AUTO)
+    reason = models.CharField(max_length=255, blank=True, default="")
+    started_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["started_at"]
+        verbose_name = "Sessão RDP Ativa"
+        verbose_name_plural = "Sessões RDP Ativas"
+        indexes = [
+            models.Index(fields=["user", "expires_at"], name="rdp_active_user_exp"),
+            models.Index(fields=["machine", "expires_at"], name="rdp_active_machine_exp"),
+            models.Index(fields=["expires_at"], name="rdp_active_exp"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.session_id[:8]} {self.machine.hostname}"
@@ -0,0 +1,139 @@
+"""
+Registro de sessões RDP ativas (RDPActiveSession).
+
+Cada sessão é uma linha própria, criada/removida atomicamente, com
+expiração por ``expires_at`` e índices (user, expires_at) e
+(machine, expires_at). Limite de sessões e "minhas sessões" viram uma
+consulta indexada, consistente entre workers e reinícios.
+
+``reconcile_expired_sessions`` encerra as sessões vencidas registrando
+EVENT_SESSION_CLOSED em RDPSessionAudit, para que o histórico feche mesmo
+quando o navegador não chama /close.
+"""
+import logging
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from apps.rdp.models import RDPActiveSession, RDPSessionAudit
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = getattr(settings, "RDP_SESSION_TIMEOUT", 3600)
+
+
+def active_sessions():
+    return RDPActiveSession.objects.filter(expires_at__gt=timezone.now())
+
+
+def user_sessions(user_id: int):
+    return active_sessions().filter(user_id=user_id)
+
+
+def machine_sessions(machine):
+    return active_sessions().filter(machine=machine)
+
+
+def count_user_sessions(user_id: int) -> int:
+    return user_sessions(user_id).count()
+
+
+def new_session_id() -> str:
+    return secrets.token_hex(16)
+
+
+def register_session(user, machine, session_token, session_id: str = "", limit: int | None = None) -> str | None:
+    """
+    Cria o registro da sessão e retorna o session_id.
+
+    ``session_id`` já vem gerado quando a offer foi sinalizada com ele.
+    Com ``limit``, a contagem das sessões ativas e o INSERT acontecem sob
+    lock na linha do usuário: requisições concorrentes do mesmo usuário
+    passam uma de cada vez e o limite não é ultrapassado. Retorna None
+    quando o usuário já está no limite.
+    """
+    with transaction.atomic():
+        if limit is not None:
+            list(get_user_model().objects.select_for_update().filter(pk=user.pk).values_list("pk", flat=True))
+            if count_user_sessions(user.pk) >= limit:
+                return None
+        now = timezone.now()
+        session = RDPActiveSession.objects.create(
+            session_id=session_id or new_session_id(),
+            user=user,
+            machine=machine,
+            session_token=session_token,
+            connection_mode=session_token.requested_mode,
+            quality=session_token.requested_quality,
+            reason=session_token.reason,
+            started_at=now,
+            expires_at=now + timedelta(seconds=SESSION_TTL),
+        )
+    return session.session_id
+
+
+def _as_dict(session: RDPActiveSession) -> dict:
+    return {
+        "id": session.session_id,
+        "user_id": session.user_id,
+        "machine": session.machine.hostname,
+        "started": int(session.started_at.timestamp()),
+        "session_token_id": session.session_token_id,
+        "mode": session.connection_mode,
+        "quality": session.quality,
+        "reason": session.reason,
+    }
+
+
+def close_sessions(user_id: int, machine_hostname: str, session_id: str | None = None) -> list[dict]:
+    """Remove as sessões ativas do usuário na máquina (ou só ``session_id``)."""
+    qs = user_sessions(user_id).filter(machine__hostname=machine_hostname).select_related("machine")
+    if session_id:
+        qs = qs.filter(session_id=session_id)
+    with transaction.atomic():
+        sessions = list(qs.select_for_update(of=("self",)))
+        closed = [_as_dict(s) for s in sessions]
+        RDPActiveSession.objects.filter(pk__in=[s.pk for s in sessions]).delete()
+    return closed
+
+
+def reconcile_expired_sessions(batch_size: int = 500) -> int:
+    """
+    Encerra sessões vencidas: grava EVENT_SESSION_CLOSED e remove o registro.
+
+    Returns:
+        Quantidade de sessões encerradas.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                RDPActiveSession.objects.filter(expires_at__lte=timezone.now())
+                .select_for_update(skip_locked=True)
+                .order_by("expires_at")[:batch_size]
+            )
+            if not expired:
+                break
+            RDPSessionAudit.objects.bulk_create([
+                RDPSessionAudit(
+                    event_type=RDPSessionAudit.EVENT_SESSION_CLOSED,
+                    user_id=s.user_id,
+                    machine_id=s.machine_id,
+                    session_token_id=s.session_token_id,
+                    session_id=s.session_id,
+                    reason=s.reason,
+                    connection_mode=s.connection_mode,
+                )
+                for s in expired
+            ])
+            RDPActiveSession.objects.filter(pk__in=[s.pk for s in expired]).delete()
+        total += len(expired)
+        if len(expired) < batch_size:
+            break
+    if total:
+        logger.info("RDP sessions | %d sessões expiradas encerradas", total)
+    return total
@@ -0,0 +1,181 @@
+"""
+Canal de sinalização RDP (offer/answer) com entrega por long-poll.
+
+O navegador publica a offer no canal da máquina e fica bloqueado no canal
+de answer da sua sessão até o agente responder; o agente, por sua vez, faz
+long-poll no canal da máquina. Cada lado acorda assim que a mensagem é
+publicada, sem loops de ``time.sleep``.
+
+O canal da máquina é uma fila: várias offers (técnicos diferentes, ou um
+retry) ficam pendentes ao mesmo tempo e o agente pode drená-las de uma vez
+com ``drain``. Answers são entregues por session id, então uma sessão não
+sobrescreve a outra.
+
+Backends:
+
+- Redis (``RDP_REDIS_URL`` configurado e pacote ``redis`` instalado):
+  cada canal é uma lista — ``RPUSH`` para publicar e ``BLPOP`` para
+  esperar. Vale entre workers e processos.
+- Em processo (fallback): filas em memória com ``threading.Condition``.
+  Só entrega entre requisições do mesmo processo — mesmo alcance que o
+  LocMemCache usado antes — e serve para desenvolvimento e testes.
+
+Cada mensagem é guardada com um ``expires_at``; as vencidas são
+descartadas ao consumir, então uma offer abandonada pelo navegador não
+chega ao agente.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # dependência opcional
+    redis = None
+
+SIGNAL_KEY_PREFIX = "rdp:signal"
+
+
+def offer_channel(machine_name: str) -> str:
+    return f"{SIGNAL_KEY_PREFIX}:offer:{machine_name.lower()}"
+
+
+def answer_channel(session_id: str) -> str:
+    return f"{SIGNAL_KEY_PREFIX}:answer:{session_id}"
+
+
+def _envelope(message: dict, ttl: float) -> dict:
+    return {"expires_at": time.time() + ttl, "data": message}
+
+
+def _is_expired(envelope: dict, now: float | None = None) -> bool:
+    return (now or time.time()) >= float(envelope.get("expires_at") or 0)
+
+
+class LocalSignalBus:
+    """Filas em memória do processo, com espera por ``threading.Condition``."""
+
+    def __init__(self):
+        self._queues: dict[str, deque] = defaultdict(deque)
+        self._cond = threading.Condition()
+
+    def publish(self, channel: str, message: dict, ttl: int) -> None:
+        with self._cond:
+            self._queues[channel].append(_envelope(message, ttl))
+            self._cond.notify_all()
+
+    def _pop_valid(self, channel: str):
+        queue = self._queues.get(channel)
+        now = time.time()
+        while queue:
+            envelope = queue.popleft()
+            if not _is_expired(envelope, now):
+                return envelope["data"]
+        self._queues.pop(channel, None)
+        return None
+
+    def pop(self, channel: str, timeout: float = 0) -> dict | None:
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while True:
+                message = self._pop_valid(channel)
+                if message is not None:
+                    return message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def drain(self, channel: str, timeout: float = 0, limit: int = 10) -> list[dict]:
+        """Espera a primeira mensagem e devolve até ``limit`` das pendentes."""
+        first = self.pop(channel, timeout)
+        if first is None:
+            return []
+        messages = [first]
+        with self._cond:
+            while len(messages) < limit:
+                message = self._pop_valid(channel)
+                if message is None:
+                    break
+                messages.append(message)
+        return messages
+
+    def clear(self) -> None:
+        with self._cond:
+            self._queues.clear()
+
+
+class RedisSignalBus:
+    """Listas no Redis — RPUSH para publicar, BLPOP para esperar."""
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel: str, message: dict, ttl: int) -> None:
+        pipe = self._client.pipeline()
+        pipe.rpush(channel, json.dumps(_envelope(message, ttl)))
+        pipe.expire(channel, int(ttl) + 5)
+        pipe.execute()
+
+    def pop(self, channel: str, timeout: float = 0) -> dict | None:
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                item = self._client.blpop([channel], timeout=remaining)
+                raw = item[1] if item else None
+            else:
+                raw = self._client.lpop(channel)
+            if raw is None:
+                return None
+            envelope = json.loads(raw)
+            if not _is_expired(envelope):
+                return envelope["data"]
+
+    def drain(self, channel: str, timeout: float = 0, limit: int = 10) -> list[dict]:
+        """Espera a primeira mensagem e devolve até ``limit`` das pendentes."""
+        first = self.pop(channel, timeout)
+        if first is None:
+            return []
+        messages = [first]
+        if limit > 1:
+            pipe = self._client.pipeline()
+            pipe.lrange(channel, 0, limit - 2)
+            pipe.ltrim(channel, limit - 1, -1)
+            raw_items, _ = pipe.execute()
+            now = time.time()
+            for raw in raw_items:
+                envelope = json.loads(raw)
+                if not _is_expired(envelope, now):
+                    messages.append(envelope["data"])
+        return messages
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(f"{SIGNAL_KEY_PREFIX}:*"):
+            self._client.delete(key)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_signal_bus():
+    """Retorna o backend configurado (Redis se disponível, senão em processo)."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                url = getattr(settings, "RDP_REDIS_URL", "")
+                if url and redis is not None:
+                    _bus = RedisSignalBus(url)
+                else:
+                    if url:
+                        logger.warning("RDP signal | RDP_REDIS_URL definido mas pacote redis ausente; usando fila em processo")
+                    _bus = LocalSignalBus()
+    return _bus
@@ -0,0 +1,51 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='rdp.reconciliar_sessoes', bind=True, max_retries=2)
+def reconciliar_sessoes(self):
+    """
+    Encerra sessões RDP vencidas e registra o fechamento na auditoria.
+    Roda a cada 5 minutos via Celery Beat.
+    """
+    try:
+        from apps.rdp.sessions import reconcile_expired_sessions
+
+        total = reconcile_expired_sessions()
+        return {'encerradas': total}
+    except Exception as exc:
+        logger.error(f"[TASK/RDP] Erro ao reconciliar sessões: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+
+@shared_task(name='rdp.limpar_tokens_expirados', bind=True, max_retries=2)
+def limpar_tokens_expirados(self):
+    """
+    Remove em lotes os tokens de sessão RDP vencidos.
+    Roda a cada 10 minutos via Celery Beat.
+    """
+    try:
+        from apps.rdp.lifecycle import sweep_expired_tokens
+
+        return {'removidos': sweep_expired_tokens()}
+    except Exception as exc:
+        logger.error(f"[TASK/RDP] Erro ao limpar tokens: {exc}")
+        raise self.retry(exc=exc, countdown=120)
+
+
+@shared_task(name='rdp.arquivar_auditoria', bind=True, max_retries=2)
+def arquivar_auditoria(self, dias=None):
+    """
+    Arquiva e remove eventos de auditoria RDP além do período de retenção.
+    Roda diariamente via Celery Beat.
+    """
+    try:
+        from apps.rdp.lifecycle import AUDIT_RETENTION_DAYS, archive_old_audits
+
+        return archive_old_audits(retention_days=dias or AUDIT_RETENTION_DAYS)
+    except Exception as exc:
+        logger.error(f"[TASK/RDP] Erro ao arquivar auditoria: {exc}")
+        raise self.retry(exc=exc, countdown=300)
@@ -1,12 +1,24 @@
+import gzip
+import json
+import tempfile
+import threading
+import time
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
 from apps.inventory.models import AgentToken, AgentTokenUsage, Machine
-from apps.rdp.models import RDPSessionToken
+from apps.rdp.credentials import issue_signal_credential, verify_signal_credential
+from apps.rdp.lifecycle import archive_old_audits, sweep_expired_tokens
+from apps.rdp.models import RDPActiveSession, RDPSessionAudit, RDPSessionToken
+from apps.rdp.sessions import close_sessions, count_user_sessions, reconcile_expired_sessions, register_session
+from apps.rdp.signaling import answer_channel, get_signal_bus, offer_channel
+from apps.rdp.views import RDPOfferView
 
 
 class RDPSessionTokenTests(TestCase):
@@ -72,3 +84,309 @@ class RDPSessionTokenTests(TestCase):
             HTTP_X_RDP_TOKEN="invalid-token-value",
         )
         self.assertEqual(resp.status_code, 403)
+
+
+class RDPSignalLongPollTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username="tech", password="secret123", is_staff=True)
+        self.machine = Machine.objects.create(hostname="PC-002", ip_address="10.0.0.11")
+        self.agent_token = AgentToken.objects.create(
+            token="Ef3$Gh4@",
+            token_hash=AgentToken.hash_token("Ef3$Gh4@"),
+            created_by=self.user,
+            expires_at=timezone.now() + timedelta(days=1),
+            is_active=True,
+        )
+        AgentTokenUsage.objects.create(agent_token=self.agent_token, machine_name=self.machine.hostname)
+        self.bus = get_signal_bus()
+        self.bus.clear()
+        self.headers = {
+            "HTTP_X_MACHINE_NAME": self.machine.hostname,
+            "HTTP_AUTHORIZATION": f"Bearer {self.agent_token.token_hash}",
+        }
+
+    def _publish_later(self, channel, message, delay=0.2):
+        timer = threading.Timer(delay, self.bus.publish, args=(channel, message), kwargs={"ttl": 10})
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_pull_without_wait_returns_immediately(self):
+        resp = self.client.post(reverse("rdp:rdp_signal_pull"), **self.headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.json()["has_offer"])
+
+    def test_pull_long_poll_wakes_on_offer(self):
+        self._publish_later(offer_channel(self.machine.hostname), {"request_id": "abc", "type": "offer"})
+        started = time.monotonic()
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_pull") + "?wait=5", **self.headers,
+        )
+        self.assertLess(time.monotonic() - started, 3)
+        data = resp.json()
+        self.assertTrue(data["has_offer"])
+        self.assertEqual(data["offer"]["request_id"], "abc")
+
+    def test_answer_is_delivered_to_waiting_offer(self):
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_answer"),
+            data={"request_id": "req1", "answer": {"type": "answer", "sdp": "v=0"}},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.bus.pop(answer_channel("req1"), timeout=1), {"type": "answer", "sdp": "v=0"})
+
+    def test_expired_messages_are_dropped(self):
+        self.bus.publish(offer_channel(self.machine.hostname), {"request_id": "old"}, ttl=0)
+        self.assertIsNone(self.bus.pop(offer_channel(self.machine.hostname), timeout=0))
+
+    def test_reverse_signal_round_trip(self):
+        _, session_token = RDPSessionToken.issue(
+            machine=self.machine, agent_token=self.agent_token, user=self.user, ttl_seconds=60,
+        )
+
+        def agent():
+            offer = self.bus.pop(offer_channel(self.machine.hostname), timeout=5)
+            self.bus.publish(answer_channel(offer["request_id"]), {"type": "answer", "sdp": "ans"}, ttl=10)
+
+        thread = threading.Thread(target=agent)
+        thread.start()
+        answer = RDPOfferView()._forward_offer_via_reverse_signal(session_token, self.machine, "v=0", "auto")
+        thread.join()
+        self.assertEqual(answer["sdp"], "ans")
+
+
+    def test_concurrent_offers_are_drained_in_one_pull(self):
+        _, session_token = RDPSessionToken.issue(
+            machine=self.machine, agent_token=self.agent_token, user=self.user, ttl_seconds=60,
+        )
+        results = {}
+
+        def browser(session_id):
+            results[session_id] = RDPOfferView()._forward_offer_via_reverse_signal(
+                session_token, self.machine, f"offer-{session_id}", "auto", session_id,
+            )
+
+        threads = [threading.Thread(target=browser, args=(sid,)) for sid in ("s1", "s2")]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        offers = []
+        while len(offers) < 2 and time.monotonic() < deadline:
+            resp = self.client.post(reverse("rdp:rdp_signal_pull") + "?wait=2&max=10", **self.headers)
+            offers += resp.json()["offers"]
+        self.assertEqual(sorted(o["session_id"] for o in offers), ["s1", "s2"])
+
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_answer"),
+            data={"answers": [
+                {"session_id": o["session_id"], "answer": {"type": "answer", "sdp": "ans-" + o["session_id"]}}
+                for o in offers
+            ]},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(resp.json()["delivered"], 2)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results["s1"]["sdp"], "ans-s1")
+        self.assertEqual(results["s2"]["sdp"], "ans-s2")
+
+class RDPSessionRegistryTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username="tech", password="secret123", is_staff=True)
+        self.machine = Machine.objects.create(hostname="PC-003", ip_address="10.0.0.12")
+        self.agent_token = AgentToken.objects.create(
+            token="Ij5$Kl6@",
+            token_hash=AgentToken.hash_token("Ij5$Kl6@"),
+            created_by=self.user,
+            expires_at=timezone.now() + timedelta(days=1),
+            is_active=True,
+        )
+        _, self.session_token = RDPSessionToken.issue(
+            machine=self.machine, agent_token=self.agent_token, user=self.user, ttl_seconds=60,
+        )
+
+    def test_register_count_and_close(self):
+        sid1 = register_session(self.user, self.machine, self.session_token)
+        register_session(self.user, self.machine, self.session_token)
+        self.assertEqual(count_user_sessions(self.user.pk), 2)
+
+        closed = close_sessions(self.user.pk, self.machine.hostname, sid1)
+        self.assertEqual([c["id"] for c in closed], [sid1])
+        self.assertEqual(count_user_sessions(self.user.pk), 1)
+
+        self.client.force_login(self.user)
+        data = self.client.get(reverse("rdp:rdp_sessions")).json()
+        self.assertEqual(len(data["sessions"]), 1)
+        self.assertEqual(data["sessions"][0]["machine"], self.machine.hostname)
+
+    def test_register_with_limit_counts_and_inserts_atomically(self):
+        sids = [register_session(self.user, self.machine, self.session_token, limit=2) for _ in range(3)]
+        self.assertIsNotNone(sids[0])
+        self.assertIsNotNone(sids[1])
+        self.assertIsNone(sids[2])
+        self.assertEqual(count_user_sessions(self.user.pk), 2)
+
+        close_sessions(self.user.pk, self.machine.hostname, sids[0])
+        self.assertIsNotNone(register_session(self.user, self.machine, self.session_token, limit=2))
+
+    def test_expired_sessions_are_reconciled_into_audit(self):
+        sid = register_session(self.user, self.machine, self.session_token)
+        RDPActiveSession.objects.filter(session_id=sid).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(count_user_sessions(self.user.pk), 0)
+
+        self.assertEqual(reconcile_expired_sessions(), 1)
+        self.assertFalse(RDPActiveSession.objects.exists())
+        self.assertTrue(
+            RDPSessionAudit.objects.filter(
+                event_type=RDPSessionAudit.EVENT_SESSION_CLOSED, session_id=sid,
+            ).exists()
+        )
+
+
+class RDPSignalCredentialTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username="tech", password="secret123", is_staff=True)
+        self.machine = Machine.objects.create(hostname="PC-004", ip_address="10.0.0.13")
+        self.agent_token = AgentToken.objects.create(
+            token="Mn7$Op8@",
+            token_hash=AgentToken.hash_token("Mn7$Op8@"),
+            created_by=self.user,
+            expires_at=timezone.now() + timedelta(days=1),
+            is_active=True,
+        )
+        AgentTokenUsage.objects.create(agent_token=self.agent_token, machine_name=self.machine.hostname)
+        get_signal_bus().clear()
+
+    def _credential(self):
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_credential"),
+            HTTP_X_MACHINE_NAME=self.machine.hostname,
+            HTTP_AUTHORIZATION=f"Bearer {self.agent_token.token_hash}",
+        )
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()["credential"]
+
+    def _pull(self, credential):
+        return self.client.post(
+            reverse("rdp:rdp_signal_pull"),
+            HTTP_X_MACHINE_NAME=self.machine.hostname,
+            HTTP_AUTHORIZATION=f"Signal {credential}",
+        )
+
+    def test_signed_credential_polls_without_db(self):
+        credential = self._credential()
+        self.assertEqual(self._pull(credential).status_code, 200)  # carrega lista de revogação
+        with self.assertNumQueries(0):
+            self.assertEqual(self._pull(credential).status_code, 200)
+
+    def test_credential_rejected_for_other_machine_or_tampered(self):
+        credential = self._credential()
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_pull"),
+            HTTP_X_MACHINE_NAME="PC-OUTRO",
+            HTTP_AUTHORIZATION=f"Signal {credential}",
+        )
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(self._pull(credential[:-2] + "xx").status_code, 401)
+
+    def test_deactivated_agent_token_revokes_credential(self):
+        credential = self._credential()
+        self.agent_token.is_active = False
+        self.agent_token.save()
+        self.assertEqual(self._pull(credential).status_code, 401)
+
+    def test_deleted_agent_token_revokes_issued_credential(self):
+        credential = self._credential()
+        self.assertEqual(self._pull(credential).status_code, 200)
+        self.agent_token.delete()
+        self.assertEqual(self._pull(credential).status_code, 401)
+        self.assertIsNone(verify_signal_credential(credential, self.machine.hostname))
+
+    def test_unbound_machine_revokes_issued_credential(self):
+        credential = self._credential()
+        self.assertEqual(self._pull(credential).status_code, 200)
+        AgentTokenUsage.objects.filter(agent_token=self.agent_token).delete()
+        self.assertEqual(self._pull(credential).status_code, 401)
+
+    def test_session_credential_only_answers_its_session(self):
+        credential, _ = issue_signal_credential(self.machine.hostname, self.agent_token, "sess-1")
+        self.assertIsNone(verify_signal_credential(credential, self.machine.hostname))
+        self.assertIsNone(verify_signal_credential(credential, self.machine.hostname, "sess-2"))
+
+        resp = self.client.post(
+            reverse("rdp:rdp_signal_answer"),
+            data={"answers": [
+                {"session_id": "sess-1", "credential": credential, "answer": {"type": "answer", "sdp": "a"}},
+                {"session_id": "sess-2", "credential": credential, "answer": {"type": "answer", "sdp": "b"}},
+            ]},
+            content_type="application/json",
+            HTTP_X_MACHINE_NAME=self.machine.hostname,
+        )
+        self.assertEqual(resp.json()["delivered"], 1)
+        self.assertIsNotNone(get_signal_bus().pop(answer_channel("sess-1")))
+        self.assertIsNone(get_signal_bus().pop(answer_channel("sess-2")))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix="rdp_audit_archive_tests_"))
+class RDPLifecycleTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username="tech", password="secret123", is_staff=True)
+        self.machine = Machine.objects.create(hostname="PC-005", ip_address="10.0.0.14")
+        self.agent_token = AgentToken.objects.create(
+            token="Qr9$St0@",
+            token_hash=AgentToken.hash_token("Qr9$St0@"),
+            created_by=self.user,
+            expires_at=timezone.now() + timedelta(days=1),
+            is_active=True,
+        )
+
+    def _token(self, expired_hours_ago=None):
+        _, token = RDPSessionToken.issue(
+            machine=self.machine, agent_token=self.agent_token, user=self.user, ttl_seconds=60,
+        )
+        if expired_hours_ago is not None:
+            token.expires_at = timezone.now() - timedelta(hours=expired_hours_ago)
+            token.save(update_fields=["expires_at"])
+        return token
+
+    def test_sweep_removes_only_tokens_past_retention(self):
+        old = [self._token(expired_hours_ago=48) for _ in range(5)]
+        recent = self._token(expired_hours_ago=1)
+        live = self._token()
+        audit = RDPSessionAudit.objects.create(
+            event_type=RDPSessionAudit.EVENT_TOKEN_ISSUED, user=self.user, machine=self.machine,
+            session_token=old[0],
+        )
+
+        self.assertEqual(sweep_expired_tokens(retention_hours=24, batch_size=2), 5)
+        self.assertEqual(set(RDPSessionToken.objects.values_list("pk", flat=True)), {recent.pk, live.pk})
+        audit.refresh_from_db()
+        self.assertIsNone(audit.session_token_id)
+
+    def test_archive_old_audits_writes_gzip_and_deletes(self):
+        events = [
+            RDPSessionAudit.objects.create(
+                event_type=RDPSessionAudit.EVENT_SESSION_STARTED, user=self.user, machine=self.machine,
+                session_id=f"s{i}",
+            )
+            for i in range(3)
+        ]
+        RDPSessionAudit.objects.filter(pk__in=[e.pk for e in events[:2]]).update(
+            created_at=timezone.now() - timedelta(days=200),
+        )
+
+        result = archive_old_audits(retention_days=180, batch_size=1)
+
+        self.assertEqual(result["removidos"], 2)
+        self.assertEqual(list(RDPSessionAudit.objects.values_list("session_id", flat=True)), ["s2"])
+        with default_storage.open(result["arquivo"], "rb") as fh:
+            rows = [json.loads(line) for line in gzip.decompress(fh.read()).decode().splitlines()]
+        self.assertEqual(sorted(r["session_id"] for r in rows), ["s0", "s1"])
+        self.assertEqual(rows[0]["machine__hostname"], self.machine.hostname)
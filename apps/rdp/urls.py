@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     RDPAgentSignalAnswerView,
+    RDPAgentSignalCredentialView,
     RDPAgentSignalPullView,
     RDPConfigView,
     RDPCloseView,
@@ -21,6 +22,7 @@ urlpatterns = [
     path('policy/', RDPPolicyView.as_view(), name='rdp_policy'),
     path('config/', RDPConfigView.as_view(), name='rdp_config'),
     path('session-token/', RDPSessionTokenView.as_view(), name='rdp_session_token'),
+    path('signal/credential/', RDPAgentSignalCredentialView.as_view(), name='rdp_signal_credential'),
     path('signal/pull/', RDPAgentSignalPullView.as_view(), name='rdp_signal_pull'),
     path('signal/answer/', RDPAgentSignalAnswerView.as_view(), name='rdp_signal_answer'),
 ]
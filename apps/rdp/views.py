@@ -1,35 +1,43 @@
 import base64
 import hashlib
 import hmac
-import ipaddress
 import json
 import logging
-import re
-import secrets
 import time
 from functools import wraps
 
 import requests as req_lib
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views import View
 
+from apps.inventory.gateway import EVENT_RDP_OFFER, push_to_agent
 from apps.inventory.models import AgentTokenUsage, Machine
+from apps.inventory.reachability import has_known_route, ranked_ips, record_route
+from apps.rdp.credentials import issue_signal_credential, verify_signal_credential
 from apps.rdp.models import RDPMachinePolicy, RDPSessionAudit, RDPSessionToken
+from apps.rdp.sessions import (
+    close_sessions,
+    count_user_sessions,
+    new_session_id,
+    register_session,
+    user_sessions,
+)
+from apps.rdp.signaling import answer_channel, get_signal_bus, offer_channel
 
 logger = logging.getLogger(__name__)
 
 IPC_PORT = getattr(settings, "AGENT_IPC_PORT", 7070)
 WEBRTC_PORT = getattr(settings, "AGENT_WEBRTC_PORT", 7071)
-SESSION_TTL = getattr(settings, "RDP_SESSION_TIMEOUT", 3600)
 MAX_SESSIONS = getattr(settings, "RDP_MAX_SESSIONS_PER_USER", 3)
 SESSION_TOKEN_TTL = getattr(settings, "RDP_SESSION_TOKEN_TTL", 120)
 SIGNAL_WAIT_TIMEOUT = getattr(settings, "RDP_SIGNAL_WAIT_TIMEOUT", 12)
+SIGNAL_LONGPOLL_MAX = getattr(settings, "RDP_SIGNAL_LONGPOLL_MAX", 25)
+SIGNAL_MAX_OFFERS_PER_PULL = getattr(settings, "RDP_SIGNAL_MAX_OFFERS_PER_PULL", 10)
 ENABLE_REVERSE_SIGNAL = getattr(settings, "RDP_ENABLE_REVERSE_SIGNAL", True)
 
 
@@ -37,35 +45,6 @@ def _sha256(value: str) -> str:
     return hashlib.sha256(value.encode()).hexdigest()
 
 
-def _active_session_key(session_id: str) -> str:
-    return f"rdp:session:{session_id}"
-
-
-def _active_user_index_key(user_id: int) -> str:
-    return f"rdp:user:{user_id}:sessions"
-
-
-def _signal_offer_key(machine_name: str) -> str:
-    return f"rdp:signal:offer:{machine_name}"
-
-
-def _signal_answer_key(request_id: str) -> str:
-    return f"rdp:signal:answer:{request_id}"
-
-
-def _agent_best_ip_key(machine_name: str, purpose: str) -> str:
-    return f"inventory:agent:best-ip:{purpose}:{machine_name.lower()}"
-
-
-def _remember_best_ip(machine: Machine, purpose: str, ip: str) -> None:
-    if ip:
-        cache.set(_agent_best_ip_key(machine.hostname, purpose), ip, timeout=3600)
-
-
-def _get_best_ip(machine: Machine, purpose: str) -> str:
-    return cache.get(_agent_best_ip_key(machine.hostname, purpose), "") or ""
-
-
 def _get_client_ip(request) -> str | None:
     xff = request.META.get("HTTP_X_FORWARDED_FOR", "")
     if xff:
@@ -73,75 +52,16 @@ def _get_client_ip(request) -> str | None:
     return request.META.get("REMOTE_ADDR") or None
 
 
-def _extract_ipv4_values(value) -> list[str]:
-    if value is None:
-        return []
-    raw_values = value if isinstance(value, (list, tuple, set)) else re.split(r"[,;\s]+", str(value))
-    ips = []
-    for raw in raw_values:
-        candidate = str(raw).strip().strip("[]")
-        if not candidate:
-            continue
-        try:
-            ip = ipaddress.ip_address(candidate)
-        except ValueError:
-            continue
-        if ip.version != 4:
-            continue
-        if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_unspecified:
-            continue
-        ips.append(str(ip))
-    return ips
-
-
-def _machine_ip_candidates(machine: Machine) -> list[str]:
-    candidates = []
-
-    def add(value):
-        for ip in _extract_ipv4_values(value):
-            if ip not in candidates:
-                candidates.append(ip)
-
-    add(getattr(machine, "ip_address", ""))
-    network_info = getattr(machine, "network_info", None)
-    if isinstance(network_info, list):
-        for adapter in network_info:
-            if isinstance(adapter, dict):
-                add(adapter.get("ip"))
-                add(adapter.get("ip_address"))
-                add(adapter.get("ips"))
-    elif isinstance(network_info, dict):
-        add(network_info.get("ip"))
-        add(network_info.get("ip_address"))
-        add(network_info.get("ips"))
-        adapters = network_info.get("adapters")
-        if isinstance(adapters, list):
-            for adapter in adapters:
-                if isinstance(adapter, dict):
-                    add(adapter.get("ip"))
-                    add(adapter.get("ip_address"))
-                    add(adapter.get("ips"))
-    return candidates
-
-
-def _ordered_ip_candidates(machine: Machine, purpose: str) -> list[str]:
-    candidates = _machine_ip_candidates(machine)
-    best_ip = _get_best_ip(machine, purpose)
-    if best_ip and best_ip in candidates:
-        candidates.remove(best_ip)
-        candidates.insert(0, best_ip)
-    return candidates
-
-
 def _agent_get(machine: Machine, path: str, headers: dict | None = None, timeout: int = 4):
     last_error = None
     connect_timeout = float(getattr(settings, "AGENT_DIRECT_CONNECT_TIMEOUT", 1.0))
-    for ip in _ordered_ip_candidates(machine, "rdp"):
+    for ip in ranked_ips(machine, WEBRTC_PORT):
         try:
             resp = req_lib.get(f"http://{ip}:{WEBRTC_PORT}{path}", headers=headers or {}, timeout=(connect_timeout, timeout))
-            _remember_best_ip(machine, "rdp", ip)
+            record_route(machine, ip, WEBRTC_PORT, ok=True)
             return resp
         except (req_lib.exceptions.ConnectionError, req_lib.exceptions.Timeout) as exc:
+            record_route(machine, ip, WEBRTC_PORT, ok=False)
             last_error = exc
             continue
     raise req_lib.exceptions.ConnectionError("Agente inacessível nos IPs candidatos") from last_error
@@ -213,12 +133,13 @@ def _get_online_agent_token(machine: Machine):
     return usage.agent_token if usage else None
 
 
-def _validate_agent_signal_auth(request, machine_name: str):
-    auth = request.META.get("HTTP_AUTHORIZATION", "")
-    if not auth.startswith("Bearer "):
-        return None
-    token_hash = auth[7:].strip()
-    if len(token_hash) != 64:
+def agent_token_for_machine(token_hash: str, machine_name: str):
+    """
+    AgentToken ativo e não expirado com esse hash *e* vinculado à máquina
+    (AgentTokenUsage). Usado pelos endpoints de sinalização e pelo gateway
+    WebSocket (apps/inventory/consumers.py).
+    """
+    if len(token_hash) != 64 or not machine_name:
         return None
     usage = (
         AgentTokenUsage.objects.filter(
@@ -233,6 +154,28 @@ def _validate_agent_signal_auth(request, machine_name: str):
     return usage.agent_token if usage else None
 
 
+def _agent_token_from_bearer(request, machine_name: str):
+    """Valida ``Authorization: Bearer <hash do AgentToken>`` no banco."""
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if not auth.startswith("Bearer "):
+        return None
+    return agent_token_for_machine(auth[7:].strip(), machine_name)
+
+
+def _validate_agent_signal_auth(request, machine_name: str, session_id: str | None = None):
+    """
+    Autentica o agente nos endpoints de sinalização.
+
+    ``Authorization: Signal <credencial>`` é verificada em memória (ver
+    apps/rdp/credentials.py); ``Bearer`` continua aceito para agentes
+    antigos e consulta o banco.
+    """
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if auth.startswith("Signal "):
+        return verify_signal_credential(auth[7:].strip(), machine_name, session_id)
+    return _agent_token_from_bearer(request, machine_name)
+
+
 def _validate_session_token(token: str, machine: Machine, user) -> RDPSessionToken | None:
     token_hash = _sha256(token)
     obj = (
@@ -253,55 +196,8 @@ def _validate_session_token(token: str, machine: Machine, user) -> RDPSessionTok
     return obj
 
 
-def _list_user_session_ids(user_id: int) -> list[str]:
-    ids = cache.get(_active_user_index_key(user_id), [])
-    valid = []
-    for sid in ids:
-        if cache.get(_active_session_key(sid)):
-            valid.append(sid)
-    cache.set(_active_user_index_key(user_id), valid, timeout=SESSION_TTL)
-    return valid
-
-
 def _check_rate_limit(user_id: int) -> bool:
-    return len(_list_user_session_ids(user_id)) < MAX_SESSIONS
-
-
-def _register_session(user, machine: Machine, session_token: RDPSessionToken) -> str:
-    session_id = secrets.token_hex(16)
-    now = int(time.time())
-    cache.set(
-        _active_session_key(session_id),
-        {
-            "user_id": user.pk,
-            "username": user.username,
-            "machine": machine.hostname,
-            "started": now,
-            "session_token_id": session_token.pk,
-            "mode": session_token.requested_mode,
-            "quality": session_token.requested_quality,
-            "reason": session_token.reason,
-        },
-        timeout=SESSION_TTL,
-    )
-    user_sessions = _list_user_session_ids(user.pk)
-    user_sessions.append(session_id)
-    cache.set(_active_user_index_key(user.pk), user_sessions, timeout=SESSION_TTL)
-    return session_id
-
-
-def _close_session(user_id: int, machine: str, session_id: str | None = None) -> list[dict]:
-    closed = []
-    for sid in _list_user_session_ids(user_id):
-        if session_id and sid != session_id:
-            continue
-        data = cache.get(_active_session_key(sid)) or {}
-        if data.get("machine") != machine:
-            continue
-        closed.append(data | {"id": sid})
-        cache.delete(_active_session_key(sid))
-    _list_user_session_ids(user_id)
-    return closed
+    return count_user_sessions(user_id) < MAX_SESSIONS
 
 
 def _require_rdp_auth(view_func):
@@ -452,8 +348,23 @@ class RDPOfferView(View):
         if codec_hint not in ("auto", "fallback"):
             codec_hint = "auto"
 
+        # Reserva a vaga antes de falar com o agente: contagem e INSERT sob o
+        # mesmo lock, então requisições simultâneas não passam do limite.
+        session_id = register_session(
+            request.user, machine, request.rdp_session_token, session_id=new_session_id(), limit=MAX_SESSIONS,
+        )
+        if session_id is None:
+            return JsonResponse(
+                {"error": f"Limite de {MAX_SESSIONS} sessões simultâneas atingido"},
+                status=429,
+            )
+
         try:
-            answer = self._forward_offer_to_agent(request.rdp_session_token, machine, sdp, codec_hint)
+            try:
+                answer = self._forward_offer_to_agent(request.rdp_session_token, machine, sdp, codec_hint, session_id)
+            except Exception:
+                close_sessions(request.user.pk, machine.hostname, session_id)
+                raise
         except req_lib.exceptions.ConnectionError:
             return JsonResponse({"error": "Agente offline ou inacessível"}, status=502)
         except req_lib.exceptions.Timeout:
@@ -462,7 +373,6 @@ class RDPOfferView(View):
             logger.exception("RDP erro ao encaminhar offer: %s", exc)
             return JsonResponse({"error": f"Erro interno: {str(exc)}"}, status=500)
 
-        session_id = _register_session(request.user, machine, request.rdp_session_token)
         if request.rdp_session_token.used_at is None:
             request.rdp_session_token.used_at = timezone.now()
             request.rdp_session_token.save(update_fields=["used_at"])
@@ -491,10 +401,11 @@ class RDPOfferView(View):
         machine: Machine,
         sdp: str,
         codec_hint: str = "auto",
+        session_id: str = "",
     ) -> dict:
-        has_best_direct_ip = bool(_get_best_ip(machine, "rdp"))
+        has_best_direct_ip = has_known_route(machine, WEBRTC_PORT)
         if ENABLE_REVERSE_SIGNAL and not has_best_direct_ip:
-            answer = self._forward_offer_via_reverse_signal(session_token, machine, sdp, codec_hint)
+            answer = self._forward_offer_via_reverse_signal(session_token, machine, sdp, codec_hint, session_id)
             if answer is not None:
                 return answer
 
@@ -513,7 +424,7 @@ class RDPOfferView(View):
         }
         last_error = None
         connect_timeout = float(getattr(settings, "AGENT_DIRECT_CONNECT_TIMEOUT", 1.0))
-        for ip in _ordered_ip_candidates(machine, "rdp"):
+        for ip in ranked_ips(machine, WEBRTC_PORT):
             try:
                 response = req_lib.post(
                     f"http://{ip}:{WEBRTC_PORT}/webrtc/offer",
@@ -525,13 +436,14 @@ class RDPOfferView(View):
                 answer = response.json()
                 if "sdp" not in answer or answer.get("type") != "answer":
                     raise ValueError("Resposta inválida do agente")
-                _remember_best_ip(machine, "rdp", ip)
+                record_route(machine, ip, WEBRTC_PORT, ok=True)
                 return answer
             except (req_lib.exceptions.ConnectionError, req_lib.exceptions.Timeout) as exc:
+                record_route(machine, ip, WEBRTC_PORT, ok=False)
                 last_error = exc
                 continue
         if ENABLE_REVERSE_SIGNAL and has_best_direct_ip:
-            answer = self._forward_offer_via_reverse_signal(session_token, machine, sdp, codec_hint)
+            answer = self._forward_offer_via_reverse_signal(session_token, machine, sdp, codec_hint, session_id)
             if answer is not None:
                 return answer
         raise req_lib.exceptions.ConnectionError("Agente inacessível nos IPs candidatos") from last_error
@@ -542,14 +454,17 @@ class RDPOfferView(View):
         machine: Machine,
         sdp: str,
         codec_hint: str,
+        session_id: str = "",
     ) -> dict | None:
-        offer_key = _signal_offer_key(machine.hostname)
-        if cache.get(offer_key):
-            return None
-
-        request_id = secrets.token_hex(12)
+        session_id = session_id or new_session_id()
         payload = {
-            "request_id": request_id,
+            # request_id mantido para agentes que ainda não leem session_id
+            "request_id": session_id,
+            "session_id": session_id,
+            # credencial presa a esta sessão para o agente postar a answer
+            "credential": issue_signal_credential(
+                machine.hostname, session_token.agent_token, session_id, ttl=SIGNAL_WAIT_TIMEOUT + 5,
+            )[0],
             "machine": machine.hostname,
             "sdp": sdp,
             "type": "offer",
@@ -558,21 +473,15 @@ class RDPOfferView(View):
             "quality": session_token.requested_quality,
             "created_at": int(time.time()),
         }
-        cache.set(offer_key, payload, timeout=SIGNAL_WAIT_TIMEOUT + 5)
-        answer_key = _signal_answer_key(request_id)
-        started = time.time()
-        try:
-            while time.time() - started < SIGNAL_WAIT_TIMEOUT:
-                answer = cache.get(answer_key)
-                if answer:
-                    cache.delete(answer_key)
-                    if "sdp" not in answer or answer.get("type") != "answer":
-                        raise ValueError("Resposta inválida do agente (signal)")
-                    return answer
-                time.sleep(0.2)
-        finally:
-            cache.delete(offer_key)
-        return None
+        bus = get_signal_bus()
+        bus.publish(offer_channel(machine.hostname), payload, ttl=SIGNAL_WAIT_TIMEOUT)
+        push_to_agent(machine.hostname, EVENT_RDP_OFFER)
+        answer = bus.pop(answer_channel(session_id), timeout=SIGNAL_WAIT_TIMEOUT)
+        if answer is None:
+            return None
+        if "sdp" not in answer or answer.get("type") != "answer":
+            raise ValueError("Resposta inválida do agente (signal)")
+        return answer
 
 
 @method_decorator(login_required, name="dispatch")
@@ -644,7 +553,7 @@ class RDPCloseView(View):
         if not st:
             return JsonResponse({"error": "Token de sessão inválido"}, status=403)
 
-        closed = _close_session(request.user.pk, machine.hostname, session_id or None)
+        closed = close_sessions(request.user.pk, machine.hostname, session_id or None)
         for closed_item in closed:
             _audit(
                 RDPSessionAudit.EVENT_SESSION_CLOSED,
@@ -663,18 +572,16 @@ class RDPSessionsView(View):
     def get(self, request):
         now = int(time.time())
         sessions = []
-        for sid in _list_user_session_ids(request.user.pk):
-            data = cache.get(_active_session_key(sid))
-            if not data:
-                continue
+        for session in user_sessions(request.user.pk).select_related("machine"):
+            started = int(session.started_at.timestamp())
             sessions.append(
                 {
-                    "id": sid[:8] + "…",
-                    "machine": data.get("machine", "-"),
-                    "started": int(data.get("started", now)),
-                    "elapsed": max(0, now - int(data.get("started", now))),
-                    "mode": data.get("mode", RDPMachinePolicy.MODE_AUTO),
-                    "quality": data.get("quality", RDPMachinePolicy.QUALITY_AUTO),
+                    "id": session.session_id[:8] + "…",
+                    "machine": session.machine.hostname,
+                    "started": started,
+                    "elapsed": max(0, now - started),
+                    "mode": session.connection_mode,
+                    "quality": session.quality,
                 }
             )
         return JsonResponse({"sessions": sessions, "max": MAX_SESSIONS})
@@ -744,8 +651,63 @@ class RDPConfigView(View):
         return resp
 
 
+def _signal_param(request, name: str):
+    """Parâmetro do agente via querystring ou body JSON (``?wait=`` / ``{"wait": n}``)."""
+    raw = request.GET.get(name)
+    if raw is None:
+        try:
+            raw = json.loads(request.body.decode("utf-8") or "{}").get(name)
+        except (ValueError, AttributeError):
+            raw = None
+    return raw
+
+
+def _signal_wait_seconds(request) -> float:
+    try:
+        return max(0.0, min(float(_signal_param(request, "wait") or 0), float(SIGNAL_LONGPOLL_MAX)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _signal_max_offers(request) -> int:
+    try:
+        return max(1, min(int(_signal_param(request, "max") or 1), SIGNAL_MAX_OFFERS_PER_PULL))
+    except (TypeError, ValueError):
+        return 1
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class RDPAgentSignalCredentialView(View):
+    """
+    Troca o Bearer do agente (validado no banco) por uma credencial de
+    sinalização assinada, usada como ``Authorization: Signal <credencial>``
+    nos polls seguintes até expirar.
+    """
+
+    def post(self, request):
+        machine_name = request.META.get("HTTP_X_MACHINE_NAME", "").strip()
+        if not machine_name:
+            return JsonResponse({"error": "X-Machine-Name obrigatório"}, status=400)
+        agent_token = _agent_token_from_bearer(request, machine_name)
+        if not agent_token:
+            return JsonResponse({"error": "Não autorizado"}, status=401)
+        credential, expires_in = issue_signal_credential(machine_name, agent_token)
+        resp = JsonResponse({"credential": credential, "expires_in": expires_in})
+        resp["Cache-Control"] = "no-store"
+        return resp
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class RDPAgentSignalPullView(View):
+    """
+    Entrega as offers pendentes da máquina.
+
+    Com ``wait`` > 0 a requisição fica aberta (long-poll) até chegar uma
+    offer ou o tempo acabar; sem ``wait`` responde na hora. Com ``max`` > 1
+    o agente recebe em ``offers`` todas as pendentes (até o limite) de uma
+    vez; ``offer`` continua trazendo a primeira para agentes antigos.
+    """
+
     def post(self, request):
         machine_name = request.META.get("HTTP_X_MACHINE_NAME", "").strip()
         if not machine_name:
@@ -753,32 +715,58 @@ class RDPAgentSignalPullView(View):
         if not _validate_agent_signal_auth(request, machine_name):
             return JsonResponse({"error": "Não autorizado"}, status=401)
 
-        offer_key = _signal_offer_key(machine_name)
-        offer = cache.get(offer_key)
-        if not offer:
-            return JsonResponse({"ok": True, "has_offer": False})
-
-        cache.delete(offer_key)
-        return JsonResponse({"ok": True, "has_offer": True, "offer": offer})
+        offers = get_signal_bus().drain(
+            offer_channel(machine_name),
+            timeout=_signal_wait_seconds(request),
+            limit=_signal_max_offers(request),
+        )
+        if not offers:
+            return JsonResponse({"ok": True, "has_offer": False, "offers": []})
+        return JsonResponse({"ok": True, "has_offer": True, "offer": offers[0], "offers": offers})
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class RDPAgentSignalAnswerView(View):
+    """
+    Recebe answers do agente, uma (``request_id`` + ``answer``) ou várias
+    (``answers``: [{"session_id"|"request_id", "answer"}]), entregues por
+    sessão.
+
+    Sem autenticação da máquina no header, cada answer precisa trazer a
+    ``credential`` da sua sessão (enviada junto com a offer).
+    """
+
     def post(self, request):
         machine_name = request.META.get("HTTP_X_MACHINE_NAME", "").strip()
         if not machine_name:
             return JsonResponse({"error": "X-Machine-Name obrigatório"}, status=400)
-        if not _validate_agent_signal_auth(request, machine_name):
-            return JsonResponse({"error": "Não autorizado"}, status=401)
+        machine_auth = _validate_agent_signal_auth(request, machine_name)
 
         try:
             body = json.loads(request.body.decode("utf-8") or "{}")
         except (ValueError, json.JSONDecodeError):
             return JsonResponse({"error": "Body inválido"}, status=400)
 
-        request_id = str(body.get("request_id", "")).strip()
-        answer = body.get("answer")
-        if not request_id or not isinstance(answer, dict):
+        items = body.get("answers") if isinstance(body.get("answers"), list) else [body]
+        answers = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            session_id = str(item.get("session_id") or item.get("request_id") or "").strip()
+            answer = item.get("answer")
+            if not session_id or not isinstance(answer, dict):
+                continue
+            if not machine_auth and not verify_signal_credential(
+                str(item.get("credential") or ""), machine_name, session_id,
+            ):
+                continue
+            answers.append((session_id, answer))
+        if not answers and not machine_auth:
+            return JsonResponse({"error": "Não autorizado"}, status=401)
+        if not answers:
             return JsonResponse({"error": "request_id/answer obrigatórios"}, status=400)
-        cache.set(_signal_answer_key(request_id), answer, timeout=SIGNAL_WAIT_TIMEOUT + 5)
-        return JsonResponse({"ok": True})
+
+        bus = get_signal_bus()
+        for session_id, answer in answers:
+            bus.publish(answer_channel(session_id), answer, ttl=SIGNAL_WAIT_TIMEOUT + 5)
+        return JsonResponse({"ok": True, "delivered": len(answers)})
@@ -2,8 +2,9 @@ from django.contrib import admin
 from .models import (
     Categoria, Urgencia, CategoriaUrgencia, Status, Justificativa, Servico,
     ContratoSLA, RegraSLA, CampoAdicional, RegraExibicaoCampo,
-    Ticket, AcaoTicket, AnexoTicket, HistoricoTicket,
-    Gatilho, Macro, PesquisaSatisfacao
+    Ticket, AcaoTicket, AnexoTicket, ArquivoAnexo, HistoricoTicket,
+    Gatilho, Macro, PesquisaSatisfacao, CargaAgente,
+    TicketArquivado, AcaoTicketArquivada, AnexoTicketArquivado, HistoricoTicketArquivado,
 )
 
 
@@ -183,9 +184,17 @@ class AcaoTicketAdmin(admin.ModelAdmin):
 class AnexoTicketAdmin(admin.ModelAdmin):
     list_display = ['ticket', 'nome_original', 'tamanho', 'tipo_mime', 'autor', 'criado_em']
     list_filter = ['tipo_mime', 'criado_em']
-    search_fields = ['ticket__numero', 'nome_original']
+    search_fields = ['ticket__numero', 'nome_original', 'blob__sha256']
     date_hierarchy = 'criado_em'
-    readonly_fields = ['tamanho', 'criado_em']
+    readonly_fields = ['tamanho', 'blob', 'criado_em']
+
+
+@admin.register(ArquivoAnexo)
+class ArquivoAnexoAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'tamanho', 'tipo_mime', 'referencias', 'criado_em']
+    search_fields = ['sha256']
+    date_hierarchy = 'criado_em'
+    readonly_fields = ['sha256', 'arquivo', 'tamanho', 'tipo_mime', 'referencias', 'criado_em']
 
 
 @admin.register(HistoricoTicket)
@@ -197,6 +206,47 @@ class HistoricoTicketAdmin(admin.ModelAdmin):
     readonly_fields = ['criado_em']
 
 
+# ==================== ARQUIVO ====================
+
+class AcaoTicketArquivadaInline(admin.TabularInline):
+    model = AcaoTicketArquivada
+    extra = 0
+    can_delete = False
+    fields = ['tipo', 'autor_nome', 'conteudo', 'criado_em']
+    readonly_fields = fields
+
+
+class HistoricoTicketArquivadoInline(admin.TabularInline):
+    model = HistoricoTicketArquivado
+    extra = 0
+    can_delete = False
+    fields = ['campo', 'valor_anterior', 'valor_novo', 'usuario_nome', 'criado_em']
+    readonly_fields = fields
+
+
+class AnexoTicketArquivadoInline(admin.TabularInline):
+    model = AnexoTicketArquivado
+    extra = 0
+    can_delete = False
+    fields = ['nome_original', 'tamanho', 'autor_nome', 'criado_em']
+    readonly_fields = fields
+
+
+@admin.register(TicketArquivado)
+class TicketArquivadoAdmin(admin.ModelAdmin):
+    list_display = ['numero', 'assunto', 'solicitante_nome', 'status_nome', 'cliente', 'fechado_em', 'arquivado_em']
+    list_filter = ['status_base', 'arquivado_em']
+    search_fields = ['numero', 'assunto', 'solicitante_nome', 'solicitante_email']
+    date_hierarchy = 'fechado_em'
+    inlines = [AcaoTicketArquivadaInline, AnexoTicketArquivadoInline, HistoricoTicketArquivadoInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # ==================== AUTOMAÇÕES ====================
 
 @admin.register(Gatilho)
@@ -222,4 +272,14 @@ class PesquisaSatisfacaoAdmin(admin.ModelAdmin):
     list_filter = ['nota', 'enviada_em', 'respondida_em']
     search_fields = ['ticket__numero', 'comentario']
     date_hierarchy = 'enviada_em'
-    readonly_fields = ['enviada_em']
\ No newline at end of file
+    readonly_fields = ['enviada_em']
+
+
+# ==================== DISTRIBUIÇÃO ====================
+
+@admin.register(CargaAgente)
+class CargaAgenteAdmin(admin.ModelAdmin):
+    list_display = ['agente', 'tickets_abertos', 'atualizado_em']
+    search_fields = ['agente__username', 'agente__first_name', 'agente__last_name']
+    ordering = ['-tickets_abertos']
+    readonly_fields = ['agente', 'tickets_abertos', 'atualizado_em']
@@ -0,0 +1,110 @@
+"""
+Sincronização incremental dos tickets no agente desktop.
+
+O agente atualiza "meus chamados" periodicamente e AgentTicketListAPIView /
+AgentTicketDetailAPIView devolviam sempre a lista (até 50 tickets com
+status e serviço) e o detalhe com todas as ações públicas. Aqui cada
+resposta leva um ETag e um cursor:
+
+- lista: a janela (ids + ``atualizado_em`` dos 50 mais recentes) sai de uma
+  consulta só, e o corte pelo cursor é feito em Python sobre essas 50
+  linhas — não há índice próprio para ``atualizado_em``. Se o ETag
+  bate com o If-None-Match a resposta é 304; com ``updated_since`` só os
+  tickets alterados desde o cursor são montados, junto com ``ids`` da
+  janela para o agente descartar os que saíram (arquivados, excluídos);
+- detalhe: ETag a partir do ticket e do maior id/contagem de ações
+  públicas; com ``acoes_apos=<id>`` só as ações novas são devolvidas.
+
+Sem esses parâmetros as respostas continuam completas, como antes.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.dateparse import parse_datetime
+
+AGENT_LIST_LIMIT = 50
+
+
+def make_etag(*parts) -> str:
+    raw = "|".join(str(part) for part in parts)
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(request, etag: str) -> bool:
+    """True se o cliente já tem essa versão (If-None-Match ou ?etag=)."""
+    enviado = request.META.get("HTTP_IF_NONE_MATCH", "") or request.GET.get("etag", "")
+    candidatos = {valor.strip().removeprefix("W/").strip('"') for valor in enviado.split(",")}
+    return etag.strip('"') in candidatos or "*" in candidatos
+
+
+def parse_cursor(valor: str):
+    """
+    Converte ``updated_since`` (ISO 8601, o ``cursor`` da resposta anterior).
+    Retorna None se ausente; levanta ValueError se inválido.
+    """
+    if not valor:
+        return None
+    cursor = parse_datetime(valor)
+    if cursor is None:
+        raise ValueError(valor)
+    return cursor
+
+
+# ============================================================================
+# LISTA
+# ============================================================================
+
+def janela(queryset, limit: int = AGENT_LIST_LIMIT) -> list:
+    """[(id, atualizado_em), ...] dos tickets mais recentes — uma consulta."""
+    return list(queryset.order_by("-criado_em").values_list("pk", "atualizado_em").distinct()[:limit])
+
+
+def versao_janela(linhas) -> tuple:
+    """(etag, cursor) da janela: muda quando um ticket entra, sai ou é alterado."""
+    cursor = max((atualizado_em for _, atualizado_em in linhas), default=None)
+    etag = make_etag(",".join(str(pk) for pk, _ in linhas), cursor.isoformat() if cursor else "")
+    return etag, cursor
+
+
+def alterados(linhas, desde) -> list:
+    """Ids da janela alterados a partir do cursor (inclusive — o agente deduplica pelo id)."""
+    if desde is None:
+        return [pk for pk, _ in linhas]
+    return [pk for pk, atualizado_em in linhas if atualizado_em >= desde]
+
+
+def ticket_resumo(ticket) -> dict:
+    return {
+        "id": ticket.pk,
+        "numero": ticket.numero,
+        "assunto": ticket.assunto,
+        "status": ticket.status.nome,
+        "status_cor": ticket.status.cor,
+        "servico": ticket.servico.nome if ticket.servico else "",
+        "criado_em": ticket.criado_em.strftime("%d/%m/%Y %H:%M"),
+        "atualizado_em": ticket.atualizado_em.isoformat(),
+    }
+
+
+# ============================================================================
+# DETALHE
+# ============================================================================
+
+def versao_detalhe(ticket, acoes) -> tuple:
+    """(etag, ultima_acao_id) do ticket e das suas ações públicas — uma consulta."""
+    resumo = acoes.aggregate(ultima=Max("pk"), total=Count("pk"))
+    etag = make_etag(
+        ticket.pk, ticket.atualizado_em.isoformat(), ticket.status_id, ticket.status.nome,
+        resumo["ultima"], resumo["total"],
+    )
+    return etag, resumo["ultima"] or 0
+
+
+def acao_publica(acao) -> dict:
+    return {
+        "id": acao.pk,
+        "autor": acao.autor.get_full_name() or acao.autor.username,
+        "is_staff": acao.autor.is_staff,
+        "conteudo": acao.conteudo,
+        "criado_em": acao.criado_em.strftime("%d/%m/%Y %H:%M"),
+    }
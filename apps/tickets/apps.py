@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.tickets'
+
+    def ready(self):
+        from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+        from apps.tickets.attachments import liberar_blob
+        from apps.tickets.models import RegraSLA
+        from apps.tickets.sla_index import condicoes_alteradas, contrato_removido, regra_alterada, regra_salvando
+        post_delete.connect(liberar_blob, sender='tickets.AnexoTicket')
+        post_delete.connect(liberar_blob, sender='tickets.AnexoTicketArquivado')
+
+        # Índice de regras de SLA: descarta o contrato alterado
+        pre_save.connect(regra_salvando, sender=RegraSLA)
+        post_save.connect(regra_alterada, sender=RegraSLA)
+        post_delete.connect(regra_alterada, sender=RegraSLA)
+        post_delete.connect(contrato_removido, sender='tickets.ContratoSLA')
+        for m2m in (RegraSLA.categorias, RegraSLA.urgencias, RegraSLA.servicos):
+            m2m_changed.connect(condicoes_alteradas, sender=m2m.through)
@@ -0,0 +1,210 @@
+"""
+Arquivamento de tickets encerrados.
+
+Tickets, ações, anexos e histórico ficavam para sempre nas tabelas
+principais, então listagens, contagens, relatórios e varreduras de gatilho
+pagavam por anos de tickets fechados. Aqui tickets fechados (ou
+cancelados) há mais de ``TICKET_ARCHIVE_AFTER_DAYS`` dias são copiados
+para TicketArquivado / AcaoTicketArquivada / AnexoTicketArquivado /
+HistoricoTicketArquivado e removidos das tabelas principais:
+
+- ``arquivar_tickets`` processa em lotes de ``TICKET_ARCHIVE_BATCH_SIZE``,
+  uma transação por lote — um lote com erro não desfaz os anteriores e
+  nenhum lock fica aberto por muito tempo;
+- as cópias usam ``bulk_create`` (4 INSERTs por lote) e guardam nomes em
+  texto no lugar das FKs de classificação/usuário;
+- anexos continuam apontando para o mesmo arquivo; os deduplicados ganham
+  uma referência no ArquivoAnexo antes de o anexo original ser apagado
+  (o post_delete devolve a dele), então o arquivo nunca fica órfão.
+
+Tickets que ainda são pai de tickets abertos ficam para um lote futuro.
+Roda diariamente via Celery Beat (``tickets.arquivar_tickets``) ou pelo
+comando ``arquivar_tickets``. As telas de consulta ficam em
+TicketArquivadoListView / TicketArquivadoDetailView.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    AcaoTicket, AcaoTicketArquivada, AnexoTicket, AnexoTicketArquivado,
+    ArquivoAnexo, HistoricoTicket, HistoricoTicketArquivado, StatusBase, Ticket,
+    TicketArquivado,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = getattr(settings, "TICKET_ARCHIVE_AFTER_DAYS", 365)
+ARCHIVE_BATCH_SIZE = getattr(settings, "TICKET_ARCHIVE_BATCH_SIZE", 200)
+
+
+def _nome(user) -> str:
+    if user is None:
+        return ""
+    return user.get_full_name() or user.username
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def tickets_arquivaveis(dias: int = ARCHIVE_AFTER_DAYS):
+    """Tickets fechados/cancelados há mais de ``dias`` dias e sem filhos abertos."""
+    limite = timezone.now() - timedelta(days=dias)
+    return Ticket.objects.filter(
+        Q(status__status_base=StatusBase.FECHADO, fechado_em__lt=limite)
+        | Q(status__status_base=StatusBase.CANCELADO, cancelado_em__lt=limite)
+    ).exclude(
+        tickets_filhos__in=Ticket.objects.exclude(
+            status__status_base__in=[StatusBase.FECHADO, StatusBase.CANCELADO]
+        )
+    )
+
+
+def _ticket_arquivado(ticket) -> TicketArquivado:
+    pesquisa = getattr(ticket, "pesquisa_satisfacao", None)
+    return TicketArquivado(
+        ticket_original_id=ticket.pk,
+        numero=ticket.numero,
+        cliente_id=ticket.cliente_id,
+        assunto=ticket.assunto,
+        descricao=ticket.descricao,
+        solicitante_nome=_nome(ticket.solicitante),
+        solicitante_email=ticket.solicitante.email or "",
+        responsavel_nome=_nome(ticket.responsavel),
+        status_nome=ticket.status.nome,
+        status_base=ticket.status.status_base,
+        categoria_nome=ticket.categoria.nome if ticket.categoria else "",
+        urgencia_nome=ticket.urgencia.nome if ticket.urgencia else "",
+        servico_nome=ticket.servico.nome if ticket.servico else "",
+        tipo_ticket=ticket.tipo_ticket,
+        canal_abertura=ticket.canal_abertura,
+        dados={
+            "contrato_sla": str(ticket.contrato_sla) if ticket.contrato_sla else None,
+            "regra_sla": str(ticket.regra_sla_aplicada) if ticket.regra_sla_aplicada else None,
+            "previsao_solucao": _iso(ticket.previsao_solucao),
+            "primeira_resposta_em": _iso(ticket.primeira_resposta_em),
+            "cancelado_em": _iso(ticket.cancelado_em),
+            "tempo_pausado_segundos": int(ticket.tempo_pausado.total_seconds()) if ticket.tempo_pausado else 0,
+            "justificativa": ticket.justificativa.nome if ticket.justificativa else None,
+            "ticket_pai": ticket.ticket_pai.numero if ticket.ticket_pai else None,
+            "machine": ticket.machine.hostname if ticket.machine else None,
+            "ativos": [str(ativo) for ativo in ticket.ativos.all()],
+            "tags": ticket.tags or [],
+            "cc": ticket.cc or [],
+            "pesquisa_satisfacao": {
+                "nota": pesquisa.nota,
+                "comentario": pesquisa.comentario,
+                "respondida_em": _iso(pesquisa.respondida_em),
+            } if pesquisa else None,
+        },
+        criado_em=ticket.criado_em,
+        resolvido_em=ticket.resolvido_em,
+        fechado_em=ticket.fechado_em or ticket.cancelado_em,
+    )
+
+
+def arquivar_lote(ticket_ids, dias: int = ARCHIVE_AFTER_DAYS) -> int:
+    """
+    Copia os tickets ``ticket_ids`` para o arquivo e os remove. Retorna quantos.
+
+    O critério de ``tickets_arquivaveis`` é aplicado de novo sob o lock: um
+    ticket reaberto (ou que ganhou filho aberto) entre a seleção dos ids e o
+    lote fica de fora.
+    """
+    with transaction.atomic():
+        tickets = list(
+            tickets_arquivaveis(dias).select_for_update(of=("self",)).filter(pk__in=ticket_ids)
+            .select_related(
+                "solicitante", "responsavel", "status", "categoria", "urgencia", "servico",
+                "justificativa", "contrato_sla", "regra_sla_aplicada", "ticket_pai", "machine",
+                "pesquisa_satisfacao",
+            ).prefetch_related("ativos")
+        )
+        if not tickets:
+            return 0
+        ids = [ticket.pk for ticket in tickets]
+
+        arquivados = TicketArquivado.objects.bulk_create([_ticket_arquivado(t) for t in tickets])
+        por_ticket = {a.ticket_original_id: a for a in arquivados}
+
+        acoes = list(AcaoTicket.objects.filter(ticket_id__in=ids).select_related("autor").order_by("pk"))
+        acoes_arquivadas = AcaoTicketArquivada.objects.bulk_create([
+            AcaoTicketArquivada(
+                ticket=por_ticket[acao.ticket_id],
+                tipo=acao.tipo,
+                autor_nome=_nome(acao.autor),
+                conteudo=acao.conteudo,
+                conteudo_html=acao.conteudo_html,
+                tempo_trabalhado=acao.tempo_trabalhado,
+                criado_em=acao.criado_em,
+            )
+            for acao in acoes
+        ])
+        por_acao = {acao.pk: arquivada for acao, arquivada in zip(acoes, acoes_arquivadas)}
+
+        anexos = list(AnexoTicket.objects.filter(ticket_id__in=ids).select_related("autor"))
+        AnexoTicketArquivado.objects.bulk_create([
+            AnexoTicketArquivado(
+                ticket=por_ticket[anexo.ticket_id],
+                acao=por_acao.get(anexo.acao_id),
+                blob_id=anexo.blob_id,
+                arquivo=anexo.arquivo.name,
+                nome_original=anexo.nome_original,
+                tamanho=anexo.tamanho,
+                tipo_mime=anexo.tipo_mime,
+                autor_nome=_nome(anexo.autor),
+                criado_em=anexo.criado_em,
+            )
+            for anexo in anexos
+        ])
+        # A cópia arquivada passa a ser dona de uma referência do blob
+        for blob_id, total in Counter(a.blob_id for a in anexos if a.blob_id).items():
+            ArquivoAnexo.objects.filter(pk=blob_id).update(referencias=F("referencias") + total)
+
+        HistoricoTicketArquivado.objects.bulk_create([
+            HistoricoTicketArquivado(
+                ticket=por_ticket[h.ticket_id],
+                usuario_nome=_nome(h.usuario),
+                campo=h.campo,
+                valor_anterior=h.valor_anterior,
+                valor_novo=h.valor_novo,
+                criado_em=h.criado_em,
+            )
+            for h in HistoricoTicket.objects.filter(ticket_id__in=ids).select_related("usuario")
+        ])
+
+        Ticket.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def arquivar_tickets(dias: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                     max_lotes: int | None = None) -> dict:
+    """
+    Arquiva, em lotes, os tickets encerrados há mais de ``dias`` dias.
+
+    Returns:
+        {"arquivados": n, "lotes": k}
+    """
+    total = lotes = 0
+    candidatos = tickets_arquivaveis(dias).order_by("pk")
+    ultimo_pk = 0
+    while max_lotes is None or lotes < max_lotes:
+        ids = list(
+            candidatos.filter(pk__gt=ultimo_pk).values_list("pk", flat=True).distinct()[:batch_size]
+        )
+        if not ids:
+            break
+        total += arquivar_lote(ids, dias)
+        lotes += 1
+        ultimo_pk = ids[-1]
+        if len(ids) < batch_size:
+            break
+    if total:
+        logger.info("Arquivo de tickets | %d tickets arquivados em %d lote(s)", total, lotes)
+    return {"arquivados": total, "lotes": lotes}
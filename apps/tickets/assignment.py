@@ -0,0 +1,139 @@
+"""
+Distribuição automática de tickets entre os agentes de uma equipe.
+
+``Equipe.agente_com_menor_carga`` contava, a cada ticket distribuído, todos
+os tickets abertos de cada agente da equipe (JOIN + COUNT sobre a tabela de
+tickets inteira). Aqui a carga de cada agente fica em CargaAgente:
+
+- ``registrar_transicao`` (chamado por Ticket.save) ajusta os contadores
+  com ``F()`` quando o responsável muda ou o ticket entra/sai de um status
+  aberto — na mesma transação do ticket;
+- ``agente_menor_carga`` lê os contadores com um JOIN 1:1, sem agregação;
+- ``agente_rodizio`` usa ``Equipe.ultimo_agente`` como ponteiro do rodízio,
+  travando a linha da equipe para que distribuições simultâneas não
+  escolham o mesmo agente;
+- ``ressincronizar_cargas`` recalcula tudo com uma agregação e corrige
+  desvios (``QuerySet.update`` em massa, tickets excluídos etc.). Roda
+  via Celery Beat (``tickets.ressincronizar_cargas``).
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CargaAgente, Equipe, EstrategiaDistribuicao, StatusBase, Ticket
+
+logger = logging.getLogger(__name__)
+
+STATUS_ABERTOS = (StatusBase.NOVO, StatusBase.EM_ATENDIMENTO, StatusBase.PARADO)
+
+
+# ============================================================================
+# CONTADORES
+# ============================================================================
+
+def ajustar_carga(agente_id: int, delta: int) -> None:
+    """Soma ``delta`` à carga do agente (nunca abaixo de zero)."""
+    if not agente_id or not delta:
+        return
+    atualizados = CargaAgente.objects.filter(agente_id=agente_id).update(
+        tickets_abertos=Greatest(F("tickets_abertos") + delta, Value(0)),
+        atualizado_em=timezone.now(),
+    )
+    if atualizados or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            CargaAgente.objects.create(agente_id=agente_id, tickets_abertos=delta)
+    except IntegrityError:
+        # Criado por outra transação entre o update e o create
+        ajustar_carga(agente_id, delta)
+
+
+def registrar_transicao(responsavel_anterior, aberto_anterior: bool, responsavel_novo, aberto_novo: bool) -> None:
+    """Atualiza os contadores para uma mudança de responsável e/ou status do ticket."""
+    antes = responsavel_anterior if aberto_anterior else None
+    depois = responsavel_novo if aberto_novo else None
+    if antes == depois:
+        return
+    ajustar_carga(antes, -1)
+    ajustar_carga(depois, 1)
+
+
+def ressincronizar_cargas() -> int:
+    """
+    Recalcula a carga de todos os agentes a partir dos tickets abertos.
+    Retorna quantos contadores estavam errados.
+    """
+    reais = dict(
+        Ticket.objects.filter(responsavel__isnull=False, status__status_base__in=STATUS_ABERTOS)
+        .values_list("responsavel").annotate(total=Count("pk")).order_by()
+    )
+    agora = timezone.now()
+    corrigidos = 0
+    with transaction.atomic():
+        atuais = dict(CargaAgente.objects.select_for_update().values_list("agente_id", "tickets_abertos"))
+        divergentes = [
+            CargaAgente(agente_id=agente_id, tickets_abertos=total, atualizado_em=agora)
+            for agente_id, total in reais.items()
+            if atuais.get(agente_id) != total
+        ]
+        if divergentes:
+            CargaAgente.objects.bulk_create(
+                divergentes,
+                update_conflicts=True,
+                unique_fields=["agente"],
+                update_fields=["tickets_abertos", "atualizado_em"],
+            )
+        zerados = CargaAgente.objects.exclude(agente_id__in=reais).exclude(tickets_abertos=0).update(
+            tickets_abertos=0, atualizado_em=agora,
+        )
+        corrigidos = len(divergentes) + zerados
+    if corrigidos:
+        logger.warning("Carga dos agentes | %d contador(es) corrigido(s) na ressincronização", corrigidos)
+    return corrigidos
+
+
+# ============================================================================
+# ESTRATÉGIAS
+# ============================================================================
+
+def _agentes_ativos(equipe: Equipe):
+    return equipe.agentes.filter(is_active=True)
+
+
+def agente_menor_carga(equipe: Equipe):
+    """Agente ativo da equipe com menos tickets abertos (desempate pelo id)."""
+    return (
+        _agentes_ativos(equipe)
+        .annotate(carga=Coalesce("carga_tickets__tickets_abertos", Value(0)))
+        .order_by("carga", "pk")
+        .first()
+    )
+
+
+def agente_rodizio(equipe: Equipe):
+    """Próximo agente ativo depois de ``equipe.ultimo_agente`` (em ordem de id)."""
+    with transaction.atomic():
+        ultimo_id = (
+            Equipe.objects.select_for_update().filter(pk=equipe.pk)
+            .values_list("ultimo_agente_id", flat=True).first()
+        )
+        agentes = _agentes_ativos(equipe).order_by("pk")
+        agente = None
+        if ultimo_id:
+            agente = agentes.filter(pk__gt=ultimo_id).first()
+        agente = agente or agentes.first()
+        if agente:
+            Equipe.objects.filter(pk=equipe.pk).update(ultimo_agente=agente)
+            equipe.ultimo_agente = agente
+    return agente
+
+
+def escolher_agente(equipe: Equipe):
+    """Agente que recebe o próximo ticket da equipe (ou None se não houver)."""
+    if equipe.estrategia_distribuicao == EstrategiaDistribuicao.RODIZIO:
+        return agente_rodizio(equipe)
+    return agente_menor_carga(equipe)
@@ -0,0 +1,212 @@
+"""
+Armazenamento deduplicado dos anexos de ticket.
+
+Cada AnexoTicket gravava o próprio arquivo, então a mesma assinatura de
+e-mail, logo ou planilha encaminhada de novo ocupava disco (e I/O) a cada
+mensagem. Aqui o conteúdo vira um ArquivoAnexo identificado pelo SHA-256:
+
+- ``store_blob`` calcula o hash lendo o arquivo em blocos (``chunks()``) —
+  uploads acima de FILE_UPLOAD_MAX_MEMORY_SIZE já chegam em arquivo
+  temporário, então nada é carregado inteiro em memória; se o hash já
+  existe só incrementa ``referencias``, senão grava o arquivo uma vez
+  (o FileSystemStorage move o temporário em vez de copiar). A gravação
+  sempre deixa o storage escolher um nome livre — nunca reaproveita um
+  arquivo que ``_release`` pode estar removendo — e quem perde a corrida
+  pelo mesmo hash apaga o próprio arquivo;
+- ``criar_anexo`` cria o AnexoTicket apontando para o blob; o campo
+  ``arquivo`` recebe o mesmo nome do blob, então templates e downloads
+  continuam usando ``anexo.arquivo.url``;
+- ``liberar_blob`` (post_delete de AnexoTicket) decrementa a contagem
+  depois do commit e remove blob e arquivo quando ninguém mais os usa;
+- se a transação de ``criar_anexo`` falha, o arquivo gravado para o blob
+  novo é apagado. O Django não tem gancho de rollback para transações
+  externas, então o que sobrar de um rollback do chamador é recolhido por
+  ``limpar_blobs_orfaos`` (comando e task ``tickets.limpar_blobs_orfaos``).
+
+Anexos anteriores são migrados pelo comando ``deduplicar_anexos``.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AnexoTicket, ArquivoAnexo
+
+logger = logging.getLogger(__name__)
+
+BLOB_UPLOAD_TO = "tickets/blobs"
+ORPHAN_MIN_AGE = timedelta(hours=1)
+
+
+def blob_name(digest: str, nome_original: str = "") -> str:
+    """Caminho do blob no storage: tickets/blobs/ab/cd/<sha256><ext>."""
+    ext = os.path.splitext(nome_original)[1].lower()[:10]
+    return f"{BLOB_UPLOAD_TO}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def hash_content(content) -> tuple[str, int]:
+    """SHA-256 e tamanho de um File/UploadedFile, lendo em blocos."""
+    digest, size = hashlib.sha256(), 0
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return digest.hexdigest(), size
+
+
+def _add_reference(digest: str):
+    updated = ArquivoAnexo.objects.filter(sha256=digest).update(referencias=F("referencias") + 1)
+    return ArquivoAnexo.objects.get(sha256=digest) if updated else None
+
+
+def _discard(name: str) -> None:
+    try:
+        default_storage.delete(name)
+    except OSError as e:
+        logger.warning(f"Falha ao remover blob {name}: {e}")
+
+
+def store_blob(content, nome_original: str = "", tipo_mime: str = "", escritos=None) -> ArquivoAnexo:
+    """
+    Retorna o ArquivoAnexo do conteúdo, já com a nova referência contada.
+
+    ``content`` é um File (UploadedFile, ContentFile, arquivo do storage).
+    Se um arquivo novo for gravado, o nome é acrescentado a ``escritos``
+    para o chamador apagá-lo caso a transação dele falhe.
+    """
+    digest, size = hash_content(content)
+
+    blob = _add_reference(digest)
+    if blob:
+        return blob
+
+    name = default_storage.save(blob_name(digest, nome_original), content)
+    try:
+        with transaction.atomic():
+            blob = ArquivoAnexo.objects.create(
+                sha256=digest, arquivo=name, tamanho=size,
+                tipo_mime=(tipo_mime or "")[:100], referencias=1,
+            )
+    except IntegrityError:
+        # Outro processo gravou o mesmo conteúdo entre a checagem e o create
+        _discard(name)
+        return _add_reference(digest)
+    except Exception:
+        _discard(name)
+        raise
+    if escritos is not None:
+        escritos.append(name)
+    return blob
+
+
+def criar_anexo(ticket, content, autor, nome_original: str = "", tipo_mime: str = "", acao=None) -> AnexoTicket:
+    """Cria um AnexoTicket para ``content`` reaproveitando o blob se já existir."""
+    nome_original = nome_original or os.path.basename(getattr(content, "name", "") or "") or "anexo"
+    tipo_mime = tipo_mime or getattr(content, "content_type", "") or "application/octet-stream"
+    escritos = []
+    try:
+        with transaction.atomic():
+            blob = store_blob(content, nome_original, tipo_mime, escritos)
+            return AnexoTicket.objects.create(
+                ticket=ticket,
+                acao=acao,
+                blob=blob,
+                arquivo=blob.arquivo.name,
+                nome_original=nome_original[:255],
+                tamanho=blob.tamanho,
+                tipo_mime=tipo_mime[:100],
+                autor=autor,
+            )
+    except Exception:
+        for name in escritos:
+            _discard(name)
+        raise
+
+
+def _release(blob_id: int):
+    with transaction.atomic():
+        blob = ArquivoAnexo.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return
+        if blob.referencias > 1:
+            ArquivoAnexo.objects.filter(pk=blob_id).update(referencias=F("referencias") - 1)
+            return
+        name = blob.arquivo.name
+        blob.delete()
+    _discard(name)
+
+
+def liberar_blob(sender, instance, **kwargs):
+    """post_delete de AnexoTicket/AnexoTicketArquivado: libera o blob após o commit."""
+    if instance.blob_id:
+        blob_id = instance.blob_id
+        transaction.on_commit(lambda: _release(blob_id))
+
+
+def deduplicar_anexo(anexo: AnexoTicket) -> bool:
+    """
+    Move um anexo antigo (sem blob) para o armazenamento deduplicado.
+
+    Retorna False se o arquivo original não existir mais.
+    """
+    old_name = anexo.arquivo.name
+    if not old_name or not default_storage.exists(old_name):
+        return False
+    escritos = []
+    with default_storage.open(old_name, "rb") as fh:
+        try:
+            with transaction.atomic():
+                blob = store_blob(fh, anexo.nome_original or old_name, anexo.tipo_mime, escritos)
+                AnexoTicket.objects.filter(pk=anexo.pk).update(blob=blob, arquivo=blob.arquivo.name)
+        except Exception:
+            for name in escritos:
+                _discard(name)
+            raise
+    if old_name != blob.arquivo.name and not AnexoTicket.objects.filter(arquivo=old_name).exists():
+        default_storage.delete(old_name)
+    anexo.blob, anexo.arquivo.name = blob, blob.arquivo.name
+    return True
+
+
+
+def _blob_files(path: str = BLOB_UPLOAD_TO):
+    """Nomes de todos os arquivos sob ``path`` no storage."""
+    try:
+        dirs, files = default_storage.listdir(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for file_name in files:
+        yield f"{path}/{file_name}"
+    for dir_name in dirs:
+        yield from _blob_files(f"{path}/{dir_name}")
+
+
+def limpar_blobs_orfaos(idade_minima: timedelta = ORPHAN_MIN_AGE) -> int:
+    """
+    Remove arquivos de ``BLOB_UPLOAD_TO`` sem ArquivoAnexo (gravados por
+    transações revertidas). Arquivos mais novos que ``idade_minima`` ficam —
+    podem pertencer a uma transação ainda aberta. Retorna quantos removeu.
+    """
+    limite = timezone.now() - idade_minima
+    conhecidos = set(
+        ArquivoAnexo.objects.filter(arquivo__startswith=f"{BLOB_UPLOAD_TO}/").values_list("arquivo", flat=True)
+    )
+    removidos = 0
+    for name in _blob_files():
+        if name in conhecidos:
+            continue
+        try:
+            if default_storage.get_modified_time(name) > limite:
+                continue
+        except (NotImplementedError, OSError):
+            continue
+        _discard(name)
+        removidos += 1
+    if removidos:
+        logger.info(f"Anexos | {removidos} arquivo(s) órfão(s) removido(s)")
+    return removidos
@@ -808,12 +808,13 @@ class TemplateRespostaForm(forms.ModelForm):
 class EquipeForm(forms.ModelForm):
     class Meta:
         model = Equipe
-        fields = ['nome', 'descricao', 'email', 'agentes', 'ordem', 'ativo']
+        fields = ['nome', 'descricao', 'email', 'agentes', 'estrategia_distribuicao', 'ordem', 'ativo']
         widgets = {
             'nome': forms.TextInput(attrs={'class': 'form-control'}),
             'descricao': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'agentes': forms.CheckboxSelectMultiple(),
+            'estrategia_distribuicao': forms.Select(attrs={'class': 'form-control'}),
             'ordem': forms.NumberInput(attrs={'class': 'form-control'}),
             'ativo': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
@@ -0,0 +1,146 @@
+"""
+Quadro kanban da listagem de tickets.
+
+O quadro renderizava todos os tickets filtrados agrupados por status, então
+o custo da consulta e do template crescia com o backlog inteiro. Aqui:
+
+- ``build_board`` conta os tickets de cada status numa única consulta
+  agrupada e busca só os ``KANBAN_CARDS_PER_COLUMN`` mais recentes de cada
+  coluna, também numa consulta (ROW_NUMBER() particionado por status);
+- ``column_page`` devolve a página seguinte de uma coluna a partir de um
+  cursor (criado_em, id) — servida em JSON por TicketKanbanColumnView
+  quando o usuário rola a coluna.
+
+A ordem dos cards é (criado_em DESC, id DESC), coberta pelo índice
+(status, -criado_em) de Ticket.
+"""
+import base64
+from dataclasses import dataclass, field
+
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from .models import Status
+
+KANBAN_CARDS_PER_COLUMN = 20
+KANBAN_MAX_CARDS_PER_PAGE = 100
+
+CARD_ORDER = (F("criado_em").desc(), F("id").desc())
+
+
+# ============================================================================
+# CURSOR
+# ============================================================================
+
+def encode_cursor(ticket) -> str:
+    raw = f"{ticket.criado_em.isoformat()}|{ticket.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Retorna (criado_em, id) ou None se o cursor for inválido."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        criado_em_raw, pk_raw = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        criado_em = parse_datetime(criado_em_raw)
+        if criado_em is None:
+            return None
+        return criado_em, int(pk_raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after(criado_em, pk) -> Q:
+    return Q(criado_em__lt=criado_em) | Q(criado_em=criado_em, id__lt=pk)
+
+
+# ============================================================================
+# QUADRO
+# ============================================================================
+
+@dataclass
+class KanbanColumn:
+    status: Status
+    total: int = 0
+    cards: list = field(default_factory=list)
+    next_cursor: str = ""
+
+    @property
+    def has_more(self) -> bool:
+        return bool(self.next_cursor)
+
+
+def card_payload(ticket) -> dict:
+    """Dados de um card para o JSON da coluna (mesmos campos do template)."""
+    responsavel = ticket.responsavel
+    return {
+        "id": ticket.pk,
+        "numero": ticket.numero,
+        "assunto": ticket.assunto or "",
+        "url": reverse("tickets:ticket_detail", args=[ticket.pk]),
+        "solicitante": ticket.solicitante.get_full_name() or ticket.solicitante.username,
+        "responsavel": (responsavel.get_full_name() or responsavel.username) if responsavel else "",
+        "urgencia": ticket.urgencia.nome if ticket.urgencia else "",
+        "urgencia_cor": ticket.urgencia.cor if ticket.urgencia else "",
+        "previsao_solucao": ticket.previsao_solucao.isoformat() if ticket.previsao_solucao else None,
+        "vencido": ticket.esta_vencido,
+        "criado_em": ticket.criado_em.isoformat(),
+    }
+
+
+def _card_queryset(queryset):
+    return queryset.select_related("solicitante", "responsavel", "urgencia")
+
+
+def build_board(queryset, statuses, per_column: int = KANBAN_CARDS_PER_COLUMN) -> list[KanbanColumn]:
+    """
+    Monta as colunas do quadro para os tickets de ``queryset``.
+
+    ``statuses`` define as colunas e sua ordem; status com tickets que não
+    estejam na lista ganham coluna ao final.
+    """
+    totals = {
+        row["status_id"]: row["total"]
+        for row in queryset.order_by().values("status_id").annotate(total=Count("id"))
+    }
+    columns = {status.pk: KanbanColumn(status=status) for status in statuses}
+    missing = [status_id for status_id in totals if status_id not in columns]
+    if missing:
+        for status in Status.objects.filter(pk__in=missing).order_by("ordem", "nome"):
+            columns[status.pk] = KanbanColumn(status=status)
+    for status_id, column in columns.items():
+        column.total = totals.get(status_id, 0)
+
+    ranked = _card_queryset(queryset).annotate(
+        posicao=Window(RowNumber(), partition_by=[F("status_id")], order_by=list(CARD_ORDER)),
+    ).filter(posicao__lte=per_column).order_by("status_id", *CARD_ORDER)
+    for ticket in ranked:
+        columns[ticket.status_id].cards.append(ticket)
+
+    for column in columns.values():
+        if column.cards and column.total > len(column.cards):
+            column.next_cursor = encode_cursor(column.cards[-1])
+    return list(columns.values())
+
+
+def column_page(queryset, status_id: int, after: str = "",
+                limit: int = KANBAN_CARDS_PER_COLUMN) -> tuple[list, str]:
+    """
+    Próximos ``limit`` tickets de uma coluna depois do cursor ``after``.
+
+    Returns:
+        (tickets, cursor da página seguinte ou "")
+    """
+    limit = max(1, min(limit, KANBAN_MAX_CARDS_PER_PAGE))
+    qs = _card_queryset(queryset).filter(status_id=status_id)
+    cursor = decode_cursor(after)
+    if cursor:
+        qs = qs.filter(_after(*cursor))
+    rows = list(qs.order_by(*CARD_ORDER)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]) if has_more else ""
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Move tickets fechados/cancelados antigos para as tabelas de arquivo"
+
+    def add_arguments(self, parser):
+        from apps.tickets.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+        parser.add_argument(
+            "--dias", type=int, default=ARCHIVE_AFTER_DAYS,
+            help=f"Arquiva tickets encerrados há mais de N dias (padrão: {ARCHIVE_AFTER_DAYS})",
+        )
+        parser.add_argument("--lote", type=int, default=ARCHIVE_BATCH_SIZE, help="Tickets por transação")
+        parser.add_argument("--max-lotes", type=int, default=None, help="Para após N lotes")
+        parser.add_argument("--dry-run", action="store_true", help="Só conta os tickets elegíveis")
+
+    def handle(self, *args, **options):
+        from apps.tickets.archive import arquivar_tickets, tickets_arquivaveis
+
+        if options["dry_run"]:
+            total = tickets_arquivaveis(options["dias"]).distinct().count()
+            self.stdout.write(f"{total} ticket(s) seriam arquivados")
+            return
+
+        resultado = arquivar_tickets(
+            dias=options["dias"], batch_size=options["lote"], max_lotes=options["max_lotes"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Tickets arquivados: {resultado['arquivados']} em {resultado['lotes']} lote(s)"
+        ))
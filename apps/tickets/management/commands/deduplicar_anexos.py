@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Move anexos antigos para o armazenamento deduplicado por SHA-256"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500, help="Anexos lidos por consulta")
+        parser.add_argument("--ticket", type=str, default="", help="Limita a um ticket (número)")
+
+    def handle(self, *args, **options):
+        from apps.tickets.attachments import deduplicar_anexo
+        from apps.tickets.models import AnexoTicket
+
+        anexos = AnexoTicket.objects.filter(blob__isnull=True).exclude(arquivo="").order_by("pk")
+        if options["ticket"]:
+            anexos = anexos.filter(ticket__numero=options["ticket"])
+
+        migrados = ausentes = 0
+        for anexo in anexos.iterator(chunk_size=options["lote"]):
+            if deduplicar_anexo(anexo):
+                migrados += 1
+            else:
+                ausentes += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Arquivo ausente: anexo {anexo.pk} ({anexo.arquivo.name})"
+                ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Anexos deduplicados: {migrados} migrado(s), {ausentes} sem arquivo"
+        ))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Remove arquivos de anexo deduplicado sem ArquivoAnexo (transações revertidas)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=1, help="Idade mínima do arquivo para remoção")
+
+    def handle(self, *args, **options):
+        from apps.tickets.attachments import limpar_blobs_orfaos
+
+        removidos = limpar_blobs_orfaos(timedelta(hours=options["horas"]))
+        self.stdout.write(self.style.SUCCESS(f"Arquivos órfãos removidos: {removidos}"))
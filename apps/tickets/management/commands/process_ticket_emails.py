@@ -334,7 +334,8 @@ class Command(BaseCommand):
 
     def add_action_to_ticket(self, ticket, usuario, body, email_message, config):
         """Adiciona uma ação (resposta) a um ticket existente"""
-        from apps.tickets.models import AcaoTicket, AnexoTicket
+        from apps.tickets.attachments import criar_anexo
+        from apps.tickets.models import AcaoTicket
 
         # Determinar tipo de ação
         # Se o usuário é o solicitante = resposta pública
@@ -376,21 +377,15 @@ class Command(BaseCommand):
 
                         from django.core.files.base import ContentFile
 
-                        # Criar anexo
-                        anexo = AnexoTicket.objects.create(
-                            ticket=ticket,
-                            autor=usuario,
+                        # Criar anexo (conteúdo repetido reaproveita o mesmo arquivo)
+                        criar_anexo(
+                            ticket,
+                            ContentFile(file_data, name=filename),
+                            usuario,
                             nome_original=filename,
-                            tamanho=len(file_data),
                             tipo_mime=part.get_content_type()
                         )
 
-                        anexo.arquivo.save(
-                            filename,
-                            ContentFile(file_data),
-                            save=True
-                        )
-
         # Atualizar status do ticket se necessário
         # Se estava Aguardando Cliente e o cliente respondeu, pode voltar para Em Atendimento
         if ticket.status.status_base == StatusBase.PARADO and usuario == ticket.solicitante:
@@ -683,7 +678,7 @@ Equipe de Suporte
 
     def process_attachments(self, email_message, ticket):
         """Processa anexos do e-mail e adiciona ao ticket"""
-        from apps.tickets.models import AnexoTicket
+        from apps.tickets.attachments import criar_anexo
         from django.core.files.base import ContentFile
 
         for part in email_message.walk():
@@ -700,17 +695,11 @@ Equipe de Suporte
                     if len(file_data) > 25 * 1024 * 1024:
                         continue
 
-                    # Criar anexo
-                    anexo = AnexoTicket.objects.create(
-                        ticket=ticket,
-                        autor=ticket.solicitante,
+                    # Criar anexo (conteúdo repetido reaproveita o mesmo arquivo)
+                    criar_anexo(
+                        ticket,
+                        ContentFile(file_data, name=filename),
+                        ticket.solicitante,
                         nome_original=filename,
-                        tamanho=len(file_data),
                         tipo_mime=part.get_content_type()
-                    )
-
-                    anexo.arquivo.save(
-                        filename,
-                        ContentFile(file_data),
-                        save=True
                     )
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores de tickets abertos por agente (distribuição automática)"
+
+    def handle(self, *args, **options):
+        from apps.tickets.assignment import ressincronizar_cargas
+
+        corrigidos = ressincronizar_cargas()
+        self.stdout.write(self.style.SUCCESS(f"Contadores corrigidos: {corrigidos}"))
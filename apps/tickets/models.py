@@ -742,6 +742,70 @@ class Ticket(models.Model):
     def __str__(self):
         return f"#{self.numero} - {self.assunto or 'Sem assunto'}"
 
+    # ── Rastreamento de alterações ──────────────────────────────────────────
+    # Valores como estão no banco, guardados ao carregar (from_db) e após cada
+    # save — save, signals e gatilhos comparam com eles sem reler o ticket.
+    CAMPOS_RASTREADOS = (
+        'status_id', 'categoria_id', 'urgencia_id', 'servico_id', 'justificativa_id',
+        'responsavel_id', 'equipe_id', 'assunto', 'tipo_ticket', 'canal_abertura',
+        'previsao_solucao',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_estado()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Os valores relidos passam a ser o estado no banco
+        self._guardar_estado(fields)
+
+    def _guardar_estado(self, update_fields=None):
+        """Marca os valores atuais dos campos rastreados como 'estado no banco'."""
+        estado = getattr(self, '_estado_banco', None)
+        if update_fields is None:
+            if any(campo not in self.__dict__ for campo in self.CAMPOS_RASTREADOS):
+                # Carregado com only()/defer(): estado_anterior relê do banco
+                self._estado_banco = None
+                return
+            estado, campos = {}, self.CAMPOS_RASTREADOS
+        else:
+            if estado is None:
+                return
+            salvos = {self._meta.get_field(nome).attname for nome in update_fields}
+            campos = [campo for campo in self.CAMPOS_RASTREADOS if campo in salvos]
+        self._estado_banco = {**estado, **{campo: getattr(self, campo) for campo in campos}}
+
+    def estado_anterior(self):
+        """
+        Campos rastreados como estão no banco, mais ``status_base``; None para
+        ticket novo. Só consulta o banco se o ticket não veio de uma query
+        completa, ou para o status_base quando o status mudou.
+        """
+        if self.pk is None:
+            return None
+        if getattr(self, '_estado_banco', None) is None:
+            self._estado_banco = Ticket.objects.filter(pk=self.pk).values(*self.CAMPOS_RASTREADOS).first()
+            if self._estado_banco is None:
+                return None
+        estado = dict(self._estado_banco)
+        if estado['status_id'] == self.status_id:
+            estado['status_base'] = self.status.status_base
+        else:
+            estado['status_base'] = (
+                Status.objects.filter(pk=estado['status_id']).values_list('status_base', flat=True).first()
+            )
+        return estado
+
+    def campos_alterados(self):
+        """Campos rastreados com valor diferente do banco (vazio para ticket novo)."""
+        anterior = self.estado_anterior()
+        if anterior is None:
+            return set()
+        return {campo for campo in self.CAMPOS_RASTREADOS if anterior[campo] != getattr(self, campo)}
+
     def save(self, *args, **kwargs):
         # Gera número do ticket
         if not self.numero:
@@ -758,36 +822,64 @@ class Ticket(models.Model):
 
             self.numero = f"{ano}-{novo_num:06d}"
 
+        from apps.tickets.assignment import STATUS_ABERTOS, registrar_transicao
+
+        anterior = self.estado_anterior()
+        # Lido pelos signals/gatilhos (pre_save/post_save) sem nova consulta
+        self._estado_anterior = anterior
+
         # Atualiza timestamps baseado no status
-        if self.pk:
-            original = Ticket.objects.get(pk=self.pk)
+        if anterior:
+            status_base = self.status.status_base
+            status_base_anterior = anterior['status_base']
 
             # Resolvido
-            if self.status.status_base == StatusBase.RESOLVIDO and original.status.status_base != StatusBase.RESOLVIDO:
+            if status_base == StatusBase.RESOLVIDO and status_base_anterior != StatusBase.RESOLVIDO:
                 self.resolvido_em = timezone.now()
 
             # Fechado
-            if self.status.status_base == StatusBase.FECHADO and original.status.status_base != StatusBase.FECHADO:
+            if status_base == StatusBase.FECHADO and status_base_anterior != StatusBase.FECHADO:
                 self.fechado_em = timezone.now()
 
             # Cancelado
-            if self.status.status_base == StatusBase.CANCELADO and original.status.status_base != StatusBase.CANCELADO:
+            if status_base == StatusBase.CANCELADO and status_base_anterior != StatusBase.CANCELADO:
                 self.cancelado_em = timezone.now()
 
             # Gerenciar pausa
-            if self.status.status_base == StatusBase.PARADO and original.status.status_base != StatusBase.PARADO:
+            if status_base == StatusBase.PARADO and status_base_anterior != StatusBase.PARADO:
                 self.pausado_em = timezone.now()
-            elif self.status.status_base != StatusBase.PARADO and original.status.status_base == StatusBase.PARADO:
+            elif status_base != StatusBase.PARADO and status_base_anterior == StatusBase.PARADO:
                 if self.pausado_em:
                     tempo_pausa = timezone.now() - self.pausado_em
                     self.tempo_pausado += tempo_pausa
                     self.pausado_em = None
 
-        super().save(*args, **kwargs)
+        # auto_now só é gravado se estiver em update_fields; atualizado_em é o
+        # cursor da sincronização do agente, então todo save o avança
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'atualizado_em'}
+
+        # O estado novo vale antes do post_save: saves aninhados (gatilhos)
+        # comparam com ele, não com o estado de antes deste save
+        estado_banco = getattr(self, '_estado_banco', None)
+        self._guardar_estado(kwargs.get('update_fields'))
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self._estado_banco = estado_banco
+            raise
+
+        # Carga dos agentes (distribuição automática)
+        registrar_transicao(
+            anterior['responsavel_id'] if anterior else None,
+            bool(anterior) and anterior['status_base'] in STATUS_ABERTOS,
+            self.responsavel_id, self.status.status_base in STATUS_ABERTOS,
+        )
 
         # Calcula SLA após salvar
         if not self.previsao_manual:
-            self.calcular_prazo_uteis()
+            from apps.tickets.sla_utils import calcular_sla_ticket
+            calcular_sla_ticket(self)
 
     def calcular_prazo_uteis(dt_inicio, horas_prazo, horarios, feriados_qs):
         """
@@ -982,6 +1074,9 @@ class AcaoTicket(models.Model):
         verbose_name = "Ação do Ticket"
         verbose_name_plural = "Ações do Ticket"
         ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['ticket', 'criado_em']),
+        ]
 
     def __str__(self):
         return f"{self.ticket.numero} - {self.get_tipo_display()} por {self.autor.username}"
@@ -998,6 +1093,28 @@ class AcaoTicket(models.Model):
                 )
 
 
+class ArquivoAnexo(models.Model):
+    """
+    Conteúdo de anexo armazenado uma única vez, identificado pelo SHA-256.
+    Vários AnexoTicket (assinaturas, logos, encaminhamentos repetidos)
+    apontam para o mesmo arquivo; ``referencias`` conta esses vínculos.
+    """
+    sha256 = models.CharField("SHA-256", max_length=64, unique=True)
+    arquivo = models.FileField("Arquivo", upload_to='tickets/blobs/', max_length=255)
+    tamanho = models.BigIntegerField("Tamanho (bytes)")
+    tipo_mime = models.CharField("Tipo MIME", max_length=100, blank=True)
+    referencias = models.PositiveIntegerField("Referências", default=0)
+    criado_em = models.DateTimeField("Criado Em", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Arquivo de Anexo"
+        verbose_name_plural = "Arquivos de Anexo"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.referencias} ref.)"
+
+
 class AnexoTicket(models.Model):
     """Anexos do ticket"""
     ticket = models.ForeignKey(
@@ -1026,12 +1143,23 @@ class AnexoTicket(models.Model):
         on_delete=models.PROTECT,
         related_name='anexos_tickets'
     )
+    blob = models.ForeignKey(
+        ArquivoAnexo,
+        on_delete=models.PROTECT,
+        related_name='anexos',
+        null=True,
+        blank=True,
+        verbose_name="Arquivo deduplicado",
+    )
     criado_em = models.DateTimeField("Criado Em", auto_now_add=True)
 
     class Meta:
         verbose_name = "Anexo"
         verbose_name_plural = "Anexos"
         ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['ticket', 'criado_em']),
+        ]
 
     def __str__(self):
         return f"{self.ticket.numero} - {self.nome_original}"
@@ -1058,6 +1186,9 @@ class HistoricoTicket(models.Model):
         verbose_name = "Histórico"
         verbose_name_plural = "Histórico"
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['ticket', 'criado_em']),
+        ]
 
     def __str__(self):
         return f"{self.ticket.numero} - {self.campo} alterado por {self.usuario.username}"
@@ -1409,6 +1540,12 @@ class TemplateResposta(models.Model):
         return conteudo
 
 
+class EstrategiaDistribuicao(models.TextChoices):
+    """Como a equipe escolhe o responsável de um ticket novo"""
+    MENOR_CARGA = 'menor_carga', 'Menor carga'
+    RODIZIO = 'rodizio', 'Rodízio'
+
+
 class Equipe(models.Model):
     """Equipe de agentes — agrupa agentes para roteamento de tickets."""
     nome = models.CharField("Nome", max_length=100)
@@ -1430,6 +1567,21 @@ class Equipe(models.Model):
         limit_choices_to={'is_staff': True},
         verbose_name="Agentes"
     )
+    estrategia_distribuicao = models.CharField(
+        "Distribuição automática",
+        max_length=20,
+        choices=EstrategiaDistribuicao.choices,
+        default=EstrategiaDistribuicao.MENOR_CARGA,
+    )
+    # Último agente escolhido no rodízio
+    ultimo_agente = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        editable=False,
+    )
 
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
@@ -1446,25 +1598,41 @@ class Equipe(models.Model):
     def agente_com_menor_carga(self):
         """
         Retorna o agente da equipe com menos tickets abertos.
-        Usado para distribuição automática de tickets.
+        Lê os contadores de CargaAgente (ver apps.tickets.assignment).
         """
-        from django.db.models import Count, Q
-        return (
-            self.agentes
-            .filter(is_active=True)
-            .annotate(
-                tickets_abertos=Count(
-                    'tickets_responsavel',
-                    filter=Q(
-                        tickets_responsavel__status__status_base__in=[
-                            'novo', 'em_atendimento', 'parado'
-                        ]
-                    )
-                )
-            )
-            .order_by('tickets_abertos')
-            .first()
-        )
+        from apps.tickets.assignment import agente_menor_carga
+        return agente_menor_carga(self)
+
+    def proximo_agente(self):
+        """
+        Agente que deve receber o próximo ticket, conforme a estratégia
+        de distribuição da equipe.
+        """
+        from apps.tickets.assignment import escolher_agente
+        return escolher_agente(self)
+
+
+class CargaAgente(models.Model):
+    """
+    Quantidade de tickets abertos (novo, em atendimento, parado) sob
+    responsabilidade de cada agente. Mantida incrementalmente por
+    apps.tickets.assignment e ressincronizada periodicamente.
+    """
+    agente = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='carga_tickets',
+    )
+    tickets_abertos = models.PositiveIntegerField("Tickets abertos", default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Carga do agente"
+        verbose_name_plural = "Cargas dos agentes"
+
+    def __str__(self):
+        return f"{self.agente} — {self.tickets_abertos}"
 
 
 class NotificacaoTicket(models.Model):
@@ -1535,4 +1703,121 @@ class NotificacaoTicket(models.Model):
             'atribuido': '#16a34a',
             'mencionado': '#db2777',
         }
-        return cores.get(self.tipo, '#6b7280')
\ No newline at end of file
+        return cores.get(self.tipo, '#6b7280')
+
+# ==================== ARQUIVO (TICKETS ANTIGOS) ====================
+
+class TicketArquivado(models.Model):
+    """
+    Ticket fechado/cancelado movido para o arquivo (apps/tickets/archive.py).
+    Somente leitura: guarda os nomes das classificações e pessoas como texto,
+    para não depender de registros que podem ser removidos depois.
+    """
+    ticket_original_id = models.BigIntegerField("ID Original", unique=True)
+    numero = models.CharField("Número/Protocolo", max_length=20, unique=True)
+    cliente = models.ForeignKey(
+        'authentication.User',
+        on_delete=models.CASCADE,
+        related_name='tickets_arquivados',
+    )
+
+    assunto = models.CharField("Assunto", max_length=255, blank=True)
+    descricao = models.TextField("Descrição", blank=True)
+    solicitante_nome = models.CharField("Solicitante", max_length=255, blank=True)
+    solicitante_email = models.CharField("E-mail do Solicitante", max_length=254, blank=True)
+    responsavel_nome = models.CharField("Responsável", max_length=255, blank=True)
+    status_nome = models.CharField("Status", max_length=100, blank=True)
+    status_base = models.CharField("Status Base", max_length=20, choices=StatusBase.choices)
+    categoria_nome = models.CharField("Categoria", max_length=100, blank=True)
+    urgencia_nome = models.CharField("Urgência", max_length=100, blank=True)
+    servico_nome = models.CharField("Serviço", max_length=100, blank=True)
+    tipo_ticket = models.CharField("Tipo", max_length=20, choices=TipoTicket.choices, default=TipoTicket.PUBLICO)
+    canal_abertura = models.CharField(
+        "Canal de Abertura", max_length=20, choices=CanalAbertura.choices, default=CanalAbertura.WEB
+    )
+    dados = models.JSONField(
+        "Demais dados", default=dict, blank=True,
+        help_text="SLA, tags, CC, máquina, ativos e pesquisa de satisfação no momento do arquivamento",
+    )
+
+    criado_em = models.DateTimeField("Criado Em")
+    resolvido_em = models.DateTimeField("Resolvido Em", null=True, blank=True)
+    fechado_em = models.DateTimeField("Fechado Em", null=True, blank=True)
+    arquivado_em = models.DateTimeField("Arquivado Em", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Ticket Arquivado"
+        verbose_name_plural = "Tickets Arquivados"
+        ordering = ['-fechado_em']
+        indexes = [
+            models.Index(fields=['cliente', '-fechado_em']),
+            models.Index(fields=['cliente', '-criado_em']),
+        ]
+
+    def __str__(self):
+        return f"#{self.numero} - {self.assunto or 'Sem assunto'} (arquivado)"
+
+
+class AcaoTicketArquivada(models.Model):
+    """Ação de um ticket arquivado"""
+    ticket = models.ForeignKey(TicketArquivado, on_delete=models.CASCADE, related_name='acoes')
+    tipo = models.CharField("Tipo", max_length=20, choices=TipoAcao.choices, default=TipoAcao.PUBLICA)
+    autor_nome = models.CharField("Autor", max_length=255, blank=True)
+    conteudo = models.TextField("Conteúdo")
+    conteudo_html = models.TextField("Conteúdo HTML", blank=True)
+    tempo_trabalhado = models.DurationField("Tempo Trabalhado", null=True, blank=True)
+    criado_em = models.DateTimeField("Criado Em")
+
+    class Meta:
+        verbose_name = "Ação Arquivada"
+        verbose_name_plural = "Ações Arquivadas"
+        ordering = ['criado_em']
+
+    def __str__(self):
+        return f"{self.ticket.numero} - {self.get_tipo_display()} por {self.autor_nome}"
+
+
+class AnexoTicketArquivado(models.Model):
+    """
+    Anexo de um ticket arquivado. Aponta para o mesmo arquivo do anexo
+    original; se ele estava deduplicado, continua contando no ArquivoAnexo.
+    """
+    ticket = models.ForeignKey(TicketArquivado, on_delete=models.CASCADE, related_name='anexos')
+    acao = models.ForeignKey(
+        AcaoTicketArquivada, on_delete=models.CASCADE, related_name='anexos', null=True, blank=True
+    )
+    blob = models.ForeignKey(
+        ArquivoAnexo, on_delete=models.PROTECT, related_name='anexos_arquivados', null=True, blank=True
+    )
+    arquivo = models.FileField("Arquivo", upload_to='tickets/anexos/%Y/%m/', max_length=255)
+    nome_original = models.CharField("Nome Original", max_length=255)
+    tamanho = models.BigIntegerField("Tamanho (bytes)")
+    tipo_mime = models.CharField("Tipo MIME", max_length=100)
+    autor_nome = models.CharField("Autor", max_length=255, blank=True)
+    criado_em = models.DateTimeField("Criado Em")
+
+    class Meta:
+        verbose_name = "Anexo Arquivado"
+        verbose_name_plural = "Anexos Arquivados"
+        ordering = ['criado_em']
+
+    def __str__(self):
+        return f"{self.ticket.numero} - {self.nome_original}"
+
+
+class HistoricoTicketArquivado(models.Model):
+    """Histórico de alterações de um ticket arquivado"""
+    ticket = models.ForeignKey(TicketArquivado, on_delete=models.CASCADE, related_name='historico')
+    usuario_nome = models.CharField("Usuário", max_length=255, blank=True)
+    campo = models.CharField("Campo", max_length=100)
+    valor_anterior = models.TextField("Valor Anterior", blank=True)
+    valor_novo = models.TextField("Valor Novo", blank=True)
+    criado_em = models.DateTimeField("Criado Em")
+
+    class Meta:
+        verbose_name = "Histórico Arquivado"
+        verbose_name_plural = "Históricos Arquivados"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.ticket.numero} - {self.campo} alterado por {self.usuario_nome}"
@@ -0,0 +1,133 @@
+"""
+Fan-out das notificações in-app de ticket.
+
+Os ``notificar_*`` de signals.py buscavam os destinatários em consultas
+separadas (agentes da equipe, responsável, solicitante) e faziam um
+``NotificacaoTicket.objects.create`` por destinatário dentro da transação
+da requisição — um ticket de equipe grande custava dezenas de INSERTs a
+cada evento. Aqui cada evento vira uma lista de ``Envio`` (papel → tipo,
+título, mensagem):
+
+- ``notificar_ticket`` só copia os ids do ticket (nenhuma consulta) e
+  agenda a entrega com ``transaction.on_commit`` — rollback não gera
+  notificação e a requisição não paga pelo fan-out;
+- ``entregar`` resolve todos os papéis numa única consulta de usuários e
+  grava com um único ``bulk_create``. Cada usuário recebe no máximo uma
+  notificação por evento: a do primeiro envio em que aparece;
+- com ``TICKET_NOTIFICATIONS_ASYNC = True`` a entrega vai para o worker
+  (``tickets.entregar_notificacoes``); o payload é só JSON. ``entregar``
+  deixa o erro subir para a task tentar de novo; só a entrega síncrona
+  (depois do commit da requisição) registra o erro e segue.
+"""
+import logging
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Value
+
+from .models import Equipe, NotificacaoTicket
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_ASYNC = getattr(settings, "TICKET_NOTIFICATIONS_ASYNC", False)
+
+RESPONSAVEL = "responsavel"
+SOLICITANTE = "solicitante"
+EQUIPE = "equipe"  # agentes ativos da equipe do ticket
+
+
+@dataclass(frozen=True)
+class Envio:
+    papel: str
+    tipo: str
+    titulo: str
+    mensagem: str = ""
+
+
+def montar(ticket, envios, excluir=()) -> dict:
+    """Payload (serializável) de um evento do ticket."""
+    return {
+        "ticket_id": ticket.pk,
+        "responsavel_id": ticket.responsavel_id,
+        "solicitante_id": ticket.solicitante_id,
+        "equipe_id": ticket.equipe_id,
+        "excluir": [pk for pk in excluir if pk],
+        "envios": [asdict(envio) for envio in envios],
+    }
+
+
+def notificar_ticket(ticket, envios, excluir=()) -> None:
+    """Agenda as notificações do evento para depois do commit."""
+    if not envios:
+        return
+    dados = montar(ticket, envios, excluir)
+    transaction.on_commit(lambda: _despachar(dados))
+
+
+def _despachar(dados: dict) -> None:
+    if NOTIFICATIONS_ASYNC:
+        from .tasks import entregar_notificacoes
+        entregar_notificacoes.delay(dados)
+        return
+    try:
+        entregar(dados)
+    except Exception as e:
+        logger.error(f"[NOTIF] Erro ao criar notificações do ticket {dados.get('ticket_id')}: {e}")
+
+
+def resolver_destinatarios(dados: dict) -> dict:
+    """
+    Ids de usuário por papel, numa consulta só.
+
+    Responsável e solicitante vêm do próprio ticket; os agentes da equipe só
+    entram se estiverem ativos.
+    """
+    papeis = {envio["papel"] for envio in dados["envios"]}
+    diretos = {
+        papel: dados[f"{papel}_id"] for papel in (RESPONSAVEL, SOLICITANTE)
+        if papel in papeis and dados[f"{papel}_id"]
+    }
+    com_equipe = EQUIPE in papeis and dados["equipe_id"]
+    if not diretos and not com_equipe:
+        return {}
+
+    User = get_user_model()
+    filtro = Q(pk__in=diretos.values())
+    if com_equipe:
+        membro = Equipe.agentes.through.objects.filter(equipe_id=dados["equipe_id"], user_id=OuterRef("pk"))
+        usuarios = User.objects.annotate(na_equipe=Exists(membro))
+        filtro |= Q(na_equipe=True, is_active=True)
+    else:
+        usuarios = User.objects.annotate(na_equipe=Value(False))
+
+    resolvidos = {papel: [] for papel in papeis}
+    for pk, na_equipe, ativo in usuarios.filter(filtro).order_by("pk").values_list("pk", "na_equipe", "is_active"):
+        for papel, usuario_id in diretos.items():
+            if usuario_id == pk:
+                resolvidos[papel].append(pk)
+        if com_equipe and na_equipe and ativo:
+            resolvidos[EQUIPE].append(pk)
+    return resolvidos
+
+
+def entregar(dados: dict) -> int:
+    """Grava as notificações do evento. Retorna quantas foram criadas."""
+    destinatarios = resolver_destinatarios(dados)
+    ja_notificados = set(dados["excluir"])
+    notificacoes = []
+    for envio in dados["envios"]:
+        for usuario_id in destinatarios.get(envio["papel"], ()):
+            if usuario_id in ja_notificados:
+                continue
+            ja_notificados.add(usuario_id)
+            notificacoes.append(NotificacaoTicket(
+                usuario_id=usuario_id,
+                ticket_id=dados["ticket_id"],
+                tipo=envio["tipo"],
+                titulo=envio["titulo"][:200],
+                mensagem=envio["mensagem"],
+            ))
+    NotificacaoTicket.objects.bulk_create(notificacoes)
+    return len(notificacoes)
@@ -8,25 +8,10 @@ logger = logging.getLogger(__name__)
 
 @receiver(pre_save, sender='tickets.Ticket')
 def capturar_estado_anterior_ticket(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = {
-                'status_id': anterior.status_id,
-                'status_base': anterior.status.status_base,
-                'categoria_id': anterior.categoria_id,
-                'urgencia_id': anterior.urgencia_id,
-                'servico_id': anterior.servico_id,
-                'justificativa_id': anterior.justificativa_id,
-                'responsavel_id': anterior.responsavel_id,
-                'assunto': anterior.assunto,
-                'tipo_ticket': anterior.tipo_ticket,
-                'canal_abertura': anterior.canal_abertura,
-            }
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
-    else:
-        instance._estado_anterior = None
+    # Ticket.save já deixa o estado anterior em _estado_anterior, a partir
+    # dos valores guardados no from_db (ver Ticket.estado_anterior)
+    if not hasattr(instance, '_estado_anterior'):
+        instance._estado_anterior = instance.estado_anterior()
 
 
 @receiver(post_save, sender='tickets.Ticket')
@@ -389,88 +374,50 @@ def _resolver_destinatarios(destinatarios_cfg, ticket):
     return list(emails)
 
 
-# ─── Funções de notificação (adicionar ao signals.py existente) ──────────────
-
-def notificar(usuario, ticket, tipo, titulo, mensagem=''):
-    """Cria uma notificação in-app de forma segura."""
-    if not usuario or not usuario.pk:
-        return
-    try:
-        from apps.tickets.models import NotificacaoTicket
-        NotificacaoTicket.objects.create(
-            usuario=usuario,
-            ticket=ticket,
-            tipo=tipo,
-            titulo=titulo,
-            mensagem=mensagem,
-        )
-    except Exception as e:
-        logger.error(f"[NOTIF] Erro ao criar notificação: {e}")
-
+# ─── Funções de notificação ──────────────────────────────────────────────────
+# Entregues depois do commit, em lote (ver apps/tickets/notifications.py)
 
 def notificar_ticket_criado(ticket):
     """Notifica responsável / equipe quando ticket é criado."""
-    # Notifica responsável se já atribuído
-    if ticket.responsavel:
-        notificar(
-            ticket.responsavel, ticket,
-            'atribuido',
-            f'Ticket #{ticket.numero} atribuído a você',
-            f'Assunto: {ticket.assunto}'
-        )
-    # Notifica agentes da equipe
-    if hasattr(ticket, 'equipe') and ticket.equipe:
-        for agente in ticket.equipe.agentes.filter(is_active=True):
-            if agente != ticket.responsavel:
-                notificar(
-                    agente, ticket,
-                    'ticket_criado',
-                    f'Novo ticket #{ticket.numero} na equipe {ticket.equipe.nome}',
-                    f'Assunto: {ticket.assunto}'
-                )
+    from apps.tickets.notifications import EQUIPE, RESPONSAVEL, Envio, notificar_ticket
+    envios = [
+        Envio(RESPONSAVEL, 'atribuido', f'Ticket #{ticket.numero} atribuído a você', f'Assunto: {ticket.assunto}'),
+    ]
+    if ticket.equipe_id:
+        envios.append(Envio(
+            EQUIPE, 'ticket_criado',
+            f'Novo ticket #{ticket.numero} na equipe {ticket.equipe.nome}',
+            f'Assunto: {ticket.assunto}',
+        ))
+    notificar_ticket(ticket, envios)
 
 
 def notificar_nova_acao(acao):
     """Notifica partes envolvidas quando uma nova ação pública é adicionada."""
+    from apps.tickets.notifications import RESPONSAVEL, SOLICITANTE, Envio, notificar_ticket
     ticket = acao.ticket
     autor = acao.autor
+    por = f'Por: {autor.get_full_name() or autor.username}'
 
-    # Notifica responsável (se não é o autor)
-    if ticket.responsavel and ticket.responsavel != autor:
-        notificar(
-            ticket.responsavel, ticket,
-            'nova_acao',
-            f'Nova resposta no ticket #{ticket.numero}',
-            f'Por: {autor.get_full_name() or autor.username}'
-        )
-
-    # Notifica solicitante (se não é o autor e a ação é pública)
-    if acao.tipo == 'publica' and ticket.solicitante and ticket.solicitante != autor:
-        notificar(
-            ticket.solicitante, ticket,
-            'nova_acao',
-            f'Resposta no seu ticket #{ticket.numero}',
-            f'Por: {autor.get_full_name() or autor.username}'
-        )
+    envios = [Envio(RESPONSAVEL, 'nova_acao', f'Nova resposta no ticket #{ticket.numero}', por)]
+    # Solicitante só vê ações públicas
+    if acao.tipo == 'publica':
+        envios.append(Envio(SOLICITANTE, 'nova_acao', f'Resposta no seu ticket #{ticket.numero}', por))
+    notificar_ticket(ticket, envios, excluir=[acao.autor_id])
 
 
 def notificar_status_alterado(ticket, status_anterior):
-    """Notifica quando o status de um ticket muda."""
-    # Notifica solicitante
-    if ticket.solicitante:
-        notificar(
-            ticket.solicitante, ticket,
-            'status_alterado',
+    """Notifica solicitante e responsável quando o status de um ticket muda."""
+    from apps.tickets.notifications import RESPONSAVEL, SOLICITANTE, Envio, notificar_ticket
+    notificar_ticket(ticket, [
+        Envio(
+            SOLICITANTE, 'status_alterado',
             f'Status do ticket #{ticket.numero} alterado',
-            f'De: {status_anterior} → Para: {ticket.status.nome}'
-        )
-
-    # Notifica responsável (se não foi ele quem alterou — não temos o usuário aqui,
-    # então notificamos sempre)
-    if ticket.responsavel and ticket.responsavel != ticket.solicitante:
-        notificar(
-            ticket.responsavel, ticket,
-            'status_alterado',
+            f'De: {status_anterior} → Para: {ticket.status.nome}',
+        ),
+        # Não temos o usuário que alterou aqui, então o responsável é sempre notificado
+        Envio(
+            RESPONSAVEL, 'status_alterado',
             f'Status do ticket #{ticket.numero} alterado para {ticket.status.nome}',
-            ''
-        )
\ No newline at end of file
+        ),
+    ])
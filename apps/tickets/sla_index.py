@@ -0,0 +1,194 @@
+"""
+Índice de regras de SLA por contrato.
+
+``calcular_sla_ticket`` percorria as regras ativas do contrato chamando
+``RegraSLA.aplica_ao_ticket``, que faz ``exists()`` + ``all()`` em cada M2M
+(categorias, urgências, serviços) — até 6 consultas por regra a cada save
+de ticket. Aqui as regras de um contrato são compiladas uma vez (4
+consultas) e guardadas no cache:
+
+- cada regra vira (id, categorias, urgências, serviços, prazo, tipo de
+  horário), com ``None`` para "qualquer valor";
+- as combinações (categoria, urgência, serviço) são pré-resolvidas para a
+  regra vencedora — a primeira na ordem (ordem, nome, id), a mesma de
+  ``calcular_sla_ticket``. Valores que não aparecem em nenhuma regra só
+  casam com condições vazias, então são agrupados em ``OUTRO``;
+- contratos com combinações demais (``SLA_INDEX_MAX_COMBINACOES``) ficam
+  só com a lista compilada e resolvem varrendo-a em memória.
+
+Os receivers de RegraSLA/ContratoSLA e dos M2M de condição (conectados em
+TicketsConfig.ready) descartam o índice do contrato alterado — e, quando a
+regra muda de contrato, também o do contrato anterior (lido no pre_save). Com
+LocMemCache cada processo tem sua cópia; o TTL limita quanto tempo um
+worker pode usar regras antigas. Em produção use um cache compartilhado.
+"""
+from dataclasses import dataclass, field
+from itertools import product
+
+from django.core.cache import cache
+
+from .models import RegraSLA
+
+SLA_INDEX_CACHE_TIMEOUT = 3600
+SLA_INDEX_MAX_COMBINACOES = 20_000
+OUTRO = 0  # valor fora de todas as condições (inclui "sem categoria" etc.)
+
+_CONDICOES = ("categorias", "urgencias", "servicos")
+
+
+@dataclass(frozen=True)
+class RegraCompilada:
+    id: int
+    categorias: frozenset | None
+    urgencias: frozenset | None
+    servicos: frozenset | None
+    prazo_solucao: int
+    tipo_horario: str
+
+    def aplica(self, categoria_id, urgencia_id, servico_id) -> bool:
+        return all(
+            ids is None or valor in ids
+            for ids, valor in (
+                (self.categorias, categoria_id),
+                (self.urgencias, urgencia_id),
+                (self.servicos, servico_id),
+            )
+        )
+
+
+@dataclass
+class IndiceSLA:
+    contrato_id: int
+    regras: tuple = ()
+    # conjuntos de ids citados em alguma regra, por condição
+    referenciados: tuple = (frozenset(), frozenset(), frozenset())
+    combinacoes: dict | None = field(default_factory=dict)
+
+    def _normaliza(self, valores) -> tuple:
+        return tuple(v if v in ref else OUTRO for v, ref in zip(valores, self.referenciados))
+
+    def _primeira(self, categoria_id, urgencia_id, servico_id):
+        for regra in self.regras:
+            if regra.aplica(categoria_id, urgencia_id, servico_id):
+                return regra
+        return None
+
+    def resolve(self, categoria_id, urgencia_id, servico_id) -> RegraCompilada | None:
+        """Regra vencedora para a combinação (ou None se nenhuma se aplica)."""
+        if self.combinacoes is None:
+            return self._primeira(categoria_id, urgencia_id, servico_id)
+        posicao = self.combinacoes.get(self._normaliza((categoria_id, urgencia_id, servico_id)))
+        return None if posicao is None else self.regras[posicao]
+
+
+def _cache_key(contrato_id: int) -> str:
+    return f"tickets:sla-index:{contrato_id}"
+
+
+def compilar_indice(contrato_id: int) -> IndiceSLA:
+    """Monta o índice do contrato: 1 consulta de regras + 1 por condição M2M."""
+    regras = list(
+        RegraSLA.objects.filter(contrato_id=contrato_id, ativo=True)
+        .order_by("ordem", "nome", "pk")
+        .values_list("pk", "prazo_solucao", "tipo_horario")
+    )
+    ids = [pk for pk, _, _ in regras]
+
+    condicoes = []
+    for campo in _CONDICOES:
+        m2m = RegraSLA._meta.get_field(campo)
+        origem, destino = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+        por_regra = {}
+        linhas = m2m.remote_field.through.objects.filter(**{f"{origem}__in": ids}).values_list(origem, destino)
+        for regra_id, valor in linhas:
+            por_regra.setdefault(regra_id, set()).add(valor)
+        condicoes.append({regra_id: frozenset(valores) for regra_id, valores in por_regra.items()})
+
+    compiladas = tuple(
+        RegraCompilada(
+            id=pk,
+            categorias=condicoes[0].get(pk),
+            urgencias=condicoes[1].get(pk),
+            servicos=condicoes[2].get(pk),
+            prazo_solucao=prazo,
+            tipo_horario=tipo_horario,
+        )
+        for pk, prazo, tipo_horario in regras
+    )
+    referenciados = tuple(frozenset().union(*por_regra.values()) for por_regra in condicoes)
+    indice = IndiceSLA(contrato_id=contrato_id, regras=compiladas, referenciados=referenciados)
+
+    total = 1
+    for ref in referenciados:
+        total *= len(ref) + 1
+    if total > SLA_INDEX_MAX_COMBINACOES:
+        indice.combinacoes = None
+        return indice
+
+    posicoes = {regra.id: i for i, regra in enumerate(compiladas)}
+    dominios = [sorted(ref) + [OUTRO] for ref in referenciados]
+    for combinacao in product(*dominios):
+        regra = indice._primeira(*combinacao)
+        if regra is not None:
+            indice.combinacoes[combinacao] = posicoes[regra.id]
+    return indice
+
+
+def indice_do_contrato(contrato_id: int) -> IndiceSLA:
+    """Índice compilado do contrato, compilando na primeira chamada."""
+    key = _cache_key(contrato_id)
+    indice = cache.get(key)
+    if indice is None:
+        indice = compilar_indice(contrato_id)
+        cache.set(key, indice, timeout=SLA_INDEX_CACHE_TIMEOUT)
+    return indice
+
+
+def regra_para_ticket(contrato_id: int, ticket) -> RegraCompilada | None:
+    """Regra de SLA do contrato que se aplica ao ticket (lookup em dicionário)."""
+    return indice_do_contrato(contrato_id).resolve(ticket.categoria_id, ticket.urgencia_id, ticket.servico_id)
+
+
+def invalidar_indice(*contrato_ids) -> None:
+    cache.delete_many([_cache_key(pk) for pk in contrato_ids if pk])
+
+
+# ============================================================================
+# RECEIVERS (conectados em TicketsConfig.ready)
+# ============================================================================
+
+def regra_salvando(sender, instance, raw=False, **kwargs):
+    """pre_save de RegraSLA: guarda o contrato atual da regra no banco."""
+    if instance.pk and not raw:
+        instance._contrato_anterior_id = (
+            RegraSLA.objects.filter(pk=instance.pk).values_list("contrato_id", flat=True).first()
+        )
+
+
+def regra_alterada(sender, instance, **kwargs):
+    """post_save/post_delete de RegraSLA."""
+    anterior = instance.__dict__.pop("_contrato_anterior_id", None)
+    invalidar_indice(*{instance.contrato_id, anterior})
+
+
+def contrato_removido(sender, instance, **kwargs):
+    """post_delete de ContratoSLA."""
+    invalidar_indice(instance.pk)
+
+
+def condicoes_alteradas(sender, instance, action, reverse, pk_set, **kwargs):
+    """m2m_changed de RegraSLA.categorias/urgencias/servicos."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidar_indice(instance.contrato_id)
+        return
+    # Lado reverso (ex.: categoria.regrasla_set.add(...)): instance é a categoria
+    regras = RegraSLA.objects.all()
+    if pk_set:
+        regras = regras.filter(pk__in=pk_set)
+    else:
+        campo = next(campo for campo in _CONDICOES if getattr(RegraSLA, campo).through is sender)
+        regras = regras.filter(**{campo: instance})
+    invalidar_indice(*set(regras.values_list("contrato_id", flat=True)))
+
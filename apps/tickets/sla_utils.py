@@ -126,16 +126,14 @@ def calcular_prazo_uteis(dt_inicio, horas_prazo, horarios_qs, feriados_qs):
 
 def calcular_sla_ticket(ticket):
     """
-    Versão atualizada de Ticket.calcular_sla() com suporte a horas úteis reais
-    e subtração do tempo pausado.
+    Calcula o SLA do ticket (chamado por Ticket.save) com suporte a horas
+    úteis reais e subtração do tempo pausado.
 
-    Substituir o método calcular_sla() existente no modelo Ticket por:
-
-        from apps.tickets.sla_utils import calcular_sla_ticket
-        def calcular_sla(self):
-            calcular_sla_ticket(self)
+    A regra aplicada é a primeira do contrato, na ordem (ordem, nome), cujas
+    condições casam com o ticket — resolvida pelo índice de sla_index.
     """
     from apps.tickets.models import ContratoSLA, HorarioAtendimento, Feriado, Ticket
+    from apps.tickets.sla_index import regra_para_ticket
 
     if ticket.previsao_manual:
         return
@@ -149,32 +147,33 @@ def calcular_sla_ticket(ticket):
     if not contrato:
         return
 
-    for regra in contrato.regras.filter(ativo=True).order_by('ordem'):
-        if not regra.aplica_ao_ticket(ticket):
-            continue
+    # Regra vencedora via índice compilado do contrato (sem consultas por regra)
+    regra = regra_para_ticket(contrato.pk, ticket)
+    if regra is None:
+        return
 
-        ticket.regra_sla_aplicada = regra
-        ticket.contrato_sla = contrato
+    ticket.regra_sla_aplicada_id = regra.id
+    ticket.contrato_sla = contrato
 
-        # Subtrai o tempo já pausado do início efetivo
-        dt_inicio = ticket.criado_em
-        if ticket.tempo_pausado and ticket.tempo_pausado.total_seconds() > 0:
-            dt_inicio = dt_inicio + ticket.tempo_pausado
+    # Subtrai o tempo já pausado do início efetivo
+    dt_inicio = ticket.criado_em
+    if ticket.tempo_pausado and ticket.tempo_pausado.total_seconds() > 0:
+        dt_inicio = dt_inicio + ticket.tempo_pausado
 
-        prazo_horas = regra.prazo_solucao
+    prazo_horas = regra.prazo_solucao
 
-        if regra.tipo_horario == 'uteis':
-            horarios = HorarioAtendimento.objects.filter(cliente=ticket.cliente, ativo=True)
-            feriados = Feriado.objects.filter(cliente=ticket.cliente)
-            previsao = calcular_prazo_uteis(dt_inicio, prazo_horas, horarios, feriados)
-        else:
-            previsao = dt_inicio + timedelta(hours=prazo_horas)
+    if regra.tipo_horario == 'uteis':
+        horarios = HorarioAtendimento.objects.filter(cliente=ticket.cliente, ativo=True)
+        feriados = Feriado.objects.filter(cliente=ticket.cliente)
+        previsao = calcular_prazo_uteis(dt_inicio, prazo_horas, horarios, feriados)
+    else:
+        previsao = dt_inicio + timedelta(hours=prazo_horas)
 
-        ticket.previsao_solucao = previsao
+    ticket.previsao_solucao = previsao
 
-        Ticket.objects.filter(pk=ticket.pk).update(
-            regra_sla_aplicada=ticket.regra_sla_aplicada,
-            contrato_sla=ticket.contrato_sla,
-            previsao_solucao=ticket.previsao_solucao,
-        )
-        break
\ No newline at end of file
+    Ticket.objects.filter(pk=ticket.pk).update(
+        regra_sla_aplicada_id=ticket.regra_sla_aplicada_id,
+        contrato_sla=ticket.contrato_sla,
+        previsao_solucao=ticket.previsao_solucao,
+    )
+    ticket._guardar_estado(['previsao_solucao'])
\ No newline at end of file
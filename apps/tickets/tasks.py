@@ -178,33 +178,23 @@ def verificar_sla(self):
 
 def _criar_alerta_sla(ticket, tipo, titulo, mensagem):
     """Cria notificação in-app e envia e-mail de alerta de SLA."""
-    from apps.tickets.models import NotificacaoTicket
+    from apps.tickets.notifications import EQUIPE, RESPONSAVEL, Envio, entregar, montar
     from django.core.mail import send_mail
     from django.conf import settings
 
     destinatarios = []
 
-    if ticket.responsavel:
-        NotificacaoTicket.objects.create(
-            usuario=ticket.responsavel,
-            ticket=ticket,
-            tipo=tipo,
-            titulo=titulo,
-            mensagem=mensagem,
-        )
-        if ticket.responsavel.email:
-            destinatarios.append(ticket.responsavel.email)
-
-    if ticket.equipe if hasattr(ticket, 'equipe') else None:
-        for agente in ticket.equipe.agentes.filter(is_active=True).exclude(
-                pk=ticket.responsavel_id if ticket.responsavel else None):
-            NotificacaoTicket.objects.create(
-                usuario=agente,
-                ticket=ticket,
-                tipo=tipo,
-                titulo=titulo,
-                mensagem=mensagem,
-            )
+    # Já estamos no worker: entrega direto, em lote (responsável + equipe).
+    # Falha na notificação in-app não impede o e-mail
+    try:
+        entregar(montar(ticket, [
+            Envio(RESPONSAVEL, tipo, titulo, mensagem),
+            Envio(EQUIPE, tipo, titulo, mensagem),
+        ]))
+    except Exception as e:
+        logger.error(f"[TASK] alerta de SLA do ticket {ticket.pk}: falha nas notificações in-app: {e}")
+    if ticket.responsavel and ticket.responsavel.email:
+        destinatarios.append(ticket.responsavel.email)
 
     # Envia e-mail se houver destinatários e configuração de e-mail
     if destinatarios:
@@ -396,4 +386,88 @@ Equipe de Suporte""",
 
     except Exception as exc:
         logger.error(f"[TASK] enviar_pesquisa_satisfacao falhou: {exc}")
-        raise self.retry(exc=exc, countdown=300)
\ No newline at end of file
+        raise self.retry(exc=exc, countdown=300)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TASK 7 — Arquivar tickets encerrados
+# ─────────────────────────────────────────────────────────────────────────────
+
+@shared_task(name='tickets.arquivar_tickets', bind=True, max_retries=2)
+def arquivar_tickets(self, dias=None):
+    """
+    Move tickets fechados/cancelados há mais de `dias` dias para o arquivo.
+    Roda diariamente via Celery Beat.
+    """
+    try:
+        from apps.tickets.archive import ARCHIVE_AFTER_DAYS, arquivar_tickets as arquivar
+
+        resultado = arquivar(dias=dias or ARCHIVE_AFTER_DAYS)
+        logger.info(f"[TASK] arquivar_tickets: {resultado['arquivados']} tickets arquivados.")
+        return resultado
+    except Exception as exc:
+        logger.error(f"[TASK] arquivar_tickets falhou: {exc}")
+        raise self.retry(exc=exc, countdown=600)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TASK 8 — Ressincronizar carga dos agentes
+# ─────────────────────────────────────────────────────────────────────────────
+
+@shared_task(name='tickets.ressincronizar_cargas', bind=True, max_retries=2)
+def ressincronizar_cargas(self):
+    """
+    Recalcula os contadores de tickets abertos por agente usados na
+    distribuição automática. Roda a cada hora via Celery Beat.
+    """
+    try:
+        from apps.tickets.assignment import ressincronizar_cargas as ressincronizar
+
+        corrigidos = ressincronizar()
+        logger.info(f"[TASK] ressincronizar_cargas: {corrigidos} contadores corrigidos.")
+        return {'corrigidos': corrigidos}
+    except Exception as exc:
+        logger.error(f"[TASK] ressincronizar_cargas falhou: {exc}")
+        raise self.retry(exc=exc, countdown=300)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TASK 9 — Entregar notificações in-app
+# ─────────────────────────────────────────────────────────────────────────────
+
+@shared_task(name='tickets.entregar_notificacoes', bind=True, max_retries=3)
+def entregar_notificacoes(self, dados):
+    """
+    Grava as notificações de um evento de ticket (payload de
+    apps.tickets.notifications.montar). Usada quando
+    TICKET_NOTIFICATIONS_ASYNC está ativo.
+    """
+    try:
+        from apps.tickets.notifications import entregar
+
+        return {'criadas': entregar(dados)}
+    except Exception as exc:
+        logger.error(f"[TASK] entregar_notificacoes falhou: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TASK 10 — Limpar arquivos de anexo órfãos
+# ─────────────────────────────────────────────────────────────────────────────
+
+@shared_task(name='tickets.limpar_blobs_orfaos', bind=True, max_retries=2)
+def limpar_blobs_orfaos(self):
+    """
+    Remove arquivos do armazenamento deduplicado de anexos que ficaram sem
+    ArquivoAnexo (transação revertida depois da gravação). Roda todo dia via
+    Celery Beat.
+    """
+    try:
+        from apps.tickets.attachments import limpar_blobs_orfaos as limpar
+
+        removidos = limpar()
+        logger.info(f"[TASK] limpar_blobs_orfaos: {removidos} arquivos removidos.")
+        return {'removidos': removidos}
+    except Exception as exc:
+        logger.error(f"[TASK] limpar_blobs_orfaos falhou: {exc}")
+        raise self.retry(exc=exc, countdown=600)
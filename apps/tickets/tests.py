@@ -1,3 +1,759 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.ativos.models import Ativo, StatusAtivo
+from apps.ativos.search import AUTOCOMPLETE_LIMIT
+from apps.inventory.models import AgentToken
+from apps.shared.models import Cliente
+
+from .archive import arquivar_lote, arquivar_tickets
+from .assignment import ressincronizar_cargas
+from .attachments import blob_name, criar_anexo, deduplicar_anexo, hash_content, limpar_blobs_orfaos
+from .kanban import build_board, column_page
+from .models import (
+    AcaoTicket, AnexoTicket, ArquivoAnexo, CargaAgente, Categoria, ContratoSLA, Equipe,
+    EstrategiaDistribuicao, HistoricoTicket, NotificacaoTicket, RegraSLA, Status, StatusBase, Ticket,
+    TicketArquivado,
+    TipoHorario, Urgencia,
+)
+from .notifications import EQUIPE, RESPONSAVEL, Envio, entregar, montar
+from .signals import notificar_nova_acao, notificar_ticket_criado
+from .tasks import entregar_notificacoes
+from .sla_index import compilar_indice, regra_para_ticket
+from .timeline import TIMELINE_PAGE_SIZE, timeline_page
+
+User = get_user_model()
+
+
+# ============================================================================
+# FIXTURES / HELPERS
+# ============================================================================
+
+def make_status(cliente, nome, status_base=StatusBase.NOVO, ordem=0):
+    return Status.objects.create(nome=nome, status_base=status_base, cliente=cliente, ordem=ordem)
+
+
+def make_ticket(cliente, status, solicitante=None, **kwargs):
+    kwargs.setdefault("previsao_manual", True)
+    return Ticket.objects.create(
+        cliente=cliente,
+        solicitante=solicitante or cliente,
+        status=status,
+        **kwargs,
+    )
+
+
+def _arquivos(raiz):
+    for pasta, _, nomes in os.walk(raiz):
+        yield from (os.path.join(pasta, nome) for nome in nomes)
+
+
+# ============================================================================
+# KANBAN
+# ============================================================================
+
+class TicketKanbanTest(TestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username="agente", password="pass", is_staff=True)
+        self.novo = make_status(self.agente, "Novo", ordem=1)
+        self.andamento = make_status(self.agente, "Em atendimento", StatusBase.EM_ATENDIMENTO, ordem=2)
+        self.novos = [make_ticket(self.agente, self.novo, assunto=f"Novo {i}") for i in range(5)]
+        self.em_andamento = make_ticket(self.agente, self.andamento, assunto="Andamento")
+        self.client.force_login(self.agente)
+
+    def test_board_counts_and_limits_columns(self):
+        colunas = build_board(Ticket.objects.all(), [self.novo, self.andamento], per_column=2)
+        self.assertEqual([c.total for c in colunas], [5, 1])
+        self.assertEqual([t.pk for t in colunas[0].cards], [self.novos[4].pk, self.novos[3].pk])
+        self.assertTrue(colunas[0].has_more)
+        self.assertFalse(colunas[1].has_more)
+
+    def test_column_pages_follow_cursor(self):
+        vistos, cursor = [], ""
+        while True:
+            tickets, cursor = column_page(Ticket.objects.all(), self.novo.pk, after=cursor, limit=2)
+            vistos.extend(t.pk for t in tickets)
+            if not cursor:
+                break
+        self.assertEqual(vistos, [t.pk for t in reversed(self.novos)])
+
+    def test_list_view_renders_board(self):
+        resp = self.client.get(reverse("tickets:ticket_list"), {"view": "kanban"})
+        self.assertEqual(resp.status_code, 200)
+        colunas = resp.context["kanban_colunas"]
+        self.assertEqual([c.status for c in colunas], [self.novo, self.andamento])
+        self.assertContains(resp, "tk-kanban-card")
+
+    def test_column_endpoint_returns_json_page(self):
+        url = reverse("tickets:ticket_kanban_column", args=[self.novo.pk])
+        primeira = self.client.get(url, {"limit": 3}).json()
+        self.assertEqual([c["id"] for c in primeira["cards"]], [t.pk for t in reversed(self.novos[2:])])
+        segunda = self.client.get(url, {"limit": 3, "after": primeira["next_cursor"]}).json()
+        self.assertEqual([c["id"] for c in segunda["cards"]], [self.novos[1].pk, self.novos[0].pk])
+        self.assertEqual(segunda["next_cursor"], "")
+
+    def test_column_endpoint_is_scoped_to_cliente(self):
+        outro = User.objects.create_user(username="outro", password="pass", is_staff=True)
+        self.client.force_login(outro)
+        resp = self.client.get(reverse("tickets:ticket_kanban_column", args=[self.novo.pk]))
+        self.assertEqual(resp.json()["cards"], [])
+
+
+# ============================================================================
+# TIMELINE
+# ============================================================================
+
+@override_settings(MEDIA_ROOT="/tmp/test-media-tickets")
+class TicketTimelineTest(TestCase):
+    def setUp(self):
+        self.agente = User.objects.create_user(username="agente", password="pass", is_staff=True)
+        self.ticket = make_ticket(self.agente, make_status(self.agente, "Novo"), assunto="Timeline")
+        self.acoes = [
+            AcaoTicket.objects.create(ticket=self.ticket, autor=self.agente, conteudo=f"Ação {i}")
+            for i in range(5)
+        ]
+        self.anexo = AnexoTicket.objects.create(
+            ticket=self.ticket, autor=self.agente, nome_original="log.txt", tamanho=3,
+            tipo_mime="text/plain", arquivo=SimpleUploadedFile("log.txt", b"abc"),
+        )
+        self.historico = HistoricoTicket.objects.create(
+            ticket=self.ticket, usuario=self.agente, campo="status", valor_anterior="Novo", valor_novo="Fechado",
+        )
+        self.client.force_login(self.agente)
+
+    def _feed(self, **kwargs):
+        vistos, cursor = [], ""
+        while True:
+            page = timeline_page(self.ticket, after=cursor, **kwargs)
+            vistos.extend((e.kind, e.obj.pk) for e in page)
+            if not page.has_more:
+                return vistos
+            cursor = page.next_cursor
+
+    def test_feed_merges_sources_newest_first(self):
+        page = timeline_page(self.ticket, limit=3)
+        self.assertEqual(
+            [(e.kind, e.obj.pk) for e in page],
+            [("historico", self.historico.pk), ("anexo", self.anexo.pk), ("acao", self.acoes[4].pk)],
+        )
+        self.assertTrue(page.has_more)
+
+    def test_cursor_walks_whole_feed_once(self):
+        esperado = [("historico", self.historico.pk), ("anexo", self.anexo.pk)]
+        esperado += [("acao", a.pk) for a in reversed(self.acoes)]
+        self.assertEqual(self._feed(limit=2), esperado)
+
+    def test_same_timestamp_is_not_skipped(self):
+        AcaoTicket.objects.filter(ticket=self.ticket).update(criado_em=self.historico.criado_em)
+        AnexoTicket.objects.filter(ticket=self.ticket).update(criado_em=self.historico.criado_em)
+        vistos = self._feed(limit=1)
+        self.assertEqual(len(vistos), 7)
+        self.assertEqual(len(set(vistos)), 7)
+
+    def test_action_attachments_stay_inside_action(self):
+        AnexoTicket.objects.filter(pk=self.anexo.pk).update(acao=self.acoes[0])
+        self.assertNotIn(("anexo", self.anexo.pk), self._feed())
+
+    def test_history_only_for_staff(self):
+        self.assertNotIn(("historico", self.historico.pk), self._feed(staff=False))
+
+    def test_detail_renders_first_page_and_endpoint_continues(self):
+        for i in range(TIMELINE_PAGE_SIZE):
+            AcaoTicket.objects.create(ticket=self.ticket, autor=self.agente, conteudo=f"Extra {i}")
+        resp = self.client.get(reverse("tickets:ticket_detail", args=[self.ticket.pk]))
+        self.assertEqual(resp.status_code, 200)
+        timeline = resp.context["timeline"]
+        self.assertEqual(len(timeline), TIMELINE_PAGE_SIZE)
+        self.assertContains(resp, "btn-timeline-more")
+
+        url = reverse("tickets:ticket_timeline", args=[self.ticket.pk])
+        data = self.client.get(url, {"after": timeline.next_cursor, "limit": 50}).json()
+        self.assertIn("Ação 0", data["html"])
+        self.assertEqual(data["next_cursor"], "")
+
+    def test_endpoint_is_scoped_to_cliente(self):
+        outro = User.objects.create_user(username="outro", password="pass", is_staff=True)
+        self.client.force_login(outro)
+        resp = self.client.get(reverse("tickets:ticket_timeline", args=[self.ticket.pk]))
+        self.assertEqual(resp.status_code, 403)
+
+
+# ============================================================================
+# ANEXOS DEDUPLICADOS
+# ============================================================================
+
+class TicketAttachmentStorageTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.agente = User.objects.create_user(username="agente", password="pass", is_staff=True)
+        status = make_status(self.agente, "Novo")
+        self.ticket = make_ticket(self.agente, status, assunto="Anexos")
+        self.outro_ticket = make_ticket(self.agente, status, assunto="Encaminhado")
+
+    def test_same_content_is_stored_once(self):
+        a = criar_anexo(self.ticket, ContentFile(b"logo", name="logo.png"), self.agente)
+        b = criar_anexo(self.outro_ticket, ContentFile(b"logo", name="assinatura.png"), self.agente)
+        self.assertEqual(a.blob_id, b.blob_id)
+        self.assertEqual(a.arquivo.name, b.arquivo.name)
+        self.assertEqual(ArquivoAnexo.objects.get().referencias, 2)
+        self.assertEqual(b.nome_original, "assinatura.png")
+        self.assertTrue(default_storage.exists(a.arquivo.name))
+
+    def test_different_content_gets_own_blob(self):
+        criar_anexo(self.ticket, ContentFile(b"um", name="a.txt"), self.agente)
+        criar_anexo(self.ticket, ContentFile(b"dois", name="a.txt"), self.agente)
+        self.assertEqual(ArquivoAnexo.objects.count(), 2)
+
+    def test_blob_removed_with_last_reference(self):
+        a = criar_anexo(self.ticket, ContentFile(b"dados", name="x.bin"), self.agente)
+        b = criar_anexo(self.outro_ticket, ContentFile(b"dados", name="x.bin"), self.agente)
+        nome = a.arquivo.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertEqual(ArquivoAnexo.objects.get().referencias, 1)
+        self.assertTrue(default_storage.exists(nome))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            b.delete()
+        self.assertFalse(ArquivoAnexo.objects.exists())
+        self.assertFalse(default_storage.exists(nome))
+
+    def test_upload_view_deduplicates(self):
+        self.client.force_login(self.agente)
+        url = reverse("tickets:adicionar_anexo", args=[self.ticket.pk])
+        self.client.post(url, {"arquivo": [
+            SimpleUploadedFile("a.txt", b"igual", content_type="text/plain"),
+            SimpleUploadedFile("b.txt", b"igual", content_type="text/plain"),
+        ]})
+        anexos = list(self.ticket.anexos.order_by("pk"))
+        self.assertEqual([a.nome_original for a in anexos], ["a.txt", "b.txt"])
+        self.assertEqual(anexos[0].tipo_mime, "text/plain")
+        self.assertEqual(ArquivoAnexo.objects.get().referencias, 2)
+
+    def test_legacy_attachment_is_migrated(self):
+        antigo = AnexoTicket.objects.create(
+            ticket=self.ticket, autor=self.agente, nome_original="log.txt", tamanho=3,
+            tipo_mime="text/plain", arquivo=SimpleUploadedFile("log.txt", b"abc"),
+        )
+        nome_antigo = antigo.arquivo.name
+        novo = criar_anexo(self.outro_ticket, ContentFile(b"abc", name="log.txt"), self.agente)
+
+        self.assertTrue(deduplicar_anexo(antigo))
+        antigo.refresh_from_db()
+        self.assertEqual(antigo.blob_id, novo.blob_id)
+        self.assertEqual(ArquivoAnexo.objects.get().referencias, 2)
+        self.assertFalse(default_storage.exists(nome_antigo))
+
+    def test_never_reuses_file_left_at_blob_name(self):
+        # Arquivo de um blob sendo liberado por outro processo
+        conteudo = ContentFile(b"corrida", name="r.txt")
+        nome_blob = blob_name(hash_content(conteudo)[0], "r.txt")
+        default_storage.save(nome_blob, ContentFile(b"corrida"))
+
+        anexo = criar_anexo(self.ticket, conteudo, self.agente)
+        self.assertNotEqual(anexo.arquivo.name, nome_blob)
+        default_storage.delete(nome_blob)
+        self.assertTrue(default_storage.exists(anexo.arquivo.name))
+
+    def test_failed_transaction_removes_written_file(self):
+        with mock.patch.object(AnexoTicket.objects, "create", side_effect=RuntimeError("falha")):
+            with self.assertRaises(RuntimeError):
+                criar_anexo(self.ticket, ContentFile(b"revertido", name="r.txt"), self.agente)
+        self.assertFalse(ArquivoAnexo.objects.exists())
+        self.assertEqual(list(_arquivos(self.media)), [])
+
+    def test_orphan_sweep_keeps_referenced_and_recent_files(self):
+        anexo = criar_anexo(self.ticket, ContentFile(b"usado", name="u.txt"), self.agente)
+        orfao = default_storage.save("tickets/blobs/aa/bb/orfao.txt", ContentFile(b"x"))
+        self.assertEqual(limpar_blobs_orfaos(), 0)
+        self.assertEqual(limpar_blobs_orfaos(timedelta(0)), 1)
+        self.assertFalse(default_storage.exists(orfao))
+        self.assertTrue(default_storage.exists(anexo.arquivo.name))
+
+
+# ============================================================================
+# ARQUIVO DE TICKETS
+# ============================================================================
+
+class TicketArchiveTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.agente = User.objects.create_user(username="agente", password="pass", is_staff=True)
+        self.aberto = make_status(self.agente, "Aberto")
+        self.fechado = make_status(self.agente, "Fechado", StatusBase.FECHADO)
+        self.antigo = self._fechado_ha(400, assunto="Impressora")
+        self.recente = self._fechado_ha(10, assunto="Recente")
+
+        self.acao = AcaoTicket.objects.create(ticket=self.antigo, autor=self.agente, conteudo="Trocado o toner")
+        self.anexo = criar_anexo(self.antigo, ContentFile(b"log", name="log.txt"), self.agente, acao=self.acao)
+        criar_anexo(self.recente, ContentFile(b"log", name="log.txt"), self.agente)
+        HistoricoTicket.objects.create(
+            ticket=self.antigo, usuario=self.agente, campo="status", valor_anterior="Aberto", valor_novo="Fechado",
+        )
+
+    def _fechado_ha(self, dias, **kwargs):
+        ticket = make_ticket(self.agente, self.fechado, **kwargs)
+        Ticket.objects.filter(pk=ticket.pk).update(fechado_em=timezone.now() - timedelta(days=dias))
+        return ticket
+
+    def test_moves_old_closed_tickets_with_children(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = arquivar_tickets(dias=365)
+        self.assertEqual(resultado["arquivados"], 1)
+        self.assertFalse(Ticket.objects.filter(pk=self.antigo.pk).exists())
+        self.assertTrue(Ticket.objects.filter(pk=self.recente.pk).exists())
+
+        arquivado = TicketArquivado.objects.get(numero=self.antigo.numero)
+        self.assertEqual(arquivado.assunto, "Impressora")
+        self.assertEqual(arquivado.status_base, StatusBase.FECHADO)
+        acao = arquivado.acoes.get()
+        self.assertEqual(acao.conteudo, "Trocado o toner")
+        self.assertEqual(acao.anexos.get().arquivo.name, self.anexo.arquivo.name)
+        self.assertEqual(arquivado.historico.get().valor_novo, "Fechado")
+
+    def test_archived_attachment_keeps_blob_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            arquivar_tickets(dias=365)
+        blob = ArquivoAnexo.objects.get()
+        self.assertEqual(blob.referencias, 2)
+        self.assertTrue(default_storage.exists(blob.arquivo.name))
+
+    def test_batches_and_parent_with_open_child(self):
+        filho = make_ticket(self.agente, self.aberto, ticket_pai=self.antigo)
+        outros = [self._fechado_ha(400) for _ in range(3)]
+        resultado = arquivar_tickets(dias=365, batch_size=2)
+        self.assertEqual(resultado, {"arquivados": 3, "lotes": 2})
+        self.assertTrue(Ticket.objects.filter(pk=self.antigo.pk).exists())
+        self.assertFalse(Ticket.objects.filter(pk__in=[t.pk for t in outros]).exists())
+        self.assertEqual(Ticket.objects.get(pk=filho.pk).ticket_pai_id, self.antigo.pk)
+
+    def test_batch_rechecks_eligibility_under_lock(self):
+        reaberto = self._fechado_ha(400)
+        com_filho = self._fechado_ha(400)
+        ids = [self.antigo.pk, reaberto.pk, com_filho.pk, self.recente.pk]
+        Ticket.objects.filter(pk=reaberto.pk).update(status=self.aberto)
+        make_ticket(self.agente, self.aberto, ticket_pai=com_filho)
+
+        self.assertEqual(arquivar_lote(ids, dias=365), 1)
+        self.assertFalse(Ticket.objects.filter(pk=self.antigo.pk).exists())
+        self.assertEqual(
+            set(Ticket.objects.filter(pk__in=ids).values_list("pk", flat=True)),
+            {reaberto.pk, com_filho.pk, self.recente.pk},
+        )
+
+    def test_archive_views_are_read_only_and_scoped(self):
+        arquivar_tickets(dias=365)
+        arquivado = TicketArquivado.objects.get()
+        self.client.force_login(self.agente)
+
+        resp = self.client.get(reverse("tickets:arquivo_list"), {"q": "impress"})
+        self.assertEqual(list(resp.context["tickets"]), [arquivado])
+        resp = self.client.get(reverse("tickets:arquivo_detail", args=[arquivado.pk]))
+        self.assertContains(resp, "Trocado o toner")
+
+        outro = User.objects.create_user(username="outro", password="pass", is_staff=True)
+        self.client.force_login(outro)
+        self.assertEqual(self.client.get(reverse("tickets:arquivo_detail", args=[arquivado.pk])).status_code, 403)
+        resp = self.client.get(reverse("tickets:arquivo_list"))
+        self.assertEqual(list(resp.context["tickets"]), [])
+
+
+# ============================================================================
+# ÍNDICE DE REGRAS SLA
+# ============================================================================
+
+class RegraSLAIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agente = User.objects.create_user(username="agente", password="pass", is_staff=True)
+        self.status = make_status(self.agente, "Novo")
+        self.rede = Categoria.objects.create(nome="Rede", cliente=self.agente)
+        self.impressora = Categoria.objects.create(nome="Impressora", cliente=self.agente)
+        self.alta = Urgencia.objects.create(nome="Alta", nivel=3, cliente=self.agente)
+        self.contrato = ContratoSLA.objects.create(nome="Padrão", is_padrao=True, cliente=self.agente)
+
+        self.rede_alta = self._regra("Rede alta", 1, 4)
+        self.rede_alta.categorias.add(self.rede)
+        self.rede_alta.urgencias.add(self.alta)
+        self.rede_geral = self._regra("Rede", 2, 24)
+        self.rede_geral.categorias.add(self.rede)
+        self.geral = self._regra("Geral", 3, 72)
+
+    def _regra(self, nome, ordem, prazo):
+        return RegraSLA.objects.create(
+            contrato=self.contrato, nome=nome, ordem=ordem, prazo_solucao=prazo,
+            tipo_horario=TipoHorario.HORAS_CORRIDAS,
+        )
+
+    def _ticket(self, **kwargs):
+        return Ticket(cliente=self.agente, solicitante=self.agente, status=self.status, **kwargs)
+
+    def test_first_matching_rule_wins(self):
+        casos = [
+            (dict(categoria=self.rede, urgencia=self.alta), self.rede_alta),
+            (dict(categoria=self.rede), self.rede_geral),
+            (dict(categoria=self.impressora, urgencia=self.alta), self.geral),
+            ({}, self.geral),
+        ]
+        for kwargs, esperada in casos:
+            ticket = self._ticket(**kwargs)
+            self.assertEqual(regra_para_ticket(self.contrato.pk, ticket).id, esperada.pk)
+            self.assertTrue(esperada.aplica_ao_ticket(ticket))
+
+    def test_lookup_is_cached(self):
+        regra_para_ticket(self.contrato.pk, self._ticket(categoria=self.rede))
+        with self.assertNumQueries(0):
+            regra = regra_para_ticket(self.contrato.pk, self._ticket(categoria=self.rede, urgencia=self.alta))
+        self.assertEqual(regra.id, self.rede_alta.pk)
+
+    def test_linear_fallback_matches_precomputed(self):
+        indice = compilar_indice(self.contrato.pk)
+        linear = compilar_indice(self.contrato.pk)
+        linear.combinacoes = None
+        for categoria in (self.rede.pk, self.impressora.pk, None):
+            for urgencia in (self.alta.pk, None):
+                self.assertEqual(linear.resolve(categoria, urgencia, None), indice.resolve(categoria, urgencia, None))
+
+    def test_rule_and_m2m_changes_invalidate(self):
+        ticket = self._ticket(categoria=self.impressora)
+        self.assertEqual(regra_para_ticket(self.contrato.pk, ticket).id, self.geral.pk)
+
+        self.rede_geral.categorias.add(self.impressora)
+        self.assertEqual(regra_para_ticket(self.contrato.pk, ticket).id, self.rede_geral.pk)
+
+        self.impressora.regrasla_set.remove(self.rede_geral)
+        self.assertEqual(regra_para_ticket(self.contrato.pk, ticket).id, self.geral.pk)
+
+        self.geral.ativo = False
+        self.geral.save()
+        self.assertIsNone(regra_para_ticket(self.contrato.pk, ticket))
+
+    def test_moving_rule_to_other_contract_invalidates_both(self):
+        outro = ContratoSLA.objects.create(nome="Outro", cliente=self.agente)
+        ticket = self._ticket()
+        self.assertEqual(regra_para_ticket(self.contrato.pk, ticket).id, self.geral.pk)
+        self.assertIsNone(regra_para_ticket(outro.pk, ticket))
+
+        self.geral.contrato = outro
+        self.geral.save()
+        self.assertIsNone(regra_para_ticket(self.contrato.pk, ticket))
+        self.assertEqual(regra_para_ticket(outro.pk, ticket).id, self.geral.pk)
+
+    def test_ticket_save_applies_rule(self):
+        ticket = make_ticket(self.agente, self.status, categoria=self.rede, previsao_manual=False)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.regra_sla_aplicada_id, self.rede_geral.pk)
+        self.assertEqual(ticket.contrato_sla_id, self.contrato.pk)
+        self.assertEqual(ticket.previsao_solucao, ticket.criado_em + timedelta(hours=24))
+
+
+# ============================================================================
+# DISTRIBUIÇÃO / CARGA DOS AGENTES
+# ============================================================================
+
+class CargaAgenteTest(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user(username="cliente", password="pass", is_staff=True)
+        self.ana = User.objects.create_user(username="ana", password="pass", is_staff=True)
+        self.bia = User.objects.create_user(username="bia", password="pass", is_staff=True)
+        self.novo = make_status(self.cliente, "Novo", ordem=1)
+        self.fechado = make_status(self.cliente, "Fechado", StatusBase.FECHADO, ordem=9)
+        self.equipe = Equipe.objects.create(nome="Suporte", cliente=self.cliente)
+        self.equipe.agentes.add(self.ana, self.bia)
+
+    def carga(self, agente):
+        return CargaAgente.objects.filter(agente=agente).values_list("tickets_abertos", flat=True).first() or 0
+
+    def test_counters_follow_assignment_and_status(self):
+        ticket = make_ticket(self.cliente, self.novo, responsavel=self.ana)
+        make_ticket(self.cliente, self.novo, responsavel=self.ana)
+        self.assertEqual(self.carga(self.ana), 2)
+
+        ticket.responsavel = self.bia
+        ticket.save()
+        self.assertEqual((self.carga(self.ana), self.carga(self.bia)), (1, 1))
+
+        ticket.status = self.fechado
+        ticket.save()
+        self.assertEqual(self.carga(self.bia), 0)
+
+        ticket.status = self.novo
+        ticket.save()
+        self.assertEqual(self.carga(self.bia), 1)
+
+    def test_least_loaded_reads_counters(self):
+        make_ticket(self.cliente, self.novo, responsavel=self.ana)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.equipe.proximo_agente(), self.bia)
+
+    def test_round_robin_cycles_through_agents(self):
+        self.equipe.estrategia_distribuicao = EstrategiaDistribuicao.RODIZIO
+        self.equipe.save()
+        escolhidos = [self.equipe.proximo_agente() for _ in range(3)]
+        self.assertEqual(escolhidos, [self.ana, self.bia, self.ana])
+
+    def test_resync_fixes_drift(self):
+        ticket = make_ticket(self.cliente, self.novo, responsavel=self.ana)
+        Ticket.objects.filter(pk=ticket.pk).update(responsavel=self.bia)
+        CargaAgente.objects.create(agente=self.cliente, tickets_abertos=5)
+
+        self.assertEqual(ressincronizar_cargas(), 3)
+        self.assertEqual((self.carga(self.ana), self.carga(self.bia), self.carga(self.cliente)), (0, 1, 0))
+        self.assertEqual(ressincronizar_cargas(), 0)
+
+
+# ============================================================================
+# NOTIFICAÇÕES
+# ============================================================================
+
+class TicketNotificationFanOutTest(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user(username="cliente", password="pass", is_staff=True)
+        self.solicitante = User.objects.create_user(username="solicitante", password="pass")
+        self.agentes = [
+            User.objects.create_user(username=f"agente{i}", password="pass", is_staff=True) for i in range(4)
+        ]
+        inativo = User.objects.create_user(username="inativo", password="pass", is_staff=True, is_active=False)
+        self.equipe = Equipe.objects.create(nome="Suporte", cliente=self.cliente)
+        self.equipe.agentes.add(*self.agentes, inativo)
+        self.ticket = make_ticket(
+            self.cliente, make_status(self.cliente, "Novo"), solicitante=self.solicitante,
+            responsavel=self.agentes[0], equipe=self.equipe,
+        )
+        NotificacaoTicket.objects.all().delete()
+
+    def test_delivery_is_deferred_until_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notificar_ticket_criado(self.ticket)
+        self.assertFalse(NotificacaoTicket.objects.exists())
+
+        callbacks[0]()
+        tipos = dict(NotificacaoTicket.objects.values_list("usuario__username", "tipo"))
+        self.assertEqual(tipos, {
+            "agente0": "atribuido", "agente1": "ticket_criado",
+            "agente2": "ticket_criado", "agente3": "ticket_criado",
+        })
+
+    def test_fan_out_uses_one_select_and_one_insert(self):
+        dados = montar(self.ticket, [
+            Envio(RESPONSAVEL, "sla_vencido", "SLA"),
+            Envio(EQUIPE, "sla_vencido", "SLA"),
+        ])
+        with self.assertNumQueries(2):
+            self.assertEqual(entregar(dados), 4)
+
+    def test_action_author_is_excluded(self):
+        acao = AcaoTicket.objects.create(ticket=self.ticket, tipo="publica", autor=self.agentes[0], conteudo="Oi")
+        with self.captureOnCommitCallbacks(execute=True):
+            notificar_nova_acao(acao)
+        self.assertEqual(
+            list(NotificacaoTicket.objects.values_list("usuario", flat=True)), [self.solicitante.pk],
+        )
+
+    def test_task_retries_when_delivery_fails(self):
+        dados = montar(self.ticket, [Envio(RESPONSAVEL, "sla_vencido", "SLA")])
+        with mock.patch("apps.tickets.notifications.resolver_destinatarios", side_effect=RuntimeError("banco")), \
+                mock.patch.object(entregar_notificacoes, "retry", return_value=KeyError("retry")) as retry:
+            with self.assertRaises(KeyError):
+                entregar_notificacoes(dados)
+        retry.assert_called_once()
+
+    def test_sync_delivery_after_commit_swallows_errors(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notificar_ticket_criado(self.ticket)
+        with mock.patch("apps.tickets.notifications.resolver_destinatarios", side_effect=RuntimeError("banco")):
+            callbacks[0]()
+        self.assertFalse(NotificacaoTicket.objects.exists())
+
+
+# ============================================================================
+# RASTREAMENTO DE ALTERAÇÕES
+# ============================================================================
+
+class TicketChangeTrackingTest(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user(username="cliente", password="pass", is_staff=True)
+        self.novo = make_status(self.cliente, "Novo", ordem=1)
+        self.resolvido = make_status(self.cliente, "Resolvido", StatusBase.RESOLVIDO, ordem=2)
+        self.pk = make_ticket(self.cliente, self.novo, assunto="Original").pk
+
+    def test_save_of_loaded_ticket_does_not_refetch(self):
+        ticket = Ticket.objects.select_related("status").get(pk=self.pk)
+        ticket.assunto = "Alterado"
+        self.assertEqual(ticket.campos_alterados(), {"assunto"})
+        with CaptureQueriesContext(connection) as ctx:
+            ticket.save()
+        releituras = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "tickets_ticket"')]
+        self.assertEqual(releituras, [])
+        self.assertEqual(ticket.campos_alterados(), set())
+        self.assertEqual(ticket._estado_anterior["assunto"], "Original")
+
+    def test_status_transition_uses_snapshot(self):
+        ticket = Ticket.objects.get(pk=self.pk)
+        ticket.status = self.resolvido
+        anterior = ticket.estado_anterior()
+        self.assertEqual((anterior["status_id"], anterior["status_base"]), (self.novo.pk, StatusBase.NOVO))
+        ticket.save(update_fields=["status", "resolvido_em"])
+        self.assertIsNotNone(Ticket.objects.get(pk=self.pk).resolvido_em)
+        self.assertEqual(ticket.estado_anterior()["status_base"], StatusBase.RESOLVIDO)
+
+    def test_deferred_load_falls_back_to_one_query(self):
+        ticket = Ticket.objects.only("pk", "status").select_related("status").get(pk=self.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(ticket.estado_anterior()["assunto"], "Original")
+
+    def test_refresh_from_db_takes_new_snapshot(self):
+        ticket = Ticket.objects.get(pk=self.pk)
+        Ticket.objects.filter(pk=self.pk).update(assunto="Alterado fora", status=self.resolvido)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.campos_alterados(), set())
+        self.assertEqual(ticket.estado_anterior()["assunto"], "Alterado fora")
+
+        Ticket.objects.filter(pk=self.pk).update(assunto="De novo")
+        ticket.refresh_from_db(fields=["assunto"])
+        self.assertEqual(ticket.campos_alterados(), set())
+        self.assertEqual(ticket.estado_anterior()["status_id"], self.resolvido.pk)
+
+
+# ============================================================================
+# API DO AGENTE (SINCRONIZAÇÃO INCREMENTAL)
+# ============================================================================
+
+class AgentTicketSyncAPITest(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user(username="cliente", password="pass", is_staff=True)
+        self.solicitante = User.objects.create_user(
+            username="solicitante", password="pass", email="user@empresa.com",
+        )
+        raw = AgentToken.generate_token()
+        AgentToken.objects.create(
+            token=raw, token_hash=AgentToken.hash_token(raw), created_by=self.cliente,
+            is_active=True, expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AgentToken.hash_token(raw)}"}
+        self.novo = make_status(self.cliente, "Novo", ordem=1)
+        self.andamento = make_status(self.cliente, "Em atendimento", StatusBase.EM_ATENDIMENTO, ordem=2)
+        self.tickets = [
+            make_ticket(self.cliente, self.novo, solicitante=self.solicitante, assunto=f"T{i}") for i in range(3)
+        ]
+        self.list_url = reverse("tickets:agent_ticket_list")
+        self.params = {"email": "user@empresa.com"}
+
+    def test_list_etag_and_incremental_cursor(self):
+        resposta = self.client.get(self.list_url, self.params, **self.auth)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()["tickets"]), 3)
+        etag, cursor = resposta["ETag"], resposta.json()["cursor"]
+
+        resposta = self.client.get(self.list_url, self.params, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(resposta.status_code, 304)
+
+        alterado = Ticket.objects.get(pk=self.tickets[0].pk)
+        alterado.status = self.andamento
+        alterado.save(update_fields=["status"])
+
+        resposta = self.client.get(
+            self.list_url, {**self.params, "updated_since": cursor}, HTTP_IF_NONE_MATCH=etag, **self.auth,
+        )
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertTrue(dados["incremental"])
+        enviados = {t["id"]: t for t in dados["tickets"]}
+        # Cursor inclusivo: o ticket que definiu o cursor volta, os mais antigos não
+        self.assertEqual(set(enviados), {alterado.pk, self.tickets[-1].pk})
+        self.assertEqual(enviados[alterado.pk]["status"], "Em atendimento")
+        self.assertEqual(sorted(dados["ids"]), sorted(t.pk for t in self.tickets))
+
+    def test_detail_returns_only_new_actions(self):
+        ticket = self.tickets[0]
+        url = reverse("tickets:agent_ticket_detail", args=[ticket.pk])
+        primeira = AcaoTicket.objects.create(ticket=ticket, tipo="publica", autor=self.cliente, conteudo="1")
+
+        dados = self.client.get(url, **self.auth).json()
+        self.assertEqual(dados["ultima_acao_id"], primeira.pk)
+        etag = self.client.get(url, **self.auth)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth).status_code, 304)
+
+        segunda = AcaoTicket.objects.create(ticket=ticket, tipo="publica", autor=self.cliente, conteudo="2")
+        resposta = self.client.get(url, {"acoes_apos": primeira.pk}, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([a["id"] for a in resposta.json()["historico"]], [segunda.pk])
+
+
+# ============================================================================
+# AUTOCOMPLETE DE ATIVOS
+# ============================================================================
+
+class TicketAssetAutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Cliente.objects.create(nome="Empresa", email="ti@empresa.com")
+        outra = Cliente.objects.create(nome="Outra", email="ti@outra.com")
+        self.agente = User.objects.create_user(
+            username="agente", password="pass", is_staff=True, cliente=self.empresa,
+        )
+        status = StatusAtivo.objects.create(nome="Em uso", cliente=self.empresa)
+        self.ativos = [
+            Ativo.objects.create(nome=f"Notebook {i}", etiqueta=f"NB-{i:03d}", status=status, cliente=self.empresa)
+            for i in range(AUTOCOMPLETE_LIMIT + 5)
+        ]
+        Ativo.objects.create(
+            nome="Notebook externo", etiqueta="NB-X", status=StatusAtivo.objects.create(nome="Uso", cliente=outra),
+            cliente=outra,
+        )
+        self.ticket = make_ticket(self.agente, make_status(self.agente, "Novo"))
+        self.ticket.ativos.add(self.ativos[0])
+        self.url = reverse("tickets:buscar_ativos_json", args=[self.ticket.pk])
+        self.client.force_login(self.agente)
+
+    def test_results_are_tenant_scoped_limited_and_exclude_linked(self):
+        dados = self.client.get(self.url, {"q": "nb"}).json()
+        etiquetas = [a["etiqueta"] for a in dados["ativos"]]
+        self.assertEqual(len(etiquetas), AUTOCOMPLETE_LIMIT)
+        self.assertNotIn("NB-000", etiquetas)
+        self.assertNotIn("NB-X", etiquetas)
+        self.assertEqual(etiquetas[0], "NB-001")
+
+    def test_results_are_cached_until_an_asset_changes(self):
+        self.client.get(self.url, {"q": "notebook 1"})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {"q": "notebook 1"})
+        self.assertFalse([q for q in ctx.captured_queries if "ativos_ativo" in q["sql"] and "LIKE" in q["sql"]])
+
+        self.ativos[1].nome = "Desktop 1"
+        self.ativos[1].save()
+        dados = self.client.get(self.url, {"q": "notebook 1"}).json()
+        self.assertNotIn(self.ativos[1].pk, [a["id"] for a in dados["ativos"]])
+
+    def test_other_tenant_cannot_search_through_the_ticket(self):
+        outra = Cliente.objects.get(nome="Outra")
+        intruso = User.objects.create_user(username="intruso", password="pass", is_staff=True, cliente=outra)
+        self.client.force_login(intruso)
+        resposta = self.client.get(self.url, {"q": "nb"})
+        self.assertEqual(resposta.status_code, 403)
+        self.assertNotIn(b"NB-001", resposta.content)
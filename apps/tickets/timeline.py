@@ -0,0 +1,136 @@
+"""
+Timeline paginada do ticket.
+
+TicketDetailView fazia prefetch de todas as AcaoTicket, AnexoTicket e
+HistoricoTicket do ticket, então tickets antigos com centenas de
+interações abriam devagar e ocupavam muita memória. Aqui ações, anexos
+avulsos (sem ação — os da ação aparecem dentro dela) e histórico viram um
+único feed em ordem decrescente, paginado por cursor:
+
+- ``timeline_page`` busca no máximo ``limit + 1`` linhas de cada fonte
+  depois do cursor e intercala em Python — três consultas limitadas (mais
+  o prefetch dos anexos das ações da página), independente do tamanho do
+  ticket;
+- a ordem é (criado_em DESC, fonte, id DESC), coberta pelos índices
+  (ticket, criado_em) das três tabelas;
+- a página mais recente é renderizada no detalhe; as seguintes vêm de
+  TicketTimelineView (JSON com o HTML dos itens e o próximo cursor).
+
+O histórico de alterações só entra no feed de usuários staff (é o único
+público que tem o filtro para exibi-lo).
+"""
+import base64
+import heapq
+from dataclasses import dataclass, field
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import AcaoTicket, AnexoTicket, HistoricoTicket
+
+TIMELINE_PAGE_SIZE = 20
+TIMELINE_MAX_PAGE_SIZE = 100
+
+KIND_ACAO = "acao"
+KIND_ANEXO = "anexo"
+KIND_HISTORICO = "historico"
+# Desempate entre fontes com o mesmo criado_em (menor vem primeiro)
+_KIND_RANK = {KIND_ACAO: 0, KIND_ANEXO: 1, KIND_HISTORICO: 2}
+
+
+@dataclass
+class TimelineEntry:
+    kind: str
+    obj: object
+
+    @property
+    def criado_em(self):
+        return self.obj.criado_em
+
+    @property
+    def sort_key(self):
+        # heapq.merge ordena crescente: inverte data e id para obter DESC
+        return (-self.obj.criado_em.timestamp(), _KIND_RANK[self.kind], -self.obj.pk)
+
+
+@dataclass
+class TimelinePage:
+    entries: list = field(default_factory=list)
+    next_cursor: str = ""
+
+    @property
+    def has_more(self) -> bool:
+        return bool(self.next_cursor)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# ============================================================================
+# CURSOR
+# ============================================================================
+
+def encode_cursor(entry: TimelineEntry) -> str:
+    raw = f"{entry.criado_em.isoformat()}|{entry.kind}|{entry.obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Retorna (criado_em, kind, id) ou None se o cursor for inválido."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        criado_em_raw, kind, pk_raw = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 2)
+        criado_em = parse_datetime(criado_em_raw)
+        if criado_em is None or kind not in _KIND_RANK:
+            return None
+        return criado_em, kind, int(pk_raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after(kind: str, cursor) -> Q:
+    """Linhas da fonte ``kind`` que vêm depois do cursor na ordem do feed."""
+    criado_em, cursor_kind, pk = cursor
+    rank, cursor_rank = _KIND_RANK[kind], _KIND_RANK[cursor_kind]
+    if rank < cursor_rank:
+        return Q(criado_em__lt=criado_em)
+    if rank > cursor_rank:
+        return Q(criado_em__lte=criado_em)
+    return Q(criado_em__lt=criado_em) | Q(criado_em=criado_em, id__lt=pk)
+
+
+# ============================================================================
+# FEED
+# ============================================================================
+
+def _sources(ticket, staff: bool) -> dict:
+    sources = {
+        KIND_ACAO: AcaoTicket.objects.filter(ticket=ticket).select_related("autor").prefetch_related("anexos"),
+        KIND_ANEXO: AnexoTicket.objects.filter(ticket=ticket, acao__isnull=True).select_related("autor"),
+    }
+    if staff:
+        sources[KIND_HISTORICO] = HistoricoTicket.objects.filter(ticket=ticket).select_related("usuario")
+    return sources
+
+
+def timeline_page(ticket, staff: bool = True, after: str = "", limit: int = TIMELINE_PAGE_SIZE) -> TimelinePage:
+    """Página do feed do ticket depois do cursor ``after`` (mais recentes primeiro)."""
+    limit = max(1, min(limit, TIMELINE_MAX_PAGE_SIZE))
+    cursor = decode_cursor(after)
+
+    streams = []
+    for kind, queryset in _sources(ticket, staff).items():
+        if cursor:
+            queryset = queryset.filter(_after(kind, cursor))
+        rows = queryset.order_by("-criado_em", "-id")[:limit + 1]
+        streams.append([TimelineEntry(kind, row) for row in rows])
+
+    merged = list(heapq.merge(*streams, key=lambda entry: entry.sort_key))
+    entries = merged[:limit]
+    next_cursor = encode_cursor(entries[-1]) if len(merged) > limit else ""
+    return TimelinePage(entries=entries, next_cursor=next_cursor)
@@ -9,8 +9,12 @@ urlpatterns = [
 
     # ==================== TICKETS ====================
     path('tickets/', views.TicketListView.as_view(), name='ticket_list'),
+    path('tickets/kanban/<int:status_id>/', views.TicketKanbanColumnView.as_view(), name='ticket_kanban_column'),
+    path('tickets/arquivo/', views.TicketArquivadoListView.as_view(), name='arquivo_list'),
+    path('tickets/arquivo/<int:pk>/', views.TicketArquivadoDetailView.as_view(), name='arquivo_detail'),
     path('tickets/novo/', views.TicketCreateView.as_view(), name='ticket_create'),
     path('tickets/<int:pk>/', views.TicketDetailView.as_view(), name='ticket_detail'),
+    path('tickets/<int:pk>/timeline/', views.TicketTimelineView.as_view(), name='ticket_timeline'),
     path('tickets/<int:pk>/editar/', views.TicketUpdateView.as_view(), name='ticket_update'),
     path('tickets/<int:pk>/excluir/', views.TicketDeleteView.as_view(), name='ticket_delete'),
 
@@ -2,12 +2,13 @@ import csv
 
 from django.db.models.functions import TruncDate
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from django.http import JsonResponse, HttpResponse, FileResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, FileResponse
 from django.db.models import Q, Count, Avg, F, ExpressionWrapper, DurationField
 from django.utils import timezone
 from django.contrib import messages
@@ -24,12 +25,12 @@ import zipfile
 import io
 
 from .models import (
-    Ticket, AcaoTicket, AnexoTicket, HistoricoTicket,
+    Ticket, AcaoTicket, HistoricoTicket,
     Categoria, Urgencia, Status, Justificativa, Servico,
     ContratoSLA, RegraSLA, StatusBase, PesquisaSatisfacao,
     CampoAdicional, RegraExibicaoCampo,
     Gatilho, Macro, CategoriaUrgencia, ConfiguracaoEmail, Feriado, HorarioAtendimento, TemplateResposta,
-    NotificacaoTicket, Equipe
+    NotificacaoTicket, Equipe, TicketArquivado, TipoAcao
 )
 from .forms import (
     TicketForm, TicketFiltroForm, AcaoTicketForm, AnexoTicketForm,
@@ -40,6 +41,10 @@ from .forms import (
     GatilhoForm, MacroForm, ConfiguracaoEmailForm, FeriadoForm, HorarioAtendimentoForm, TemplateRespostaForm, EquipeForm
 )
 from apps.inventory.models import AgentTokenUsage
+from . import agent_sync
+from .attachments import criar_anexo
+from .kanban import KANBAN_CARDS_PER_COLUMN, build_board, card_payload, column_page
+from .timeline import TIMELINE_PAGE_SIZE, timeline_page
 
 
 # ==================== MIXINS ====================
@@ -264,15 +269,51 @@ class TicketListView(LoginRequiredMixin, ClienteQuerySetMixin, ListView):
 
         return queryset
 
+    def get_paginate_by(self, queryset):
+        # O kanban pagina por coluna (apps.tickets.kanban)
+        if self.request.GET.get('view') == 'kanban':
+            return None
+        return super().get_paginate_by(queryset)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filtro_form'] = TicketFiltroForm(self.request.GET, usuario=self.request.user)
 
         # Visualização (lista ou kanban)
         context['visualizacao'] = self.request.GET.get('view', 'lista')
+        if context['visualizacao'] == 'kanban':
+            context['kanban_colunas'] = build_board(self.object_list, self._kanban_status())
 
         return context
 
+    def _kanban_status(self):
+        """Colunas do quadro: status ativos do cliente, na ordem configurada."""
+        statuses = Status.objects.filter(ativo=True)
+        if not self.request.user.is_superuser:
+            statuses = statuses.filter(cliente=self.request.user)
+        return statuses.order_by('ordem', 'nome')
+
+
+class TicketKanbanColumnView(TicketListView):
+    """
+    Próxima página de uma coluna do kanban (JSON), a partir do cursor ``after``.
+    Usa os mesmos filtros e o mesmo escopo de cliente da listagem.
+    """
+
+    def get(self, request, status_id):
+        try:
+            limit = int(request.GET.get('limit', KANBAN_CARDS_PER_COLUMN))
+        except ValueError:
+            limit = KANBAN_CARDS_PER_COLUMN
+        tickets, next_cursor = column_page(
+            self.get_queryset(), status_id, after=request.GET.get('after', ''), limit=limit,
+        )
+        return JsonResponse({
+            'status_id': status_id,
+            'cards': [card_payload(t) for t in tickets],
+            'next_cursor': next_cursor,
+        })
+
 
 class TicketDetailView(LoginRequiredMixin, ClienteObjectMixin, DetailView):
     """Detalhes do ticket"""
@@ -287,9 +328,6 @@ class TicketDetailView(LoginRequiredMixin, ClienteObjectMixin, DetailView):
             'regra_sla_aplicada', 'ticket_pai',
             'machine',
         ).prefetch_related(
-            'acoes__autor',
-            'anexos',
-            'historico__usuario',
             'tickets_filhos',
             'tickets_mesclados',
             'tickets_relacionados'
@@ -307,14 +345,12 @@ class TicketDetailView(LoginRequiredMixin, ClienteObjectMixin, DetailView):
         )
         context['alterar_responsavel_form'] = AlterarResponsavelForm()
 
-        # Ações do ticket (mais nova primeiro)
-        context['acoes'] = self.object.acoes.all().order_by('-criado_em')
-
-        # Anexos
-        context['anexos'] = self.object.anexos.all().order_by('-criado_em')
+        # Timeline (ações, anexos e histórico): só a página mais recente;
+        # as demais são carregadas sob demanda por TicketTimelineView
+        context['timeline'] = timeline_page(self.object, staff=self.request.user.is_staff)
 
-        # Histórico
-        context['historico'] = self.object.historico.all().order_by('-criado_em')[:20]
+        # Anexos mais recentes (atalho no topo; a lista completa está na timeline)
+        context['anexos'] = self.object.anexos.order_by('-criado_em')[:10]
 
         # Assinatura do agente (para o editor Quill)
         assinatura = ''
@@ -349,6 +385,79 @@ class TicketDetailView(LoginRequiredMixin, ClienteObjectMixin, DetailView):
         return context
 
 
+class TicketTimelineView(TicketDetailView):
+    """
+    Próxima página da timeline do ticket (JSON), a partir do cursor ``after``.
+    Devolve o HTML dos itens (mesmo partial do detalhe) e o próximo cursor.
+    """
+
+    def get_queryset(self):
+        return Ticket.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        try:
+            limit = int(request.GET.get('limit', TIMELINE_PAGE_SIZE))
+        except ValueError:
+            limit = TIMELINE_PAGE_SIZE
+        page = timeline_page(
+            self.object, staff=request.user.is_staff,
+            after=request.GET.get('after', ''), limit=limit,
+        )
+        html = render_to_string('tickets/_timeline_items.html', {
+            'ticket': self.object, 'timeline': page,
+        }, request=request)
+        return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
+
+
+# ==================== ARQUIVO ====================
+
+class TicketArquivadoListView(LoginRequiredMixin, ClienteQuerySetMixin, ListView):
+    """Busca nos tickets arquivados (somente leitura)"""
+    model = TicketArquivado
+    template_name = 'tickets/arquivo_list.html'
+    context_object_name = 'tickets'
+    paginate_by = 25
+
+    def get_queryset(self):
+        queryset = super().get_queryset().only(
+            'id', 'numero', 'assunto', 'solicitante_nome', 'responsavel_nome',
+            'status_nome', 'categoria_nome', 'criado_em', 'fechado_em',
+        )
+        busca = self.request.GET.get('q', '').strip()
+        if busca:
+            queryset = queryset.filter(
+                Q(numero__icontains=busca) |
+                Q(assunto__icontains=busca) |
+                Q(solicitante_nome__icontains=busca) |
+                Q(solicitante_email__icontains=busca)
+            )
+        return queryset.order_by('-fechado_em', '-id')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['busca'] = self.request.GET.get('q', '').strip()
+        return context
+
+
+class TicketArquivadoDetailView(LoginRequiredMixin, ClienteObjectMixin, DetailView):
+    """Detalhe de um ticket arquivado (somente leitura)"""
+    model = TicketArquivado
+    template_name = 'tickets/arquivo_detail.html'
+    context_object_name = 'ticket'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        acoes = self.object.acoes.prefetch_related('anexos').order_by('-criado_em')
+        if not self.request.user.is_staff:
+            acoes = acoes.filter(tipo=TipoAcao.PUBLICA)
+        context['acoes'] = acoes
+        context['anexos'] = self.object.anexos.filter(acao__isnull=True).order_by('-criado_em')
+        if self.request.user.is_staff:
+            context['historico'] = self.object.historico.order_by('-criado_em')
+        return context
+
+
 # ==================== CRIAÇÃO E EDIÇÃO ====================
 
 class TicketCreateView(LoginRequiredMixin, CreateView):
@@ -424,8 +533,8 @@ class TicketUpdateView(LoginRequiredMixin, ClienteObjectMixin, UpdateView):
         return kwargs
 
     def form_valid(self, form):
-        # Rastreia alterações
-        original = Ticket.objects.get(pk=self.object.pk)
+        # Rastreia alterações: valores do banco guardados ao carregar o ticket
+        original = self.object.estado_anterior()
 
         response = super().form_valid(form)
 
@@ -436,17 +545,21 @@ class TicketUpdateView(LoginRequiredMixin, ClienteObjectMixin, UpdateView):
         ]
 
         for campo in campos_rastreados:
-            valor_original = getattr(original, campo)
+            field = Ticket._meta.get_field(campo)
+            valor_original = original[field.attname]
+            if valor_original == getattr(self.object, field.attname):
+                continue
             valor_novo = getattr(self.object, campo)
+            if field.is_relation and valor_original:
+                valor_original = field.related_model._base_manager.filter(pk=valor_original).first()
 
-            if valor_original != valor_novo:
-                HistoricoTicket.objects.create(
-                    ticket=self.object,
-                    usuario=self.request.user,
-                    campo=campo,
-                    valor_anterior=str(valor_original) if valor_original else '',
-                    valor_novo=str(valor_novo) if valor_novo else ''
-                )
+            HistoricoTicket.objects.create(
+                ticket=self.object,
+                usuario=self.request.user,
+                campo=campo,
+                valor_anterior=str(valor_original) if valor_original else '',
+                valor_novo=str(valor_novo) if valor_novo else ''
+            )
 
         messages.success(self.request, 'Ticket atualizado com sucesso!')
         return response
@@ -567,14 +680,8 @@ def adicionar_anexo(request, pk):
 
     if request.method == 'POST' and request.FILES.get('arquivo'):
         for arquivo in request.FILES.getlist('arquivo'):
-            AnexoTicket.objects.create(
-                ticket=ticket,
-                arquivo=arquivo,
-                nome_original=arquivo.name,
-                tamanho=arquivo.size,
-                tipo_mime=arquivo.content_type,
-                autor=request.user
-            )
+            criar_anexo(ticket, arquivo, request.user, nome_original=arquivo.name,
+                        tipo_mime=arquivo.content_type)
 
         messages.success(request, 'Anexo(s) adicionado(s) com sucesso!')
 
@@ -828,14 +935,8 @@ def adicionar_anexo(request, pk):
 
     if request.method == 'POST' and request.FILES.get('arquivo'):
         for arquivo in request.FILES.getlist('arquivo'):
-            AnexoTicket.objects.create(
-                ticket=ticket,
-                arquivo=arquivo,
-                nome_original=arquivo.name,
-                tamanho=arquivo.size,
-                tipo_mime=arquivo.content_type,
-                autor=request.user
-            )
+            criar_anexo(ticket, arquivo, request.user, nome_original=arquivo.name,
+                        tipo_mime=arquivo.content_type)
 
         messages.success(request, 'Anexo(s) adicionado(s) com sucesso!')
 
@@ -969,39 +1070,29 @@ def gerenciar_ativos_ticket(request, pk):
 
 @login_required
 def buscar_ativos_json(request, pk):
-    """Retorna JSON com ativos disponíveis para vincular ao ticket (para autocomplete)"""
-    from django.http import JsonResponse
+    """
+    Retorna JSON com ativos disponíveis para vincular ao ticket (para autocomplete).
+    Busca indexada, limitada e em cache por cliente — ver apps/ativos/search.py.
+    """
+    ticket = get_object_or_404(Ticket.objects.select_related('cliente'), pk=pk)
 
-    ticket = get_object_or_404(Ticket, pk=pk)
-    q = request.GET.get('q', '').strip()
+    if not request.user.is_superuser:
+        if ticket.cliente != (request.user if request.user.is_staff else request.user):
+            raise PermissionDenied()
 
-    try:
-        from apps.ativos.models import Ativo
-        ativos = Ativo.objects.filter(cliente=ticket.cliente)
-
-        if q:
-            ativos = ativos.filter(
-                Q(nome__icontains=q) |
-                Q(etiqueta__icontains=q) |
-                Q(numero_serie__icontains=q)
-            )
+    q = request.GET.get('q', '')
 
-        # Excluir já vinculados
-        ja_vinculados = ticket.ativos.values_list('pk', flat=True)
-        ativos = ativos.exclude(pk__in=ja_vinculados).select_related('categoria', 'status')[:20]
+    try:
+        from apps.ativos.search import AUTOCOMPLETE_CACHE_TIMEOUT, buscar_ativos, normalizar_termo
 
-        data = [
-            {
-                'id': a.pk,
-                'etiqueta': a.etiqueta,
-                'nome': a.nome,
-                'categoria': a.categoria.nome if a.categoria else '',
-                'status': a.status.nome if a.status else '',
-                'status_cor': a.status.cor if a.status else '#888',
-            }
-            for a in ativos
-        ]
-        return JsonResponse({'ativos': data})
+        # Ativo pertence a um Cliente; o dono do ticket é o usuário do cliente
+        data = buscar_ativos(
+            ticket.cliente.cliente_id, q,
+            excluir=ticket.ativos.values_list('pk', flat=True),
+        )
+        response = JsonResponse({'q': normalizar_termo(q), 'ativos': data})
+        response['Cache-Control'] = f'private, max-age={AUTOCOMPLETE_CACHE_TIMEOUT}'
+        return response
 
     except Exception as e:
         return JsonResponse({'ativos': [], 'erro': str(e)})
@@ -1873,9 +1964,13 @@ class ConfiguracaoEmailTesteView(LoginRequiredMixin, View):
 @method_decorator(csrf_exempt, name='dispatch')
 class AgentTicketListAPIView(AgentTokenRequiredMixin, APIView):
     """
-    GET /tickets/api/agent/list/?email=X
+    GET /tickets/api/agent/list/?email=X[&updated_since=<cursor>]
     Authorization: Bearer <token_hash>
     X-Machine-Name: DESKTOP-ABC123       ← obrigatório (enviado pelo agent_service)
+    If-None-Match: <etag>                ← opcional: 304 se nada mudou
+
+    Com ``updated_since`` (o ``cursor`` da resposta anterior) devolve só os
+    tickets alterados e ``ids`` da janela atual (ver apps/tickets/agent_sync.py).
     """
     authentication_classes = []
     permission_classes = []
@@ -1924,38 +2019,49 @@ class AgentTicketListAPIView(AgentTokenRequiredMixin, APIView):
         else:
             filtro = Q(solicitante=solicitante)
 
+        try:
+            desde = agent_sync.parse_cursor(request.GET.get('updated_since', '').strip())
+        except ValueError:
+            return Response({'ok': False, 'error': 'updated_since inválido (use o cursor retornado).'}, status=400)
+
+        linhas = agent_sync.janela(Ticket.objects.filter(filtro))
+        etag, cursor = agent_sync.versao_janela(linhas)
+        if agent_sync.etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        ids = agent_sync.alterados(linhas, desde)
         tickets = (
             Ticket.objects
-            .filter(filtro)
+            .filter(pk__in=ids)
             .select_related('status', 'servico')
             .order_by('-criado_em')
-            .distinct()[:50]
-        )
+        ) if ids else []
 
-        return Response({
+        payload = {
             'ok': True,
             'email': email,
             'machine': machine_name or '',
-            'tickets': [
-                {
-                    'id': t.pk,
-                    'numero': t.numero,
-                    'assunto': t.assunto,
-                    'status': t.status.nome,
-                    'status_cor': t.status.cor,
-                    'servico': t.servico.nome if t.servico else '',
-                    'criado_em': t.criado_em.strftime('%d/%m/%Y %H:%M'),
-                }
-                for t in tickets
-            ],
-        })
+            'cursor': cursor.isoformat() if cursor else '',
+            'incremental': desde is not None,
+            'tickets': [agent_sync.ticket_resumo(t) for t in tickets],
+        }
+        if desde is not None:
+            payload['ids'] = [pk for pk, _ in linhas]
+        response = Response(payload)
+        response['ETag'] = etag
+        return response
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AgentTicketDetailAPIView(AgentTokenRequiredMixin, APIView):
     """
-    GET /tickets/api/agent/<pk>/
+    GET /tickets/api/agent/<pk>/[?acoes_apos=<id>]
     Retorna detalhes do ticket e histórico de ações públicas (mais recente primeiro).
+
+    If-None-Match com o ETag anterior → 304 se nada mudou. Com ``acoes_apos``
+    (o ``ultima_acao_id`` da resposta anterior) só as ações novas vêm no histórico.
     """
     authentication_classes = []
     permission_classes = []
@@ -1972,25 +2078,26 @@ class AgentTicketDetailAPIView(AgentTokenRequiredMixin, APIView):
         except Ticket.DoesNotExist:
             return Response({'ok': False, 'error': 'Ticket não encontrado.'}, status=404)
 
-        acoes = (
-            AcaoTicket.objects
-            .filter(ticket=ticket, tipo='publica')
-            .select_related('autor')
-            .order_by('-criado_em')
-        )
+        try:
+            acoes_apos = int(request.GET.get('acoes_apos') or 0)
+        except ValueError:
+            return Response({'ok': False, 'error': 'acoes_apos inválido.'}, status=400)
 
+        acoes = AcaoTicket.objects.filter(ticket=ticket, tipo='publica')
+        etag, ultima_acao_id = agent_sync.versao_detalhe(ticket, acoes)
+        if agent_sync.etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        if acoes_apos:
+            acoes = acoes.filter(pk__gt=acoes_apos)
         historico = [
-            {
-                'id': a.pk,
-                'autor': a.autor.get_full_name() or a.autor.username,
-                'is_staff': a.autor.is_staff,
-                'conteudo': a.conteudo,
-                'criado_em': a.criado_em.strftime('%d/%m/%Y %H:%M'),
-            }
-            for a in acoes
+            agent_sync.acao_publica(a)
+            for a in acoes.select_related('autor').order_by('-criado_em')
         ]
 
-        return Response({
+        response = Response({
             'ok': True,
             'ticket': {
                 'id': ticket.pk,
@@ -2001,9 +2108,14 @@ class AgentTicketDetailAPIView(AgentTokenRequiredMixin, APIView):
                 'status_cor': ticket.status.cor,
                 'servico': ticket.servico.nome if ticket.servico else '',
                 'criado_em': ticket.criado_em.strftime('%d/%m/%Y %H:%M'),
+                'atualizado_em': ticket.atualizado_em.isoformat(),
             },
             'historico': historico,
+            'incremental': bool(acoes_apos),
+            'ultima_acao_id': ultima_acao_id,
         })
+        response['ETag'] = etag
+        return response
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -2224,8 +2336,8 @@ class EquipeDeleteView(LoginRequiredMixin, ClienteObjectMixin, DeleteView):
 
 def distribuir_ticket_para_equipe(ticket):
     """
-    Distribui um ticket automaticamente para o agente com menor carga
-    dentro da equipe atribuída ao ticket.
+    Distribui um ticket automaticamente para um agente da equipe atribuída
+    ao ticket, conforme a estratégia da equipe (menor carga ou rodízio).
     Chamado em TicketCreateView.form_valid e pelo sistema de gatilhos.
     """
     if not ticket.equipe:
@@ -2233,7 +2345,7 @@ def distribuir_ticket_para_equipe(ticket):
     if ticket.responsavel:
         return ticket.responsavel  # Já tem responsável, não redistribui
 
-    agente = ticket.equipe.agente_com_menor_carga()
+    agente = ticket.equipe.proximo_agente()
     if agente:
         ticket.responsavel = agente
         ticket.save(update_fields=['responsavel'])
@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_asgi_app = get_asgi_application()
+
+try:
+    from channels.routing import ProtocolTypeRouter, URLRouter
+except ImportError:
+    # Sem channels: só HTTP — os agentes seguem no polling
+    application = django_asgi_app
+else:
+    from apps.inventory.routing import websocket_urlpatterns
+
+    application = ProtocolTypeRouter({
+        'http': django_asgi_app,
+        'websocket': URLRouter(websocket_urlpatterns),
+    })
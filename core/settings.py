@@ -183,7 +183,9 @@ MEDIA_URL = 'media/'
 
 # Limite de upload — agents chegam a ~150 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 300 * 1024 * 1024   # 300 MB (multipart fields em memória)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 300 * 1024 * 1024   # 300 MB (antes de escrever em disco)
+# Arquivos acima disso vão para arquivo temporário em disco durante o upload
+# (anexos e pacotes do agente não ficam inteiros na RAM do worker)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2_621_440            # 2,5 MB (padrão do Django)
 
 
 
@@ -214,6 +216,13 @@ TICKET_EMAIL_CONFIG = {
     'SITE_URL': 'https://suporte.empresa.com',  # URL base para links
 }
 
+# Arquivo de tickets: fechados/cancelados há mais que isso saem das tabelas principais
+TICKET_ARCHIVE_AFTER_DAYS = 365
+TICKET_ARCHIVE_BATCH_SIZE = 200   # tickets por transação
+
+# Notificações in-app: True entrega no worker Celery (senão, logo após o commit)
+TICKET_NOTIFICATIONS_ASYNC = False
+
 # E-mail de saída (para enviar notificações)
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
@@ -305,15 +314,24 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 RDP_SESSION_TIMEOUT       = 3600   # segundos de TTL da sessão
 RDP_MAX_SESSIONS_PER_USER = 3      # máximo de sessões simultâneas
 RDP_SESSION_TOKEN_TTL     = 120    # segundos de TTL para token efêmero do navegador
+RDP_SESSION_TOKEN_RETENTION_HOURS = 24  # tokens vencidos há mais que isso são apagados
+RDP_AUDIT_RETENTION_DAYS  = 180    # auditoria mais antiga é arquivada (gzip) e removida
 RDP_DEFAULT_CONNECTION_MODE = "auto"  # auto|p2p_only|relay_only
 RDP_DEFAULT_QUALITY         = "auto"  # auto|high|medium|low
 RDP_REQUIRE_JUSTIFICATION   = True
 RDP_SILENT_ACCESS_ONLY      = True
 RDP_ENABLE_REVERSE_SIGNAL   = True
 RDP_SIGNAL_WAIT_TIMEOUT     = 12
+RDP_SIGNAL_LONGPOLL_MAX     = 25   # segundos máximos de long-poll do agente em signal/pull
+RDP_SIGNAL_CREDENTIAL_TTL   = 300  # segundos de validade da credencial assinada de sinalização
+RDP_SIGNAL_MAX_OFFERS_PER_PULL = 10  # offers entregues por pull quando o agente pede max>1
+RDP_REDIS_URL = os.environ.get('RDP_REDIS_URL', '')  # vazio = sinalização em processo
 AGENT_IPC_PORT            = 7070   # porta IPC do agente
 AGENT_WEBRTC_PORT         = 7071
 AGENT_DIRECT_CONNECT_TIMEOUT = float(os.environ.get('AGENT_DIRECT_CONNECT_TIMEOUT', '1.0'))
+AGENT_PROBE_TIMEOUT = float(os.environ.get('AGENT_PROBE_TIMEOUT', '1.0'))  # connect TCP da sondagem de rotas
+AGENT_PAYLOAD_MAX_BYTES = 2 * 1024 * 1024  # corpo máximo do check-in do agente
+AGENT_PAYLOAD_MAX_DEPTH = 32               # níveis máximos de aninhamento do JSON do agente
 RDP_TURN_CONFIG = {
     'host':        os.environ.get('TURN_HOST',        '192.168.100.247'),
     'port':        int(os.environ.get('TURN_PORT',        '3478')),
@@ -328,6 +346,22 @@ RDP_ALLOWED_ORIGINS = [
     'http://192.168.100.247',
 ]
 
+# ==================== GATEWAY DE AGENTES (WebSocket) ====================
+# Opcional: requer `pip install channels` (e channels_redis em produção).
+# Sem channels o gateway fica desligado e os agentes usam apenas polling.
+ASGI_APPLICATION = 'core.asgi.application'
+CHANNELS_REDIS_URL = os.environ.get('CHANNELS_REDIS_URL', '')
+if CHANNELS_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNELS_REDIS_URL]},
+        },
+    }
+else:
+    # Só entrega dentro do mesmo processo ASGI — desenvolvimento e testes
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
 # ==================== CELERY ====================
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -372,6 +406,41 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(hour=3, minute=0, day_of_week=0),
         'kwargs': {'dias': 30},
     },
+    # Arquivar tickets encerrados — todo dia às 04:00
+    'tickets-arquivar-encerrados': {
+        'task': 'tickets.arquivar_tickets',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    # Carga dos agentes (distribuição automática) — a cada hora
+    'tickets-ressincronizar-cargas': {
+        'task': 'tickets.ressincronizar_cargas',
+        'schedule': crontab(minute=30),
+    },
+    # Arquivos de anexo órfãos — todo dia às 04:30
+    'tickets-limpar-blobs-orfaos': {
+        'task': 'tickets.limpar_blobs_orfaos',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    # Sondagem de alcançabilidade dos agentes — a cada 2 minutos
+    'inventory-sondar-rotas-agentes': {
+        'task': 'inventory.sondar_rotas_agentes',
+        'schedule': 120.0,
+    },
+    # Sessões RDP vencidas — a cada 5 minutos
+    'rdp-reconciliar-sessoes': {
+        'task': 'rdp.reconciliar_sessoes',
+        'schedule': 300.0,
+    },
+    # Tokens de sessão RDP vencidos — a cada 10 minutos
+    'rdp-limpar-tokens-expirados': {
+        'task': 'rdp.limpar_tokens_expirados',
+        'schedule': 600.0,
+    },
+    # Retenção da auditoria RDP — todo dia às 03:30
+    'rdp-arquivar-auditoria': {
+        'task': 'rdp.arquivar_auditoria',
+        'schedule': crontab(hour=3, minute=30),
+    },
     # Machines status (já existia)
     'check-machines-status': {
         'task': 'apps.inventory.tasks.check_machines_status',